@@ -0,0 +1,93 @@
+import asyncio
+import json
+import logging
+import os
+
+from starlette.concurrency import run_in_threadpool
+
+from app.jobs import SUCCEEDED, FAILED, remove_upload
+from app.ocr import extract_text_batch
+from app.parse import process_invoice
+from app.pool import ocr_pool
+
+logger = logging.getLogger(__name__)
+
+# Batch upload settings
+OCR_BATCH_MAX_FILES = int(os.getenv("OCR_BATCH_MAX_FILES", "200"))
+OCR_BATCH_CHUNK = int(os.getenv("OCR_BATCH_CHUNK", "16"))
+# Files of one batch parsed at once (LLM call + Django POST each, on the shared threadpool)
+OCR_BATCH_PARSE = int(os.getenv("OCR_BATCH_PARSE", str(OCR_BATCH_CHUNK)))
+
+
+def chunk_files(files: list, size: int = OCR_BATCH_CHUNK) -> list:
+    return [files[i:i + size] for i in range(0, len(files), size)]
+
+
+def ocr_chunk(paths: list) -> list:
+    """extract_text_batch for the OCR pool; the uploaded files are deleted once they are read."""
+    try:
+        return extract_text_batch(paths)
+    finally:
+        for path in paths:
+            remove_upload(path)
+
+
+def remove_files(chunk: list):
+    for _, _, path in chunk:
+        remove_upload(path)
+
+
+async def batch_results(chunks: list, first_ocr, token: str, identity: dict, use_cache: bool = True,
+                        parse_limit: int = OCR_BATCH_PARSE):
+    """
+    NDJSON stream with one line per file, written as soon as that file is parsed.
+    `chunks` are lists of (index, filename, path); each chunk is one extract_text_batch call on
+    the OCR pool (ocr_chunk), and `first_ocr` is the already-submitted future for chunks[0].
+    Parsing of a finished chunk overlaps with OCR of the next one; at most `parse_limit`
+    files are parsed at once. Uploaded files are deleted once their chunk is OCRed, or when
+    the stream ends before their chunk got to the OCR pool.
+    """
+    results = asyncio.Queue()
+    parse_tasks = []
+    ocr_futures = {0: first_ocr}
+    parse_slots = asyncio.Semaphore(max(1, parse_limit))
+    total = sum(len(chunk) for chunk in chunks)
+
+    async def parse_one(index, filename, text):
+        try:
+            async with parse_slots:
+                structured_data = await run_in_threadpool(process_invoice, text, token, identity, use_cache)
+            await results.put({"index": index, "filename": filename, "status": SUCCEEDED,
+                               "structured_data": structured_data})
+        except Exception as e:
+            logger.error(f"❌ Batch file {filename} failed: {e}", exc_info=True)
+            await results.put({"index": index, "filename": filename, "status": FAILED, "error": str(e)})
+
+    async def run_ocr():
+        for n, chunk in enumerate(chunks):
+            paths = [path for _, _, path in chunk]
+            try:
+                if n > 0:
+                    ocr_futures[n] = await ocr_pool.submit_when_free(ocr_chunk, paths)
+                texts = await asyncio.wrap_future(ocr_futures[n])
+            except Exception as e:
+                logger.error(f"❌ Batch OCR chunk {n} failed: {e}", exc_info=True)
+                for index, filename, _ in chunk:
+                    await results.put({"index": index, "filename": filename, "status": FAILED, "error": str(e)})
+                continue
+            for (index, filename, _), text in zip(chunk, texts):
+                parse_tasks.append(asyncio.create_task(parse_one(index, filename, text)))
+
+    producer = asyncio.create_task(run_ocr())
+    try:
+        for _ in range(total):
+            yield json.dumps(await results.get()) + "\n"
+    finally:
+        producer.cancel()
+        for task in parse_tasks:
+            task.cancel()
+        # files of chunks that never started OCR (client went away); running chunks clean up themselves
+        for n, chunk in enumerate(chunks):
+            future = ocr_futures.get(n)
+            if future is None or future.cancel():
+                remove_files(chunk)
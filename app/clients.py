@@ -0,0 +1,169 @@
+import logging
+import os
+import threading
+import time
+from pathlib import Path
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+GCP_PROJECT_ID = os.getenv("GCP_PROJECT_ID")
+GCP_LOCATION = os.getenv("GCP_LOCATION", "us-central1")
+GOOGLE_APPLICATION_CREDENTIALS = os.getenv("GOOGLE_APPLICATION_CREDENTIALS")
+
+# HTTP pool settings
+HTTP_POOL_SIZE = int(os.getenv("HTTP_POOL_SIZE", "10"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "5"))  # async clients (get_async_client)
+BACKEND_TIMEOUT = float(os.getenv("BACKEND_TIMEOUT", "3050"))
+NLP_TIMEOUT = float(os.getenv("NLP_TIMEOUT", "3000"))
+
+# ✅ Check Render-mounted secret
+sa_path = Path("/etc/secrets/gcp_sa.json")
+if sa_path.exists():
+    os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = str(sa_path)
+    GOOGLE_APPLICATION_CREDENTIALS = str(sa_path)
+
+# ✅ Normalize Windows path if running locally
+if GOOGLE_APPLICATION_CREDENTIALS and "\\" in GOOGLE_APPLICATION_CREDENTIALS:
+    GOOGLE_APPLICATION_CREDENTIALS = GOOGLE_APPLICATION_CREDENTIALS.replace("\\", "/")
+    os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = GOOGLE_APPLICATION_CREDENTIALS
+
+_lock = threading.Lock()
+_vertex_ready = False
+_models = {}
+_sessions = {}
+_async_clients = {}
+_safety_settings = None
+_stats = {"setup_seconds": 0.0, "requests": {}}
+
+
+def _timed_setup(start_time: float):
+    _stats["setup_seconds"] += time.time() - start_time
+
+
+def init_vertex():
+    """Initialize Vertex AI once per process."""
+    global _vertex_ready
+    if _vertex_ready:
+        return
+    with _lock:
+        if _vertex_ready:
+            return
+        start_time = time.time()
+        if GCP_PROJECT_ID:
+            try:
+                import vertexai
+                vertexai.init(project=GCP_PROJECT_ID, location=GCP_LOCATION)
+                print(f"✅ Vertex AI initialized for project {GCP_PROJECT_ID}")
+            except Exception as init_err:
+                print(f"⚠️ Vertex AI init failed: {init_err}")
+        _vertex_ready = True
+        _timed_setup(start_time)
+
+
+def get_gemini_model(name: str = "gemini-2.5-flash"):
+    """Process-wide GenerativeModel per model name."""
+    model = _models.get(name)
+    if model is not None:
+        return model
+    init_vertex()
+    with _lock:
+        if name not in _models:
+            from vertexai.generative_models import GenerativeModel
+            start_time = time.time()
+            _models[name] = GenerativeModel(name)
+            _timed_setup(start_time)
+            logger.info(f"✅ Gemini model {name} ready")
+        return _models[name]
+
+
+def get_safety_settings():
+    global _safety_settings
+    if _safety_settings is None:
+        from vertexai.generative_models import SafetySetting
+        # ✅ Valid safety categories only
+        _safety_settings = [
+            SafetySetting(category="HARM_CATEGORY_DANGEROUS_CONTENT", threshold="BLOCK_LOW_AND_ABOVE"),
+            SafetySetting(category="HARM_CATEGORY_HARASSMENT", threshold="BLOCK_LOW_AND_ABOVE"),
+            SafetySetting(category="HARM_CATEGORY_SEXUALLY_EXPLICIT", threshold="BLOCK_LOW_AND_ABOVE"),
+            SafetySetting(category="HARM_CATEGORY_HATE_SPEECH", threshold="BLOCK_LOW_AND_ABOVE"),
+        ]
+    return _safety_settings
+
+
+class _CountingSession(requests.Session):
+    """requests.Session that counts calls so /metrics shows how often connections are reused."""
+
+    def __init__(self, name: str):
+        super().__init__()
+        self.name = name
+
+    def request(self, method, url, **kwargs):
+        with _lock:
+            _stats["requests"][self.name] = _stats["requests"].get(self.name, 0) + 1
+        return super().request(method, url, **kwargs)
+
+
+def get_session(name: str) -> requests.Session:
+    """
+    Keep-alive HTTP session per upstream ("backend" = Django, "nlp" = Ollama server).
+    Connections (and TLS sessions) are pooled up to HTTP_POOL_SIZE per host.
+    """
+    session = _sessions.get(name)
+    if session is not None:
+        return session
+    with _lock:
+        if name not in _sessions:
+            start_time = time.time()
+            session = _CountingSession(name)
+            adapter = HTTPAdapter(pool_connections=4, pool_maxsize=HTTP_POOL_SIZE)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _sessions[name] = session
+            _timed_setup(start_time)
+        return _sessions[name]
+
+
+def get_async_client(name: str) -> httpx.AsyncClient:
+    """Pooled async HTTP client per upstream, for fan-out from async endpoints."""
+    client = _async_clients.get(name)
+    if client is None or client.is_closed:
+        start_time = time.time()
+        client = httpx.AsyncClient(
+            limits=httpx.Limits(max_connections=HTTP_POOL_SIZE, max_keepalive_connections=HTTP_POOL_SIZE),
+            timeout=httpx.Timeout(HTTP_READ_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT),
+        )
+        _async_clients[name] = client
+        _timed_setup(start_time)
+    return client
+
+
+async def aclose():
+    for client in list(_async_clients.values()):
+        await client.aclose()
+    _async_clients.clear()
+
+
+def backend_timeout(read_timeout: float = BACKEND_TIMEOUT):
+    return (HTTP_CONNECT_TIMEOUT, read_timeout)
+
+
+def nlp_timeout(read_timeout: float = NLP_TIMEOUT):
+    return (HTTP_CONNECT_TIMEOUT, read_timeout)
+
+
+def stats() -> dict:
+    with _lock:
+        return {
+            "setup_seconds": round(_stats["setup_seconds"], 3),
+            "gemini_models": sorted(_models),
+            "sessions": dict(_stats["requests"]),
+            "pool_size": HTTP_POOL_SIZE,
+        }
@@ -0,0 +1,282 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from pathlib import Path
+
+from starlette.concurrency import run_in_threadpool
+
+from app.ocr import extract_text
+from app.parse import process_invoice
+from app.pool import ocr_pool, OCR_WORKERS, OCR_QUEUE_DEPTH, OCR_RETRY_AFTER
+
+logger = logging.getLogger(__name__)
+
+# Job settings
+JOB_BACKEND = os.getenv("JOB_BACKEND", "memory")  # memory | celery
+# /upload admits as much work as the OCR pool (OCR_WORKERS running + OCR_QUEUE_DEPTH waiting)
+# unless set separately, so a full pool turns uploads away with 503 instead of queueing them
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", str(OCR_WORKERS)))
+JOB_QUEUE_DEPTH = int(os.getenv("JOB_QUEUE_DEPTH", str(OCR_QUEUE_DEPTH)))
+JOB_TTL = int(os.getenv("JOB_TTL", str(24 * 3600)))
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "0.5"))
+JOB_RETRY_AFTER = int(os.getenv("JOB_RETRY_AFTER", str(OCR_RETRY_AFTER)))
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+TERMINAL_STATES = (SUCCEEDED, FAILED)
+
+
+class QueueFull(Exception):
+    """Raised when the job queue cannot take another upload."""
+
+    def __init__(self, retry_after: int = JOB_RETRY_AFTER):
+        super().__init__(f"Upload queue is full, retry in {retry_after}s")
+        self.retry_after = retry_after
+
+
+def new_job(user_id, filename: str, file_path: str, job_id: str = None, use_cache: bool = True) -> dict:
+    now = time.time()
+    return {
+        "id": job_id or uuid.uuid4().hex,
+        "status": QUEUED,
+        "user_id": str(user_id) if user_id is not None else None,
+        "filename": filename,
+        "file_path": file_path,
+        "use_cache": use_cache,
+        "created_at": now,
+        "updated_at": now,
+        "result": None,
+        "error": None,
+    }
+
+
+class MemoryJobStore:
+    """Job records kept in this process. Used with the in-process backend and in tests."""
+
+    def __init__(self, ttl: int = JOB_TTL):
+        self.ttl = ttl
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+    def create(self, job: dict) -> dict:
+        with self._lock:
+            self._purge()
+            self._jobs[job["id"]] = dict(job)
+        return job
+
+    def get(self, job_id: str):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job else None
+
+    def update(self, job_id: str, **fields):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            job.update(fields, updated_at=time.time())
+            return dict(job)
+
+    def _purge(self):
+        cutoff = time.time() - self.ttl
+        expired = [k for k, j in self._jobs.items()
+                   if j["status"] in TERMINAL_STATES and j["updated_at"] < cutoff]
+        for k in expired:
+            del self._jobs[k]
+
+
+class RedisJobStore:
+    """Job records in Redis so API processes and Celery workers see the same state."""
+
+    def __init__(self, url: str = REDIS_URL, ttl: int = JOB_TTL):
+        import redis
+        self.ttl = ttl
+        self._redis = redis.Redis.from_url(url)
+
+    def _key(self, job_id: str) -> str:
+        return f"autobooks:job:{job_id}"
+
+    def create(self, job: dict) -> dict:
+        self._redis.set(self._key(job["id"]), json.dumps(job), ex=self.ttl)
+        return job
+
+    def get(self, job_id: str):
+        raw = self._redis.get(self._key(job_id))
+        return json.loads(raw) if raw else None
+
+    def update(self, job_id: str, **fields):
+        # Each job has a single writer (its worker), so read-modify-write is enough here.
+        job = self.get(job_id)
+        if job is None:
+            return None
+        job.update(fields, updated_at=time.time())
+        self._redis.set(self._key(job_id), json.dumps(job), ex=self.ttl)
+        return job
+
+
+def remove_upload(file_path: str):
+    """Delete a job's uploaded file once the job is finished (its text is in the result)."""
+    try:
+        Path(file_path).unlink(missing_ok=True)
+    except OSError as e:
+        logger.warning(f"⚠️ Could not delete upload {file_path}: {e}")
+
+
+def run_pipeline(job_id: str, token: str, identity: dict, store):
+    """Blocking OCR -> parse -> save for one job. Used by Celery workers."""
+    job = store.update(job_id, status=RUNNING)
+    if job is None:
+        logger.error(f"❌ Job {job_id} not found")
+        return None
+    try:
+        text = extract_text(job["file_path"])
+        structured_data = process_invoice(text, token, identity, job.get("use_cache", True))
+        return store.update(job_id, status=SUCCEEDED, result={"structured_data": structured_data})
+    except Exception as e:
+        logger.error(f"❌ Job {job_id} failed: {e}", exc_info=True)
+        return store.update(job_id, status=FAILED, error=str(e))
+    finally:
+        remove_upload(job["file_path"])
+
+
+class InProcessBackend:
+    """
+    asyncio queue drained by JOB_WORKERS consumers inside the API process.
+    OCR still goes through the bounded OCR pool; no Redis needed.
+    """
+
+    name = "memory"
+
+    def __init__(self, store, workers: int = JOB_WORKERS, queue_depth: int = JOB_QUEUE_DEPTH):
+        self.store = store
+        self.workers = max(1, workers)
+        self.queue_depth = queue_depth
+        self._queue = None
+        self._consumers = []
+
+    async def start(self):
+        if self._queue is not None:
+            return
+        self._queue = asyncio.Queue(maxsize=self.queue_depth)
+        self._consumers = [asyncio.create_task(self._consume()) for _ in range(self.workers)]
+        logger.info(f"✅ In-process job queue started: workers={self.workers} depth={self.queue_depth}")
+
+    async def stop(self):
+        for task in self._consumers:
+            task.cancel()
+        self._consumers = []
+        self._queue = None
+
+    async def enqueue(self, job: dict, token: str, identity: dict):
+        await self.start()
+        try:
+            self._queue.put_nowait((job["id"], token, identity))
+        except asyncio.QueueFull:
+            raise QueueFull()
+
+    async def _consume(self):
+        while True:
+            job_id, token, identity = await self._queue.get()
+            try:
+                await self._run(job_id, token, identity)
+            except Exception as e:
+                logger.error(f"❌ Job {job_id} crashed: {e}", exc_info=True)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job_id: str, token: str, identity: dict):
+        job = self.store.update(job_id, status=RUNNING)
+        if job is None:
+            return
+        try:
+            # the job is already accepted, so wait for an OCR slot instead of failing it
+            text = await ocr_pool.run_when_free(extract_text, job["file_path"],
+                                                poll_interval=JOB_POLL_INTERVAL)
+            structured_data = await run_in_threadpool(
+                process_invoice, text, token, identity, job.get("use_cache", True)
+            )
+            self.store.update(job_id, status=SUCCEEDED, result={"structured_data": structured_data})
+        except Exception as e:
+            logger.error(f"❌ Job {job_id} failed: {e}", exc_info=True)
+            self.store.update(job_id, status=FAILED, error=str(e))
+        finally:
+            remove_upload(job["file_path"])
+
+    def stats(self) -> dict:
+        return {
+            "backend": self.name,
+            "workers": self.workers,
+            "queue_depth": self.queue_depth,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+        }
+
+
+class CeleryBackend:
+    """Hands jobs to Celery workers (see app/tasks.py). Upload files must be on shared storage."""
+
+    name = "celery"
+
+    def __init__(self, store):
+        self.store = store
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+    async def enqueue(self, job: dict, token: str, identity: dict):
+        from app.tasks import process_upload_job
+        try:
+            await run_in_threadpool(process_upload_job.delay, job["id"], token, identity)
+        except Exception as e:
+            logger.error(f"❌ Could not enqueue job {job['id']}: {e}")
+            raise QueueFull()
+
+    def stats(self) -> dict:
+        return {"backend": self.name}
+
+
+def get_backend(kind: str = JOB_BACKEND):
+    if kind == "celery":
+        return CeleryBackend(RedisJobStore())
+    return InProcessBackend(MemoryJobStore())
+
+
+job_backend = get_backend()
+job_store = job_backend.store
+
+
+async def wait_for_job(job_id: str, timeout: float, store=None):
+    """Long-poll: return the job once it is finished or `timeout` seconds have passed."""
+    store = store or job_store
+    deadline = time.monotonic() + timeout
+    job = store.get(job_id)
+    while job and job["status"] not in TERMINAL_STATES and time.monotonic() < deadline:
+        await asyncio.sleep(JOB_POLL_INTERVAL)
+        job = store.get(job_id)
+    return job
+
+
+async def job_events(job_id: str, store=None):
+    """Server-sent events with the job record on every status change, until it finishes."""
+    store = store or job_store
+    last_status = None
+    while True:
+        job = store.get(job_id)
+        if job is None:
+            yield "event: error\ndata: {\"detail\": \"Job not found\"}\n\n"
+            return
+        if job["status"] != last_status:
+            last_status = job["status"]
+            yield f"event: status\ndata: {json.dumps(job)}\n\n"
+        if job["status"] in TERMINAL_STATES:
+            return
+        await asyncio.sleep(JOB_POLL_INTERVAL)
@@ -0,0 +1,122 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# LLM cache settings
+LLM_CACHE_ENABLED = os.getenv("LLM_CACHE_ENABLED", "1") == "1"
+LLM_CACHE_PATH = os.getenv("LLM_CACHE_PATH", "/tmp/llm_cache.sqlite3")
+LLM_CACHE_TTL = int(os.getenv("LLM_CACHE_TTL", str(30 * 24 * 3600)))
+LLM_CACHE_MAX_ITEMS = int(os.getenv("LLM_CACHE_MAX_ITEMS", "5000"))
+
+# Request header that skips the cache lookup (the fresh result is still stored)
+CACHE_BYPASS_HEADER = "X-Cache-Bypass"
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_text(text: str) -> str:
+    """
+    Collapse OCR whitespace/line-break noise so trivially different reads share a key.
+    Case is kept: invoice numbers and vendor codes (INV-AB12 vs inv-ab12) are extracted verbatim.
+    """
+    return _WHITESPACE.sub(" ", text or "").strip()
+
+
+def bypass_requested(value) -> bool:
+    return str(value or "").strip().lower() in ("1", "true", "yes", "no-cache")
+
+
+class LLMCache:
+    """
+    SQLite-backed cache of structured LLM extractions.
+    Key = SHA-256 of normalized OCR text + prompt version + model name. Entries expire after
+    `ttl` seconds and the least recently used rows are dropped beyond `max_items`.
+    """
+
+    def __init__(self, path: str = LLM_CACHE_PATH, ttl: int = LLM_CACHE_TTL,
+                 max_items: int = LLM_CACHE_MAX_ITEMS):
+        self.path = path
+        self.ttl = ttl
+        self.max_items = max_items
+        self._lock = threading.Lock()
+        self._conn = None
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def conn(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.path, check_same_thread=False)
+            self._conn.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                "key TEXT PRIMARY KEY, model TEXT, value TEXT, "
+                "created_at REAL, accessed_at REAL)"
+            )
+            self._conn.execute("CREATE INDEX IF NOT EXISTS llm_cache_accessed ON llm_cache (accessed_at)")
+            self._conn.commit()
+        return self._conn
+
+    @staticmethod
+    def make_key(text: str, prompt_version: str, model: str) -> str:
+        raw = f"{prompt_version}\x00{model}\x00{normalize_text(text)}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key: str):
+        now = time.time()
+        try:
+            with self._lock:
+                row = self.conn.execute(
+                    "SELECT value, created_at FROM llm_cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row is None or now - row[1] > self.ttl:
+                    if row is not None:
+                        self.conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                        self.conn.commit()
+                    self.misses += 1
+                    return None
+                self.conn.execute("UPDATE llm_cache SET accessed_at = ? WHERE key = ?", (now, key))
+                self.conn.commit()
+                self.hits += 1
+            return json.loads(row[0])
+        except Exception as e:
+            logger.warning(f"⚠️ LLM cache read failed: {e}")
+            return None
+
+    def put(self, key: str, model: str, value: dict):
+        now = time.time()
+        try:
+            with self._lock:
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, model, value, created_at, accessed_at) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (key, model, json.dumps(value), now, now),
+                )
+                self.conn.execute("DELETE FROM llm_cache WHERE created_at < ?", (now - self.ttl,))
+                self.conn.execute(
+                    "DELETE FROM llm_cache WHERE key IN ("
+                    "SELECT key FROM llm_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                    (self.max_items,),
+                )
+                self.conn.commit()
+        except Exception as e:
+            logger.warning(f"⚠️ LLM cache write failed: {e}")
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "enabled": LLM_CACHE_ENABLED,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else 0.0,
+            }
+
+
+llm_cache = LLMCache()
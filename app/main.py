@@ -1,23 +1,34 @@
+import asyncio
+import json
 import logging
 import uuid
 import os
-import requests
 import time
 from pathlib import Path
+from typing import List
 from pydantic import BaseModel
 from fastapi import FastAPI, UploadFile, File, HTTPException, Header, Form, Request
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
-
-from app.ocr import extract_text
-from app.parse import process_invoice, query_nlp
+from starlette.concurrency import run_in_threadpool
+
+from app.jobs import (job_backend, job_store, new_job, wait_for_job, job_events,
+                      QueueFull, FAILED, TERMINAL_STATES)
+from app.llm_cache import llm_cache, bypass_requested
+from app.ocr_cache import ocr_cache
+from app.parse import query_nlp
+from app.batch import batch_results, chunk_files, ocr_chunk, remove_files, OCR_BATCH_MAX_FILES
+from app.ocr import inference_stats
+from app.pool import ocr_pool, PoolFull
+from app.report_cache import report_cache
 from app.utils import decode_token
 
 # ✅ Vertex AI imports
 from dotenv import load_dotenv
 load_dotenv()
-from vertexai import init as vertex_init
-from vertexai.generative_models import GenerativeModel, GenerationConfig
+from vertexai.generative_models import GenerationConfig
+from app import clients
+from app.clients import get_gemini_model, get_async_client
 
 # Setup logging
 logging.basicConfig(
@@ -67,31 +78,8 @@ logger.info(f"✅ Using receipts folder: {RECEIPTS_DIR}")
 
 
 Backend_API = os.getenv("DJANGO_API", "http://localhost:8000")
-GCP_PROJECT_ID = os.getenv("GCP_PROJECT_ID")
-GOOGLE_APPLICATION_CREDENTIALS = os.getenv("GOOGLE_APPLICATION_CREDENTIALS")
-
-# ✅ Check Render-mounted secret
-sa_path = Path("/etc/secrets/gcp_sa.json")
-if sa_path.exists():
-    os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = str(sa_path)
-    GOOGLE_APPLICATION_CREDENTIALS = str(sa_path)
-
-# ✅ Normalize Windows path if running locally
-if GOOGLE_APPLICATION_CREDENTIALS and "\\" in GOOGLE_APPLICATION_CREDENTIALS:
-    GOOGLE_APPLICATION_CREDENTIALS = GOOGLE_APPLICATION_CREDENTIALS.replace("\\", "/")
-    os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = GOOGLE_APPLICATION_CREDENTIALS
-
-# ✅ Initialize Vertex AI
-if GCP_PROJECT_ID:
-    try:
-        import vertexai
-        vertexai.init(project=GCP_PROJECT_ID, location="us-central1")
-        print(f"✅ Vertex AI initialized for project {GCP_PROJECT_ID}")
-    except Exception as init_err:
-        print(f"⚠️ Vertex AI init failed: {init_err}")
-
 # Gemini model configuration
-gemini_model = GenerativeModel("gemini-2.5-flash")
+gemini_model = get_gemini_model("gemini-2.5-flash")
 gen_cfg = GenerationConfig(
     temperature=0.3,
     top_p=0.9,
@@ -143,8 +131,105 @@ def query_gemini_direct(prompt: str) -> str:
         return f"Gemini query failed: {e}"
 
 
+@app.on_event("startup")
+async def start_jobs():
+    await job_backend.start()
+
+
+@app.on_event("shutdown")
+async def shutdown_pools():
+    await job_backend.stop()
+    await clients.aclose()
+    ocr_pool.shutdown(wait=False)
+
+
+@app.get("/metrics")
+async def metrics():
+    return {
+        "ocr_pool": ocr_pool.stats(),
+        "ocr_inference": inference_stats(),
+        "ocr_cache": ocr_cache.stats(),
+        "llm_cache": llm_cache.stats(),
+        "clients": clients.stats(),
+        "jobs": job_backend.stats(),
+    }
+
+
+def stream_gemini_direct(prompt: str):
+    """
+    Streaming variant of query_gemini_direct: yields text chunks as Gemini produces them.
+    If the answer is blocked before any text arrives, the summary-prompt retry is streamed instead.
+    """
+    prompt = sanitize_prompt(prompt)
+    start_time = time.time()
+    emitted = False
+    try:
+        blocked = False
+        for chunk in gemini_model.generate_content([prompt], generation_config=gen_cfg, stream=True):
+            try:
+                text = chunk.text
+            except Exception as inner:
+                logger.warning(f"⚠️ Gemini stream returned no text, likely blocked. ({inner})")
+                blocked = True
+                break
+            if text:
+                if not emitted:
+                    logger.info(f"✅ Gemini first token in {time.time() - start_time:.2f}s")
+                emitted = True
+                yield text
+
+        if blocked and not emitted:
+            short_prompt = (
+                "Summarize and analyze this user's financial report briefly in plain English. "
+                "Skip numeric tables if too long.\n\n" + prompt[:4000]
+            )
+            for chunk in gemini_model.generate_content([short_prompt], generation_config=gen_cfg, stream=True):
+                text = getattr(chunk, "text", "")
+                if text:
+                    emitted = True
+                    yield text
+        elif blocked:
+            yield "\n\n[response cut short by content filter]"
+
+        logger.info(f"✅ Gemini stream finished in {time.time() - start_time:.2f}s")
+        if not emitted:
+            yield "(empty Gemini response)"
+    except Exception as e:
+        logger.error(f"❌ Gemini stream failed: {e}", exc_info=True)
+        yield f"Gemini query failed: {e}"
+
+
+def copilot_events(prompt: str):
+    """Server-sent events: `token` events with text chunks, then one `done` event with the full reply."""
+    reply = []
+    for text in stream_gemini_direct(prompt):
+        reply.append(text)
+        yield f"event: token\ndata: {json.dumps({'text': text})}\n\n"
+    yield f"event: done\ndata: {json.dumps({'reply': ''.join(reply)})}\n\n"
+
+
+async def fetch_reports(token: str) -> dict:
+    """Fetch the three copilot reports from Django concurrently."""
+    client = get_async_client("backend")
+    headers = {"Authorization": f"Bearer {token}"}
+    balance, profit_loss, cashflow = await asyncio.gather(
+        client.get(f"{Backend_API}/balance-sheet/", headers=headers),
+        client.get(f"{Backend_API}/pnl/", headers=headers),
+        client.get(f"{Backend_API}/cashflow/", headers=headers),
+    )
+    return {
+        "balance": balance.json(),
+        "profit_loss": profit_loss.json(),
+        "cashflow": cashflow.json(),
+    }
+
+
 @app.post("/copilot")
-async def copilot_endpoint(req: CopilotRequest, request: Request):
+async def copilot_endpoint(req: CopilotRequest, request: Request, stream: bool = False):
+    """
+    Business copilot chat. With ?stream=true the reply is sent as server-sent events
+    (see copilot_events) so the first tokens arrive while Gemini is still generating.
+    """
     logger.info("Received copilot request")
     logger.info(f"User message: {req.message}")
 
@@ -160,18 +245,20 @@ async def copilot_endpoint(req: CopilotRequest, request: Request):
     logger.info(f"Decoded user: {user}")
     user_id = user.get("user_id")
 
-    headers = {"Authorization": f"Bearer {token}"}
-
-    try:
-        balance = requests.get(f"{Backend_API}/balance-sheet/", headers=headers, timeout=5).json()
-        logger.info(f"Balance Sheet: {balance}")
-        profit_loss = requests.get(f"{Backend_API}/pnl/", headers=headers, timeout=5).json()
-        logger.info(f"Profit & Loss: {profit_loss}")
-        cashflow = requests.get(f"{Backend_API}/cashflow/", headers=headers, timeout=5).json()
-        logger.info(f"Payroll: {cashflow}")
-    except Exception as e:
-        logger.error(f"Failed to fetch data from backend: {e}")
-        raise HTTPException(status_code=502, detail=f"Django request failed: {e}")
+    reports = report_cache.get(user_id)
+    if reports is None:
+        try:
+            reports = await fetch_reports(token)
+        except Exception as e:
+            logger.error(f"Failed to fetch data from backend: {e}")
+            raise HTTPException(status_code=502, detail=f"Django request failed: {e}")
+        report_cache.put(user_id, reports)
+    else:
+        logger.info("Using cached financial reports")
+    balance, profit_loss, cashflow = reports["balance"], reports["profit_loss"], reports["cashflow"]
+    logger.info(f"Balance Sheet: {balance}")
+    logger.info(f"Profit & Loss: {profit_loss}")
+    logger.info(f"Cash Flow: {cashflow}")
 
     prompt = f"""
 You are the business copilot for user {user.get('username')} ({user.get('email')}).
@@ -185,63 +272,175 @@ User Message: {req.message}
 """
 
     logger.info("Sending prompt to Gemini Vertex AI...")
-    response_text = query_gemini_direct(prompt)
+    if stream:
+        # sync generator; StreamingResponse iterates it in the threadpool
+        return StreamingResponse(
+            copilot_events(prompt),
+            media_type="text/event-stream",
+            headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+        )
+    response_text = await run_in_threadpool(query_gemini_direct, prompt)
     logger.info(f"Gemini response: {response_text}")
 
     return {"reply": response_text}
 
 
-@app.post("/upload")
+def authenticate(authorization: str, refresh_token: str = None, user_id: str = None):
+    token = (authorization or "").replace("Bearer ", "").strip()
+    if not token:
+        raise HTTPException(status_code=401, detail="Missing or invalid token")
+    identity = decode_token(token, refresh_token) or {}
+    if not identity.get("user_id") and user_id:
+        identity["user_id"] = user_id
+    if not identity.get("user_id"):
+        raise HTTPException(status_code=401, detail="User ID missing")
+    return token, identity
+
+
+def get_user_job(job_id: str, identity: dict) -> dict:
+    job = job_store.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if job["user_id"] != str(identity.get("user_id")):
+        raise HTTPException(status_code=403, detail="Job belongs to another user")
+    return job
+
+
+@app.post("/upload", status_code=202)
 async def upload_receipt(
     receipt: UploadFile = File(...),
     authorization: str = Header(...),
     x_refresh_token: str = Header(None),
+    x_cache_bypass: str = Header(None),
     user_id: str = Form(None)
 ):
     """
-    Upload a receipt -> Save -> OCR -> NLP parse -> save to ledger.db
+    Upload a receipt -> Save -> enqueue OCR + NLP parse + save to ledger.
+    Returns a job id right away; poll GET /jobs/{id} for the result.
+    Send `X-Cache-Bypass: 1` to force a fresh LLM extraction.
     """
     try:
         logger.info("Upload request received")
 
-        # Decode token
-        token = authorization.replace("Bearer ", "").strip()
-        if not token:
-            raise HTTPException(status_code=401, detail="Missing or invalid token")
-        identity = decode_token(token, x_refresh_token) or {}
-        if not identity.get("user_id") and user_id:
-            identity["user_id"] = user_id
-        if not identity.get("user_id"):
-            raise HTTPException(status_code=401, detail="User ID missing")
+        token, identity = authenticate(authorization, x_refresh_token, user_id)
         logger.info(f"Authenticated user: {identity}")
 
-        # Save file
-        file_path = RECEIPTS_DIR / receipt.filename
+        # Save file under the job id so re-uploads with the same name never collide
+        job_id = uuid.uuid4().hex
+        file_path = RECEIPTS_DIR / f"{job_id}{Path(receipt.filename or '').suffix}"
         with open(file_path, "wb") as f:
             f.write(await receipt.read())
         logger.info(f"Saved receipt to: {file_path}")
 
-        # OCR
-        logger.info("Starting OCR...")
-        text = extract_text(file_path)
-        if not text.strip():
-            logger.warning("OCR returned EMPTY text!")
-        else:
-            logger.info(f"OCR extracted text (first 200 chars): {text[:200]}...")
-
-        # NLP + DB
-        logger.info("🔍 Starting invoice parsing...")
-        structured_data = process_invoice(text, token, identity)
-        logger.info(f"Parsed invoice data: {structured_data}")
+        job = job_store.create(new_job(
+            identity["user_id"], receipt.filename, str(file_path), job_id,
+            use_cache=not bypass_requested(x_cache_bypass),
+        ))
+        try:
+            await job_backend.enqueue(job, token, identity)
+        except QueueFull as full:
+            job_store.update(job_id, status=FAILED, error=str(full))
+            file_path.unlink(missing_ok=True)
+            logger.warning(f"⚠️ {full} ({job_backend.stats()})")
+            raise HTTPException(
+                status_code=503,
+                detail=str(full),
+                headers={"Retry-After": str(full.retry_after)},
+            )
+        logger.info(f"Queued job {job_id} for {receipt.filename}")
 
         return JSONResponse(
+            status_code=202,
             content={
-                "status": "success",
-                "structured_data": structured_data,
+                "status": job["status"],
+                "job_id": job_id,
+                "status_url": f"/jobs/{job_id}",
+                "events_url": f"/jobs/{job_id}/events",
                 "file_path": str(file_path),
                 "identity": identity,
-            }
+            },
         )
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error processing receipt: {e}", exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
+
+
+@app.post("/upload/batch")
+async def upload_batch(
+    receipts: List[UploadFile] = File(...),
+    authorization: str = Header(...),
+    x_refresh_token: str = Header(None),
+    x_cache_bypass: str = Header(None),
+    user_id: str = Form(None)
+):
+    """
+    Upload many receipts at once (month-end folders).
+    Pages are OCRed together (batched detection, shared recognition batches) and each file's
+    parsed result is streamed back as one NDJSON line as soon as it is ready.
+    """
+    token, identity = authenticate(authorization, x_refresh_token, user_id)
+    if len(receipts) > OCR_BATCH_MAX_FILES:
+        raise HTTPException(status_code=413, detail=f"At most {OCR_BATCH_MAX_FILES} files per batch")
+    logger.info(f"Batch upload of {len(receipts)} files from {identity}")
+
+    batch_id = uuid.uuid4().hex
+    files = []
+    for index, receipt in enumerate(receipts):
+        file_path = RECEIPTS_DIR / f"{batch_id}-{index}{Path(receipt.filename or '').suffix}"
+        with open(file_path, "wb") as f:
+            f.write(await receipt.read())
+        files.append((index, receipt.filename, str(file_path)))
+
+    chunks = chunk_files(files)
+    try:
+        first_ocr = ocr_pool.submit(ocr_chunk, [path for _, _, path in chunks[0]])
+    except PoolFull as full:
+        remove_files(files)
+        logger.warning(f"⚠️ {full} ({ocr_pool.stats()})")
+        raise HTTPException(
+            status_code=503,
+            detail=str(full),
+            headers={"Retry-After": str(full.retry_after)},
+        )
+
+    return StreamingResponse(
+        batch_results(chunks, first_ocr, token, identity, use_cache=not bypass_requested(x_cache_bypass)),
+        media_type="application/x-ndjson",
+        headers={"X-Batch-Id": batch_id, "X-Accel-Buffering": "no"},
+    )
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(
+    job_id: str,
+    wait: float = 0,
+    authorization: str = Header(...),
+    x_refresh_token: str = Header(None),
+):
+    """
+    Job status and, once finished, its structured output.
+    `wait` (seconds, max 60) long-polls until the job finishes.
+    """
+    _, identity = authenticate(authorization, x_refresh_token)
+    job = get_user_job(job_id, identity)
+    if wait > 0 and job["status"] not in TERMINAL_STATES:
+        job = await wait_for_job(job_id, min(wait, 60))
+    return job
+
+
+@app.get("/jobs/{job_id}/events")
+async def stream_job(
+    job_id: str,
+    authorization: str = Header(...),
+    x_refresh_token: str = Header(None),
+):
+    """Server-sent events: one `status` event per state change until the job finishes."""
+    _, identity = authenticate(authorization, x_refresh_token)
+    get_user_job(job_id, identity)
+    return StreamingResponse(
+        job_events(job_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,49 +1,235 @@
 import logging
+import os
+import threading
+import time
 from pathlib import Path
 import sys
 
+import cv2
+
 ROOT = Path(__file__).resolve().parents[1]
 EASYOCR_REPO = ROOT / "easyocr"
 sys.path.insert(0, str(EASYOCR_REPO))
 
 import easyocr
 
+from app.ocr_cache import ocr_cache, OCR_CACHE_ENABLED
+from app.pool import OCR_WORKERS, OCR_POOL_MODE
+
 print("EasyOCR available from:", easyocr.__file__)
 
 WEIGHTS_DIR = ROOT / "weights"
 
+READER_CONFIG = {
+    "lang_list": ["en"],
+    "detect_network": "craft",
+    "recog_network": "english_g2",
+    "quantize": False,
+}
+READTEXT_PARAMS = {"detail": 1}
+# Batch OCR: pages per detector forward pass / crops per recognizer batch
+OCR_PAGE_BATCH = int(os.getenv("OCR_PAGE_BATCH", "4"))
+OCR_RECOG_BATCH = int(os.getenv("OCR_RECOG_BATCH", "32"))
+
+# Constrained decoding of receipt fields: with OCR_DECODER=wordbeamsearch, words and
+# patterns below are decoded inside the beam instead of being fixed up by the LLM later.
+OCR_DECODER = os.getenv("OCR_DECODER", "greedy")
+OCR_LEXICON_FILE = os.getenv("OCR_LEXICON_FILE")  # extra words (vendor names), one per line
+RECEIPT_WORDS = [
+    "TOTAL", "SUBTOTAL", "SUB-TOTAL", "VAT", "TAX", "KES", "KSH", "KSHS", "USD", "EUR", "GBP",
+    "CASH", "CHANGE", "CARD", "MPESA", "M-PESA", "PAID", "BALANCE", "DISCOUNT", "QTY", "AMOUNT",
+    "PRICE", "INVOICE", "RECEIPT", "DATE", "TIME", "TILL", "PIN", "NO", "NO.", "ITEM", "ITEMS",
+]
+RECEIPT_PATTERNS = [
+    r"\d{1,3}(,\d{3})*(\.\d{2})?",                # amounts: 1,250.00
+    r"\d+\.\d{2}",                                # amounts: 1250.00
+    r"\d{1,2}[/.-]\d{1,2}[/.-]\d{2,4}",           # dates: 12/03/2024
+    r"\d{4}-\d{2}-\d{2}",                         # dates: 2024-03-12
+    r"\d{1,2}:\d{2}(:\d{2})?",                    # times: 14:05
+    r"(INV|RCT|NO|#)?[-/#]?[A-Z]{0,3}\d{3,12}",   # invoice / receipt numbers
+]
+if OCR_DECODER != "greedy":
+    READTEXT_PARAMS["decoder"] = OCR_DECODER
+# Faded thermal paper: run low-contrast lines with and without contrast boost in one pass
+if os.getenv("OCR_CONTRAST_SINGLE_PASS", "false").lower() == "true":
+    READTEXT_PARAMS["contrast_single_pass"] = True
+# Recognition batches padded per width bucket (steps of OCR_BUCKET_RATIO x model height)
+# instead of to the widest crop of the call; 0 turns bucketing off
+OCR_BUCKET_RATIO = int(os.getenv("OCR_BUCKET_RATIO", "2"))
+if OCR_BUCKET_RATIO > 0:
+    READTEXT_PARAMS["bucket_ratio"] = OCR_BUCKET_RATIO
+# Detector canvas: "auto" sizes it from the text height of a low-resolution pass
+# (small receipt photos skip the full 2560 pass), or a fixed size in pixels
+OCR_CANVAS_SIZE = os.getenv("OCR_CANVAS_SIZE")
+if OCR_CANVAS_SIZE:
+    READTEXT_PARAMS["canvas_size"] = OCR_CANVAS_SIZE if OCR_CANVAS_SIZE == "auto" else int(OCR_CANVAS_SIZE)
+# Long-running server: read through an easyocr.InferenceSession that keeps ignore masks,
+# collate transforms and text_for_pred tensors between calls instead of rebuilding them per file.
+# Session crops go through PIL like Reader.readtext; OCR_SESSION_PREPROCESS=cv2 opts in to
+# cv2 preprocessing into reused batch buffers (slightly different resampling, so other results)
+OCR_SESSION = os.getenv("OCR_SESSION", "true").lower() == "true"
+OCR_SESSION_PREPROCESS = os.getenv("OCR_SESSION_PREPROCESS", "pil")
+# Inference concurrency: OCR_PARALLEL passes at once x OCR_INTRA_OP_THREADS torch threads each.
+# Process pools run one pass per process; the default splits the cores between the workers.
+OCR_PARALLEL = 1 if OCR_POOL_MODE == "process" else OCR_WORKERS
+OCR_INTRA_OP_THREADS = int(os.getenv("OCR_INTRA_OP_THREADS", "0")) or max(1, (os.cpu_count() or 1) // OCR_WORKERS)
+# Map the model weights from WEIGHTS_DIR/mmap so worker processes share one copy (needs quantize off)
+OCR_MMAP_WEIGHTS = os.getenv("OCR_MMAP_WEIGHTS", "true" if OCR_POOL_MODE == "process" else "false").lower() == "true"
+
+
+def receipt_lexicon_words():
+    words = list(RECEIPT_WORDS)
+    if OCR_LEXICON_FILE and os.path.exists(OCR_LEXICON_FILE):
+        with open(OCR_LEXICON_FILE, encoding="utf-8") as f:
+            words += [line.strip() for line in f if line.strip()]
+    return words
+
 # Lazy initialization
 _reader = None
+_reader_lock = threading.Lock()
 
 def get_reader():
     global _reader
-    if _reader is None:
+    if _reader is not None:
+        return _reader
+    with _reader_lock:
+        if _reader is not None:
+            return _reader
         logging.info("Initializing EasyOCR reader...")
-        _reader = easyocr.Reader(
-            ['en'],
+        reader = easyocr.Reader(
+            READER_CONFIG["lang_list"],
             gpu=False,
             model_storage_directory=WEIGHTS_DIR,
             download_enabled=False,
-            detect_network="craft",
-            recog_network="english_g2",
+            detect_network=READER_CONFIG["detect_network"],
+            recog_network=READER_CONFIG["recog_network"],
             detector=True,
             recognizer=True,
             verbose=True,
             cudnn_benchmark=False,
-            quantize=False
+            quantize=READER_CONFIG["quantize"],
+            mmap_weights=OCR_MMAP_WEIGHTS,
         )
+        if OCR_DECODER == "wordbeamsearch":
+            reader.setLexicon(receipt_lexicon_words(), RECEIPT_PATTERNS, ignore_case=True)
+            logging.info(f"✅ Receipt lexicon attached ({len(reader.converter.lexicon)} entries)")
+        policy = reader.setConcurrency(OCR_PARALLEL, OCR_INTRA_OP_THREADS)
+        if policy.stats()["oversubscribed"]:
+            logging.warning(f"⚠️ OCR concurrency {policy.parallel} x {policy.intra_op_threads} threads "
+                            f"exceeds {policy.cpu_count} cores")
+        else:
+            logging.info(f"✅ OCR concurrency: {policy.parallel} x {policy.intra_op_threads} threads")
+        if OCR_MMAP_WEIGHTS:
+            logging.info(f"✅ OCR weights memory-mapped from {reader.mmap_dir}")
+        _reader = reader
     return _reader
 
 
+def inference_stats() -> dict:
+    """Concurrency policy for /metrics (live counters once the reader is loaded in this process)."""
+    stats = {"pool_mode": OCR_POOL_MODE, "parallel": OCR_PARALLEL,
+             "intra_op_threads": OCR_INTRA_OP_THREADS, "reader_loaded": _reader is not None}
+    if _reader is not None and _reader.concurrency is not None:
+        stats.update(_reader.concurrency.stats())
+    return stats
+
+
+# One session per thread: sessions reuse their buffers, the reader is shared
+_sessions = threading.local()
+
+def get_session():
+    session = getattr(_sessions, "session", None)
+    if session is None:
+        params = {k: v for k, v in READTEXT_PARAMS.items() if k != "detail"}
+        session = easyocr.InferenceSession(get_reader(), batch_size=OCR_RECOG_BATCH,
+                                           preprocess=OCR_SESSION_PREPROCESS, **params)
+        _sessions.session = session
+        logging.info(f"✅ OCR inference session ready ({threading.current_thread().name})")
+    return session
+
+
+def ocr_cache_key(file_path: str) -> str:
+    """SHA-256 of the decoded pixels (falls back to file bytes) + reader/readtext parameters."""
+    pixels = cv2.imread(str(file_path), cv2.IMREAD_UNCHANGED)
+    if pixels is None:
+        pixels = Path(file_path).read_bytes()
+    params = dict(READER_CONFIG, easyocr=easyocr.__version__, **READTEXT_PARAMS)
+    if OCR_DECODER == "wordbeamsearch":
+        params["lexicon"] = [receipt_lexicon_words(), RECEIPT_PATTERNS]
+    if OCR_SESSION:
+        params["session"] = {"batch_size": OCR_RECOG_BATCH, "preprocess": OCR_SESSION_PREPROCESS}
+    return ocr_cache.make_key(pixels, params)
+
+
 def extract_text(file_path: str):
     try:
         logging.info(f"OCR: starting on {file_path}")
-        logging.info(f"OCR using weights dir: {WEIGHTS_DIR}")
-        reader = get_reader()
-        results = reader.readtext(file_path, detail=1)
+        key = ocr_cache_key(file_path) if OCR_CACHE_ENABLED else None
+        results = ocr_cache.get(key) if key else None
+        if results is not None:
+            logging.info(f"OCR cache hit for {file_path}")
+        else:
+            logging.info(f"OCR using weights dir: {WEIGHTS_DIR}")
+            start_time = time.time()
+            if OCR_SESSION:
+                results = get_session().readtext(str(file_path), detail=READTEXT_PARAMS["detail"])
+            else:
+                results = get_reader().readtext(str(file_path), **READTEXT_PARAMS)
+            if key:
+                ocr_cache.put(key, results, time.time() - start_time)
         logging.info(f"OCR results: {results}")
         text = "\n".join([r[1] for r in results])
         return text
     except Exception as e:
         logging.error(f"OCR failed: {e}", exc_info=True)
         return ""
+
+
+def extract_text_batch(file_paths):
+    """
+    OCR several files in one pass: cached files are answered from the OCR cache, the rest go
+    through readtext_pages (batched detection, pooled recognition crops) of the session
+    or, with OCR_SESSION=false, of the reader.
+    Returns one text per file, "" for files that failed.
+    """
+    texts = [""] * len(file_paths)
+    keys = [None] * len(file_paths)
+    pending = []
+    for i, file_path in enumerate(file_paths):
+        try:
+            keys[i] = ocr_cache_key(file_path) if OCR_CACHE_ENABLED else None
+            results = ocr_cache.get(keys[i]) if keys[i] else None
+        except Exception as e:
+            logging.error(f"OCR cache lookup failed for {file_path}: {e}")
+            results = None
+        if results is not None:
+            texts[i] = "\n".join([r[1] for r in results])
+        else:
+            pending.append(i)
+    logging.info(f"Batch OCR: {len(file_paths) - len(pending)} cache hits, {len(pending)} to read")
+    if not pending:
+        return texts
+
+    try:
+        start_time = time.time()
+        paths = [str(file_paths[i]) for i in pending]
+        if OCR_SESSION:
+            results_agg = get_session().readtext_pages(paths, page_batch_size=OCR_PAGE_BATCH,
+                                                       detail=READTEXT_PARAMS["detail"])
+        else:
+            results_agg = get_reader().readtext_pages(paths,
+                                                      page_batch_size=OCR_PAGE_BATCH,
+                                                      batch_size=OCR_RECOG_BATCH,
+                                                      **READTEXT_PARAMS)
+        seconds = (time.time() - start_time) / len(pending)
+    except Exception as e:
+        logging.error(f"Batch OCR failed, falling back to one file at a time: {e}", exc_info=True)
+        for i in pending:
+            texts[i] = extract_text(file_paths[i])
+        return texts
+
+    for i, results in zip(pending, results_agg):
+        if keys[i]:
+            ocr_cache.put(keys[i], results, seconds)
+        texts[i] = "\n".join([r[1] for r in results])
+    return texts
@@ -0,0 +1,152 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# OCR cache settings
+OCR_CACHE_ENABLED = os.getenv("OCR_CACHE_ENABLED", "1") == "1"
+OCR_CACHE_DIR = Path(os.getenv("OCR_CACHE_DIR", "/tmp/ocr_cache"))
+OCR_CACHE_MEMORY_ITEMS = int(os.getenv("OCR_CACHE_MEMORY_ITEMS", "256"))
+OCR_CACHE_DISK_MB = int(os.getenv("OCR_CACHE_DISK_MB", "256"))
+
+
+def _to_json(obj):
+    # numpy scalars / arrays in readtext output (box coords, confidences)
+    if hasattr(obj, "tolist"):
+        return obj.tolist()
+    raise TypeError(f"{type(obj)} is not JSON serializable")
+
+
+class OCRCache:
+    """
+    Content-addressed cache of readtext results.
+    Key = SHA-256 of the decoded pixels + readtext parameters, so renamed or re-encoded
+    copies of the same receipt hit, and changing Reader settings never returns stale text.
+    Two tiers: an in-memory LRU and a JSON-per-entry directory capped at `disk_bytes`
+    (least recently used files are evicted first).
+    """
+
+    def __init__(self, directory: Path = OCR_CACHE_DIR, memory_items: int = OCR_CACHE_MEMORY_ITEMS,
+                 disk_bytes: int = OCR_CACHE_DISK_MB * 1024 * 1024):
+        self.directory = Path(directory)
+        self.memory_items = memory_items
+        self.disk_bytes = disk_bytes
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._disk_usage = None
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.saved_seconds = 0.0
+
+    @staticmethod
+    def make_key(pixels, params: dict) -> str:
+        h = hashlib.sha256()
+        if isinstance(pixels, np.ndarray):
+            h.update(f"{pixels.shape}:{pixels.dtype}".encode())
+            h.update(np.ascontiguousarray(pixels).data)
+        else:
+            h.update(pixels)
+        h.update(json.dumps(params, sort_keys=True, default=str).encode())
+        return h.hexdigest()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}.json"
+
+    def _remember(self, key: str, entry: dict):
+        self._memory[key] = entry
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                self._memory.move_to_end(key)
+                self.memory_hits += 1
+                self.saved_seconds += entry.get("seconds", 0.0)
+                return entry["results"]
+
+        path = self._path(key)
+        try:
+            entry = json.loads(path.read_text(encoding="utf-8"))
+            os.utime(path)  # bump recency for disk eviction
+        except FileNotFoundError:
+            entry = None
+        except Exception as e:
+            logger.warning(f"⚠️ Dropping unreadable OCR cache entry {path}: {e}")
+            path.unlink(missing_ok=True)
+            entry = None
+
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self._remember(key, entry)
+            self.disk_hits += 1
+            self.saved_seconds += entry.get("seconds", 0.0)
+        return entry["results"]
+
+    def put(self, key: str, results, seconds: float):
+        entry = json.loads(json.dumps({"results": results, "seconds": seconds}, default=_to_json))
+        with self._lock:
+            self._remember(key, entry)
+        if self.disk_bytes <= 0:
+            return
+        try:
+            path = self._path(key)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(".tmp")
+            tmp.write_text(json.dumps(entry), encoding="utf-8")
+            os.replace(tmp, path)
+            with self._lock:
+                if self._disk_usage is not None:
+                    self._disk_usage += path.stat().st_size
+            self._evict()
+        except Exception as e:
+            logger.warning(f"⚠️ Could not write OCR cache entry: {e}")
+
+    def _evict(self):
+        with self._lock:
+            if self._disk_usage is not None and self._disk_usage <= self.disk_bytes:
+                return
+            files = []
+            for f in self.directory.glob("*/*.json"):
+                try:
+                    st = f.stat()
+                except FileNotFoundError:
+                    continue
+                files.append((st.st_mtime, st.st_size, f))
+            usage = sum(size for _, size, _ in files)
+            for _, size, f in sorted(files, key=lambda x: x[0]):
+                if usage <= self.disk_bytes:
+                    break
+                f.unlink(missing_ok=True)
+                usage -= size
+            self._disk_usage = usage
+
+    def stats(self) -> dict:
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            total = hits + self.misses
+            return {
+                "enabled": OCR_CACHE_ENABLED,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round(hits / total, 3) if total else 0.0,
+                "saved_seconds": round(self.saved_seconds, 2),
+                "memory_items": len(self._memory),
+                "disk_bytes": self._disk_usage,
+            }
+
+
+ocr_cache = OCRCache()
@@ -1,37 +1,18 @@
 import json
 import logging
 import re
-import requests
 import os
 import time
 from dotenv import load_dotenv
-from pathlib import Path
+
+from app.clients import (get_gemini_model, get_safety_settings, get_session,
+                         backend_timeout, nlp_timeout)
+from app.llm_cache import llm_cache, LLM_CACHE_ENABLED
+from app.report_cache import report_cache
 
 # ✅ Load .env
 load_dotenv()
 
-GCP_PROJECT_ID = os.getenv("GCP_PROJECT_ID")
-GOOGLE_APPLICATION_CREDENTIALS = os.getenv("GOOGLE_APPLICATION_CREDENTIALS")
-
-# ✅ Check Render-mounted secret
-sa_path = Path("/etc/secrets/gcp_sa.json")
-if sa_path.exists():
-    os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = str(sa_path)
-    GOOGLE_APPLICATION_CREDENTIALS = str(sa_path)
-
-# ✅ Normalize Windows path if running locally
-if GOOGLE_APPLICATION_CREDENTIALS and "\\" in GOOGLE_APPLICATION_CREDENTIALS:
-    GOOGLE_APPLICATION_CREDENTIALS = GOOGLE_APPLICATION_CREDENTIALS.replace("\\", "/")
-    os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = GOOGLE_APPLICATION_CREDENTIALS
-
-# ✅ Initialize Vertex AI
-if GCP_PROJECT_ID:
-    try:
-        import vertexai
-        vertexai.init(project=GCP_PROJECT_ID, location="us-central1")
-        print(f"✅ Vertex AI initialized for project {GCP_PROJECT_ID}")
-    except Exception as init_err:
-        print(f"⚠️ Vertex AI init failed: {init_err}")
 # Logging
 logging.basicConfig(
     level=logging.INFO,
@@ -49,13 +30,37 @@ BACKEND_SERVER = os.getenv("BACKEND_SERVER")
 if not BACKEND_SERVER:
     raise ValueError("BACKEND_SERVER environment variable is missing")
 
+# LLM settings; bump PROMPT_VERSION whenever the extraction prompt changes so cached results expire
+GEMINI_MODEL = "gemini-2.5-flash"
+NLP_MODEL = "llama3"
+PROMPT_VERSION = "1"
+
+_gen_cfg = None
 
 
-def parse_with_nlp(text: str) -> dict:
+def _generation_config():
+    global _gen_cfg
+    if _gen_cfg is None:
+        from vertexai.generative_models import GenerationConfig
+        _gen_cfg = GenerationConfig(temperature=0.2, top_p=0.9, max_output_tokens=1024)
+    return _gen_cfg
+
+
+def parse_with_nlp(text: str, use_cache: bool = True) -> dict:
     """
     Calls Gemini/Vertex first, then NLP server to extract structured document fields
     matching the Django Document model.
+    Successful extractions are memoized by normalized OCR text; use_cache=False skips the lookup.
     """
+    gemini_key = llm_cache.make_key(text, PROMPT_VERSION, GEMINI_MODEL)
+    nlp_key = llm_cache.make_key(text, PROMPT_VERSION, NLP_MODEL)
+    if use_cache and LLM_CACHE_ENABLED:
+        for key in (gemini_key, nlp_key):
+            cached = llm_cache.get(key)
+            if cached is not None:
+                logger.info(f"✅ LLM cache hit, skipping model call: {cached}")
+                return cached
+
     prompt = f"""Extract all the following fields from this business document OCR text if available.
 Financial numbers MUST NOT contain commas. Add .00 if integer to match DecimalField format.
 Any field related to total, payment, loan amount, equity, amount paid, balance, or total payroll 
@@ -70,27 +75,13 @@ Document OCR text:
 
     # --- Gemini / Vertex ---
     try:
-        from vertexai import init as vertex_init
-        from vertexai.generative_models import GenerativeModel, GenerationConfig, SafetySetting
-
-        vertex_init(project=GCP_PROJECT_ID, location="us-central1")
-        gemini_model = GenerativeModel("gemini-2.5-flash")
-
-        # ✅ Valid safety categories only
-        safety_settings = [
-            SafetySetting(category="HARM_CATEGORY_DANGEROUS_CONTENT", threshold="BLOCK_LOW_AND_ABOVE"),
-            SafetySetting(category="HARM_CATEGORY_HARASSMENT", threshold="BLOCK_LOW_AND_ABOVE"),
-            SafetySetting(category="HARM_CATEGORY_SEXUALLY_EXPLICIT", threshold="BLOCK_LOW_AND_ABOVE"),
-            SafetySetting(category="HARM_CATEGORY_HATE_SPEECH", threshold="BLOCK_LOW_AND_ABOVE"),
-        ]
-
-        gen_cfg = GenerationConfig(temperature=0.2, top_p=0.9, max_output_tokens=1024)
+        gemini_model = get_gemini_model(GEMINI_MODEL)
 
         start_time = time.time()
         response = gemini_model.generate_content(
             [prompt],
-            generation_config=gen_cfg,
-            safety_settings=safety_settings
+            generation_config=_generation_config(),
+            safety_settings=get_safety_settings()
         )
         latency = time.time() - start_time
 
@@ -102,6 +93,8 @@ Document OCR text:
                 try:
                     structured = json.loads(match.group())
                     logger.info(f"Structured data from Gemini: {structured}")
+                    if LLM_CACHE_ENABLED:
+                        llm_cache.put(gemini_key, GEMINI_MODEL, structured)
                     return structured
                 except json.JSONDecodeError:
                     logger.warning("Could not decode JSON from Gemini output.")
@@ -111,10 +104,10 @@ Document OCR text:
     # --- NLP Server Fallback ---
     try:
         payload = {
-            "model": "llama3",
+            "model": NLP_MODEL,
             "prompt": prompt,
         }
-        response = requests.post(NLP_SERVER, json=payload, timeout=3000, stream=True)
+        response = get_session("nlp").post(NLP_SERVER, json=payload, timeout=nlp_timeout())
         response.raise_for_status()
         result = response.json()
         llm_text = result.get("response", "").strip()
@@ -124,6 +117,8 @@ Document OCR text:
             try:
                 structured = json.loads(match.group())
                 logger.info(f"Structured data from NLP server: {structured}")
+                if LLM_CACHE_ENABLED:
+                    llm_cache.put(nlp_key, NLP_MODEL, structured)
                 return structured
             except json.JSONDecodeError:
                 logger.warning("Could not decode JSON from NLP output.")
@@ -182,7 +177,8 @@ def save_to_db(data: dict, raw_text: str, token: str, identity: dict):
         headers["Authorization"] = f"Bearer {token}"
 
     try:
-        response = requests.post(BACKEND_SERVER, json=payload, headers=headers, timeout=3050)
+        response = get_session("backend").post(BACKEND_SERVER, json=payload, headers=headers,
+                                               timeout=backend_timeout())
         if response.status_code >= 400:
             logger.error(f"Django rejected document (status {response.status_code}): {response.text}")
         else:
@@ -195,10 +191,11 @@ def save_to_db(data: dict, raw_text: str, token: str, identity: dict):
         raise
 
 
-def process_invoice(text: str, token: str, identity: dict):
-    structured_data = parse_with_nlp(text)
+def process_invoice(text: str, token: str, identity: dict, use_cache: bool = True):
+    structured_data = parse_with_nlp(text, use_cache=use_cache)
     logger.info("Saving to Django ERP...")
     save_to_db(structured_data, text, token, identity)
+    report_cache.invalidate(identity.get("user_id"))
     logger.info("Document data saved to Django ERP: {json.dumps(payload, indent=2)}")
     return structured_data
 
@@ -211,7 +208,7 @@ def query_nlp(prompt: str, model: str = "llama3") -> str:
             "max_tokens": 512,
             "temperature": 0.2
         }
-        response = requests.post(NLP_SERVER, json=payload, timeout=3000, stream=True)
+        response = get_session("nlp").post(NLP_SERVER, json=payload, timeout=nlp_timeout())
         response.raise_for_status()
         result = response.json()
         llm_text = result.get("response", "").strip()
@@ -0,0 +1,124 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+logger = logging.getLogger(__name__)
+
+# OCR pool settings
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", "2"))
+OCR_QUEUE_DEPTH = int(os.getenv("OCR_QUEUE_DEPTH", "8"))
+OCR_POOL_MODE = os.getenv("OCR_POOL_MODE", "thread")  # thread | process
+OCR_RETRY_AFTER = int(os.getenv("OCR_RETRY_AFTER", "10"))
+
+
+class PoolFull(Exception):
+    """Raised when every worker is busy and the wait queue is full."""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"OCR queue is full, retry in {retry_after}s")
+        self.retry_after = retry_after
+
+
+class OCRPool:
+    """
+    Bounded executor for blocking OCR work.
+    At most `workers` jobs run at once and at most `queue_depth` more wait for a slot;
+    anything beyond that is rejected with PoolFull instead of piling up.
+    """
+
+    def __init__(self, workers: int = OCR_WORKERS, queue_depth: int = OCR_QUEUE_DEPTH,
+                 mode: str = OCR_POOL_MODE, retry_after: int = OCR_RETRY_AFTER):
+        self.workers = max(1, workers)
+        self.queue_depth = max(0, queue_depth)
+        self.mode = mode
+        self.retry_after = retry_after
+        self._executor = None
+        self._slots = threading.BoundedSemaphore(self.workers + self.queue_depth)
+        self._lock = threading.Lock()
+        self._inflight = 0
+        self._rejected = 0
+
+    @property
+    def executor(self):
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    if self.mode == "process":
+                        # spawn: forking a process that already holds torch threads can deadlock
+                        self._executor = ProcessPoolExecutor(
+                            max_workers=self.workers,
+                            mp_context=multiprocessing.get_context("spawn"),
+                        )
+                    else:
+                        self._executor = ThreadPoolExecutor(
+                            max_workers=self.workers, thread_name_prefix="ocr"
+                        )
+                    logger.info(f"✅ OCR pool started: mode={self.mode} workers={self.workers} "
+                                f"queue_depth={self.queue_depth}")
+        return self._executor
+
+    def _release(self, _future):
+        with self._lock:
+            self._inflight -= 1
+        self._slots.release()
+
+    def submit(self, fn, *args, **kwargs):
+        """Schedule fn on the pool and return a concurrent.futures.Future, or raise PoolFull."""
+        return self._submit(fn, args, kwargs)
+
+    def _submit(self, fn, args, kwargs, count_rejected=True):
+        if not self._slots.acquire(blocking=False):
+            if count_rejected:
+                with self._lock:
+                    self._rejected += 1
+            raise PoolFull(self.retry_after)
+        with self._lock:
+            self._inflight += 1
+        try:
+            future = self.executor.submit(fn, *args, **kwargs)
+        except Exception:
+            self._release(None)
+            raise
+        future.add_done_callback(self._release)
+        return future
+
+    async def run(self, fn, *args, **kwargs):
+        """Await fn on the pool without blocking the event loop."""
+        return await asyncio.wrap_future(self.submit(fn, *args, **kwargs))
+
+    async def submit_when_free(self, fn, *args, poll_interval: float = 0.5, **kwargs):
+        """Like submit(), but waits for a free slot instead of raising PoolFull (for already-accepted work)."""
+        while True:
+            try:
+                return self._submit(fn, args, kwargs, count_rejected=False)
+            except PoolFull:
+                await asyncio.sleep(poll_interval)
+
+    async def run_when_free(self, fn, *args, poll_interval: float = 0.5, **kwargs):
+        """Like run(), but waits for a free slot instead of raising PoolFull (for already-accepted work)."""
+        future = await self.submit_when_free(fn, *args, poll_interval=poll_interval, **kwargs)
+        return await asyncio.wrap_future(future)
+
+    def stats(self) -> dict:
+        with self._lock:
+            inflight = self._inflight
+            rejected = self._rejected
+        return {
+            "mode": self.mode,
+            "workers": self.workers,
+            "queue_depth": self.queue_depth,
+            "running": min(inflight, self.workers),
+            "queued": max(0, inflight - self.workers),
+            "rejected": rejected,
+        }
+
+    def shutdown(self, wait: bool = True):
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
+
+
+ocr_pool = OCRPool()
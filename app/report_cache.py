@@ -0,0 +1,81 @@
+import json
+import os
+import threading
+import time
+
+# Copilot report cache settings
+COPILOT_REPORT_TTL = float(os.getenv("COPILOT_REPORT_TTL", "60"))
+JOB_BACKEND = os.getenv("JOB_BACKEND", "memory")  # see app/jobs.py
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+
+class ReportCache:
+    """
+    Short-lived per-user cache of the balance sheet / P&L / cash flow used by /copilot.
+    Follow-up chat messages reuse the reports; a new upload for the user invalidates them.
+    Callers without a user_id are never cached.
+    Kept in this process, so only for the in-process job backend (see RedisReportCache).
+    """
+
+    def __init__(self, ttl: float = COPILOT_REPORT_TTL):
+        self.ttl = ttl
+        self._reports = {}
+        self._lock = threading.Lock()
+
+    def get(self, user_id):
+        if not user_id:
+            # tokens without a user_id would all share the key "None"
+            return None
+        with self._lock:
+            entry = self._reports.get(str(user_id))
+            if entry is None:
+                return None
+            expires_at, reports = entry
+            if expires_at < time.monotonic():
+                del self._reports[str(user_id)]
+                return None
+            return reports
+
+    def put(self, user_id, reports: dict):
+        if self.ttl <= 0 or not user_id:
+            return
+        with self._lock:
+            self._reports[str(user_id)] = (time.monotonic() + self.ttl, reports)
+
+    def invalidate(self, user_id):
+        with self._lock:
+            self._reports.pop(str(user_id), None)
+
+
+class RedisReportCache:
+    """
+    ReportCache in Redis for JOB_BACKEND=celery: uploads are saved (and invalidate the
+    user's reports) in the Celery worker, which must reach the API processes' cache.
+    """
+
+    def __init__(self, url: str = REDIS_URL, ttl: float = COPILOT_REPORT_TTL, client=None):
+        if client is None:
+            import redis
+            client = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self._redis = client
+
+    def _key(self, user_id) -> str:
+        return f"autobooks:reports:{user_id}"
+
+    def get(self, user_id):
+        if not user_id:
+            return None
+        raw = self._redis.get(self._key(user_id))
+        return json.loads(raw) if raw else None
+
+    def put(self, user_id, reports: dict):
+        if self.ttl <= 0 or not user_id:
+            return
+        self._redis.set(self._key(user_id), json.dumps(reports), px=int(self.ttl * 1000))
+
+    def invalidate(self, user_id):
+        self._redis.delete(self._key(user_id))
+
+
+report_cache = RedisReportCache() if JOB_BACKEND == "celery" else ReportCache()
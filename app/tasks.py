@@ -0,0 +1,21 @@
+"""
+Celery worker for JOB_BACKEND=celery.
+Run with: celery -A app.tasks worker --concurrency=2
+"""
+from celery import Celery
+
+from app.jobs import REDIS_URL, RedisJobStore, run_pipeline
+
+celery_app = Celery("autobooks", broker=REDIS_URL, backend=REDIS_URL)
+celery_app.conf.update(
+    task_acks_late=True,
+    worker_prefetch_multiplier=1,
+)
+
+store = RedisJobStore()
+
+
+@celery_app.task(name="autobooks.process_upload_job")
+def process_upload_job(job_id: str, token: str, identity: dict):
+    job = run_pipeline(job_id, token, identity, store)
+    return job["status"] if job else None
@@ -1,9 +1,10 @@
 import os
-import requests
 from jose import jwt, JWTError, ExpiredSignatureError
 import logging
 from fastapi import HTTPException
 
+from app.clients import get_session, backend_timeout
+
 # Setup logging
 logging.basicConfig(
     level=logging.INFO,
@@ -34,9 +35,10 @@ def decode_token(token: str, refresh_token: str = None):
     except ExpiredSignatureError:
         if refresh_token:
             try:
-                response = requests.post(
+                response = get_session("backend").post(
                     f"{BACKEND_API}/token/refresh/",
-                    json={"refresh": refresh_token}
+                    json={"refresh": refresh_token},
+                    timeout=backend_timeout(30)
                 )
                 if response.status_code == 200:
                     new_access = response.json().get("access")
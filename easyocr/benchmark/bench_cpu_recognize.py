@@ -0,0 +1,62 @@
+"""
+CPU recognition throughput: per-box path vs cpu_batching (width-bucketed batches).
+
+Usage (from EasyOCR/):
+    python ./benchmark/bench_cpu_recognize.py --model_dir ../weights --image_dir ../receipts
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import easyocr
+from easyocr.utils import reformat_input
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..')
+
+
+def time_recognize(reader, pages, repeat, **kwargs):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for grey, horizontal_list, free_list in pages:
+            reader.recognize(grey, horizontal_list, free_list, reformat=False, **kwargs)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main(args):
+    reader = easyocr.Reader(['en'], gpu=False, model_storage_directory=args.model_dir,
+                            download_enabled=False, recog_network='english_g2',
+                            verbose=False, quantize=False)
+
+    pages, n_boxes = [], 0
+    for name in sorted(os.listdir(args.image_dir)):
+        if not name.lower().endswith(('.png', '.jpg', '.jpeg')):
+            continue
+        img, grey = reformat_input(os.path.join(args.image_dir, name))
+        horizontal_list, free_list = reader.detect(img, reformat=False)
+        pages.append((grey, horizontal_list[0], free_list[0]))
+        n_boxes += len(horizontal_list[0]) + len(free_list[0])
+    print("{} images, {} boxes".format(len(pages), n_boxes))
+
+    per_box = time_recognize(reader, pages, args.repeat, batch_size=args.batch_size)
+    batched = time_recognize(reader, pages, args.repeat, batch_size=args.batch_size, cpu_batching=True,
+                             bucket_ratio=args.bucket_ratio)
+    print("per-box     : {:8.1f} boxes/s ({:.2f}s)".format(n_boxes/per_box, per_box))
+    print("cpu_batching: {:8.1f} boxes/s ({:.2f}s)".format(n_boxes/batched, batched))
+    print("speedup     : {:.2f}x".format(per_box/batched))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark EasyOCR CPU recognition batching.",
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("-m", "--model_dir", default=os.path.join(ROOT, 'weights'), help="Directory with craft_mlt_25k.pth and english_g2.pth.")
+    parser.add_argument("-d", "--image_dir", default=os.path.join(ROOT, 'receipts'), help="Directory of receipt images.")
+    parser.add_argument("-b", "--batch_size", default=16, type=int, help="Recognizer batch size.")
+    parser.add_argument("--bucket_ratio", default=2, type=int, help="Width bucket step for cpu_batching (0: no buckets).")
+    parser.add_argument("-r", "--repeat", default=3, type=int, help="Repeats per mode (best time is reported).")
+    args = parser.parse_args()
+    main(args)
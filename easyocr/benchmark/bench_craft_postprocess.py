@@ -0,0 +1,151 @@
+"""
+CRAFT post-processing: getDetBoxes_core with a full-heatmap mask per component (the
+previous implementation, kept below as reference) vs the ROI-local version in craft_utils.
+Score maps are captured from the detector on a real page; both versions run on them and
+their boxes are compared (any difference is reported).
+
+Usage (from EasyOCR/):
+    python ./benchmark/bench_craft_postprocess.py --model_dir ../weights --image ../receipts/invoice.png
+"""
+import argparse
+import math
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import easyocr
+from easyocr import craft_utils
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..')
+
+
+def reference_getDetBoxes_core(textmap, linkmap, text_threshold, link_threshold, low_text, estimate_num_chars=False):
+    """getDetBoxes_core before the ROI-local rewrite: O(components x H x W)."""
+    from scipy.ndimage import label
+    linkmap = linkmap.copy()
+    textmap = textmap.copy()
+    img_h, img_w = textmap.shape
+
+    ret, text_score = cv2.threshold(textmap, low_text, 1, 0)
+    ret, link_score = cv2.threshold(linkmap, link_threshold, 1, 0)
+
+    text_score_comb = np.clip(text_score + link_score, 0, 1)
+    nLabels, labels, stats, centroids = cv2.connectedComponentsWithStats(text_score_comb.astype(np.uint8), connectivity=4)
+
+    det = []
+    mapper = []
+    for k in range(1,nLabels):
+        size = stats[k, cv2.CC_STAT_AREA]
+        if size < 10: continue
+
+        if np.max(textmap[labels==k]) < text_threshold: continue
+
+        segmap = np.zeros(textmap.shape, dtype=np.uint8)
+        segmap[labels==k] = 255
+        if estimate_num_chars:
+            _, character_locs = cv2.threshold((textmap - linkmap) * segmap /255., text_threshold, 1, 0)
+            _, n_chars = label(character_locs)
+            mapper.append(n_chars)
+        else:
+            mapper.append(k)
+        segmap[np.logical_and(link_score==1, text_score==0)] = 0
+        x, y = stats[k, cv2.CC_STAT_LEFT], stats[k, cv2.CC_STAT_TOP]
+        w, h = stats[k, cv2.CC_STAT_WIDTH], stats[k, cv2.CC_STAT_HEIGHT]
+        niter = int(math.sqrt(size * min(w, h) / (w * h)) * 2)
+        sx, ex, sy, ey = x - niter, x + w + niter + 1, y - niter, y + h + niter + 1
+        if sx < 0 : sx = 0
+        if sy < 0 : sy = 0
+        if ex >= img_w: ex = img_w
+        if ey >= img_h: ey = img_h
+        kernel = cv2.getStructuringElement(cv2.MORPH_RECT,(1 + niter, 1 + niter))
+        segmap[sy:ey, sx:ex] = cv2.dilate(segmap[sy:ey, sx:ex], kernel)
+
+        np_contours = np.roll(np.array(np.where(segmap!=0)),1,axis=0).transpose().reshape(-1,2)
+        rectangle = cv2.minAreaRect(np_contours)
+        box = cv2.boxPoints(rectangle)
+
+        w, h = np.linalg.norm(box[0] - box[1]), np.linalg.norm(box[1] - box[2])
+        box_ratio = max(w, h) / (min(w, h) + 1e-5)
+        if abs(1 - box_ratio) <= 0.1:
+            l, r = min(np_contours[:,0]), max(np_contours[:,0])
+            t, b = min(np_contours[:,1]), max(np_contours[:,1])
+            box = np.array([[l, t], [r, t], [r, b], [l, b]], dtype=np.float32)
+
+        startidx = box.sum(axis=1).argmin()
+        box = np.roll(box, 4-startidx, 0)
+        box = np.array(box)
+
+        det.append(box)
+
+    return det, labels, mapper
+
+
+def capture_maps(reader, image, canvas_size, mag_ratio):
+    """Run reader.detect once and keep the arguments getDetBoxes_core was called with."""
+    calls = []
+    core = craft_utils.getDetBoxes_core
+
+    def capture(*args, **kwargs):
+        calls.append((args, kwargs))
+        return core(*args, **kwargs)
+
+    craft_utils.getDetBoxes_core = capture
+    try:
+        start = time.perf_counter()
+        reader.detect(image, canvas_size=canvas_size, mag_ratio=mag_ratio)
+        seconds = time.perf_counter() - start
+    finally:
+        craft_utils.getDetBoxes_core = core
+    return calls, seconds
+
+
+def best_time(fn, repeat):
+    best, out = float('inf'), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        out = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, out
+
+
+def same_output(a, b):
+    return len(a[0]) == len(b[0]) and all(np.array_equal(x, y) for x, y in zip(a[0], b[0]))\
+        and list(a[2]) == list(b[2]) and np.array_equal(a[1], b[1])
+
+
+def main(args):
+    reader = easyocr.Reader(['en'], gpu=False, model_storage_directory=args.model_dir,
+                            download_enabled=False, recognizer=False, verbose=False, quantize=False)
+    calls, t_detect = capture_maps(reader, args.image, args.canvas_size, args.mag_ratio)
+    textmap = calls[0][0][0]
+    print("{}: score map {}x{}, detect() {:.2f}s".format(os.path.basename(args.image),
+                                                         textmap.shape[1], textmap.shape[0], t_detect))
+
+    failed = 0
+    for estimate_num_chars in (False, True):
+        def run(core):
+            return [core(*call_args[:5], estimate_num_chars=estimate_num_chars) for call_args, _ in calls]
+        t_ref, ref = best_time(lambda: run(reference_getDetBoxes_core), args.repeat)
+        t_new, new = best_time(lambda: run(craft_utils.getDetBoxes_core), args.repeat)
+        same = all(same_output(a, b) for a, b in zip(ref, new))
+        failed += not same
+        print("estimate_num_chars={!s:5}: {} boxes, reference {:.3f}s, ROI-local {:.3f}s, speedup {:.1f}x, identical: {}".format(
+            estimate_num_chars, sum(len(r[0]) for r in new), t_ref, t_new, t_ref/t_new, same))
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark CRAFT getDetBoxes_core post-processing.",
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("-m", "--model_dir", default=os.path.join(ROOT, 'weights'), help="Directory with craft_mlt_25k.pth.")
+    parser.add_argument("-i", "--image", default=os.path.join(ROOT, 'receipts', 'invoice.png'), help="Page to detect.")
+    parser.add_argument("-c", "--canvas_size", default=2560, type=int, help="Detector canvas size.")
+    parser.add_argument("--mag_ratio", default=1., type=float, help="Detector magnification ratio.")
+    parser.add_argument("-r", "--repeat", default=3, type=int, help="Repeats per version (best time is reported).")
+    args = parser.parse_args()
+    sys.exit(main(args))
@@ -0,0 +1,86 @@
+"""
+CTC beam search: per-crop ctcBeamSearch vs batched ctcBeamSearchBatch, timed on
+probability matrices captured from the recognizer on real images. That both decode the
+same text is checked by the unit test (unit_test/property_test.py, check_beamsearch).
+
+Usage (from EasyOCR/):
+    python ./benchmark/bench_ctc_beamsearch.py --model_dir ../weights --image_dir ./examples
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+import easyocr
+from easyocr.utils import ctcBeamSearch
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..')
+
+
+def capture_matrices(reader, image_dir, beamWidth):
+    """Run readtext(decoder='beamsearch') on every image and keep the (batch, T, C) matrices."""
+    mats = []
+    decode = reader.converter.decode_beamsearch
+
+    def capture(mat, beamWidth=5, **kwargs):
+        mats.append(mat.copy())
+        return decode(mat, beamWidth=beamWidth, **kwargs)
+
+    reader.converter.decode_beamsearch = capture
+    try:
+        for name in sorted(os.listdir(image_dir)):
+            if name.lower().endswith(('.png', '.jpg', '.jpeg')):
+                reader.readtext(os.path.join(image_dir, name), decoder='beamsearch', beamWidth=beamWidth)
+    finally:
+        reader.converter.decode_beamsearch = decode
+    return mats
+
+
+def best_time(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main(args):
+    reader = easyocr.Reader(['en'], gpu=False, model_storage_directory=args.model_dir,
+                            download_enabled=False, recog_network='english_g2',
+                            verbose=False, quantize=False)
+    converter = reader.converter
+    mats = capture_matrices(reader, args.image_dir, args.beam_width)
+    n_crops = sum(len(mat) for mat in mats)
+    print("{} batches, {} crops".format(len(mats), n_crops))
+
+    def per_crop():
+        return [[ctcBeamSearch(m, converter.character, converter.ignore_idx, None, beamWidth=args.beam_width)
+                 for m in mat] for mat in mats]
+
+    def batched():
+        return [converter.decode_beamsearch(mat, beamWidth=args.beam_width) for mat in mats]
+
+    t_ref = best_time(per_crop, args.repeat)
+    t_new = best_time(batched, args.repeat)
+    print("ctcBeamSearch     : {:8.1f} crops/s ({:.3f}s)".format(n_crops/t_ref, t_ref))
+    print("ctcBeamSearchBatch: {:8.1f} crops/s ({:.3f}s)".format(n_crops/t_new, t_new))
+    print("speedup           : {:.2f}x".format(t_ref/t_new))
+    if args.topk:
+        t_topk = best_time(lambda: [converter.decode_beamsearch(mat, beamWidth=args.beam_width, topk=args.topk)
+                                    for mat in mats], args.repeat)
+        print("batched topk={}    : {:8.1f} crops/s ({:.3f}s)".format(args.topk, n_crops/t_topk, t_topk))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark EasyOCR CTC beam search decoders.",
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("-m", "--model_dir", default=os.path.join(ROOT, 'weights'), help="Directory with craft_mlt_25k.pth and english_g2.pth.")
+    parser.add_argument("-d", "--image_dir", default=os.path.join(ROOT, 'easyocr', 'examples'), help="Directory of test images (the unit-test images by default).")
+    parser.add_argument("-w", "--beam_width", default=5, type=int, help="Beam width.")
+    parser.add_argument("-k", "--topk", default=0, type=int, help="Also time the batched decoder with top-k character pruning.")
+    parser.add_argument("-r", "--repeat", default=3, type=int, help="Repeats per decoder (best time is reported).")
+    args = parser.parse_args()
+    main(args)
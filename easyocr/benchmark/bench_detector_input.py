@@ -0,0 +1,98 @@
+"""
+CRAFT detector input: the previous preprocessing in detection.test_net (resize into a zero
+float32 canvas, normalizeMeanVariance copies, transpose, np.array stack, torch.from_numpy)
+vs detection.prepare_input (resize, then normalize straight into a reused NCHW buffer from
+a DetectorInputPool). That both give the same input is checked by the unit test
+(unit_test/property_test.py, check_detector_input).
+
+MB copied counts the bytes written to full-frame arrays per page, step by step as listed
+in copied_mb; peak MB is the largest numpy allocation seen by tracemalloc while a page is
+prepared (the pooled torch buffer itself is allocated once, outside the measured calls).
+
+Usage (from EasyOCR/):
+    python ./benchmark/bench_detector_input.py --image ../receipts/invoice.png --canvas_size 1280 2560
+"""
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'unit_test'))
+
+import torch
+from easyocr.detection import DetectorInputPool, prepare_input
+from easyocr.imgproc import aspect_ratio_size
+from property_test import reference_detector_input
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..')
+
+
+def copied_mb(shape, canvas_size, mag_ratio):
+    """Bytes written per page by each path: {'reference': MB, 'pooled': MB}."""
+    ratio, (h, w), (h32, w32) = aspect_ratio_size(shape[0], shape[1], canvas_size, mag_ratio)
+    resized, image, canvas = h*w*3, h*w*3*4, h32*w32*3*4
+    reference = resized + canvas + image + canvas*5  # resize, zero canvas, paste, copy, astype, -=, /=, stack
+    pooled = resized + image*2 + (canvas - image)    # resize, subtract, divide, padding
+    return {'reference': reference/2.**20, 'pooled': pooled/2.**20}
+
+
+def best_time(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def peak_mb(fn):
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak/2.**20
+
+
+def main(args):
+    img = cv2.cvtColor(cv2.imread(args.image), cv2.COLOR_BGR2RGB)
+    image_arrs = np.stack([img]*args.batch)
+    pool = DetectorInputPool()
+    print("{}: {}x{}, batch {}".format(os.path.basename(args.image), img.shape[1], img.shape[0], args.batch))
+    print("{:>7} {:>10} {:>12} {:>11} {:>12} {:>11}".format('canvas', 'path', 'MB copied', 'peak MB', 'ms / page', 'speedup'))
+
+    def reference(canvas_size):
+        return torch.from_numpy(reference_detector_input(image_arrs, canvas_size, args.mag_ratio)[0])
+
+    def pooled(canvas_size):
+        x, ratio, buffer = prepare_input(image_arrs, canvas_size, args.mag_ratio, pool, 'cpu')
+        pool.release(buffer)
+        return x
+
+    for canvas_size in args.canvas_size:
+        pooled(canvas_size)  # the pool allocates its buffer here, outside the measured calls
+        mb = copied_mb(img.shape, canvas_size, args.mag_ratio)
+        t_ref = best_time(lambda: reference(canvas_size), args.repeat)
+        t_new = best_time(lambda: pooled(canvas_size), args.repeat)
+        peak_ref = peak_mb(lambda: reference(canvas_size))
+        peak_new = peak_mb(lambda: pooled(canvas_size))
+        print("{:7d} {:>10} {:12.1f} {:11.1f} {:12.2f} {:>11}".format(
+            canvas_size, 'reference', mb['reference'], peak_ref/args.batch, 1000*t_ref/args.batch, ''))
+        print("{:7d} {:>10} {:12.1f} {:11.1f} {:12.2f} {:10.1f}x".format(
+            canvas_size, 'pooled', mb['pooled'], peak_new/args.batch, 1000*t_new/args.batch, t_ref/t_new))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark CRAFT detector input preprocessing.",
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("-i", "--image", default=os.path.join(ROOT, 'receipts', 'invoice.png'), help="Page to prepare.")
+    parser.add_argument("-c", "--canvas_size", default=[1280, 2560], type=int, nargs='+', help="Detector canvas sizes.")
+    parser.add_argument("--mag_ratio", default=1., type=float, help="Detector magnification ratio.")
+    parser.add_argument("-b", "--batch", default=1, type=int, help="Pages per call (copies of the same page).")
+    parser.add_argument("-r", "--repeat", default=5, type=int, help="Repeats per path (best time is reported).")
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,53 @@
+"""
+Box grouping after the networks: group_text_box and get_paragraph, array-based (default)
+vs the original implementations (reference=True), timed on one random page of text lines
+(integer polys as the detectors return them, with some slanted boxes). That both give the
+same results is checked by the unit test (unit_test/property_test.py, check_layout).
+
+Usage (from EasyOCR/):
+    python ./benchmark/bench_layout.py --boxes 3000
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'unit_test'))
+
+from easyocr.utils import group_text_box, get_paragraph
+from property_test import random_polys, paragraph_input
+
+
+def best_time(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main(args):
+    rng = np.random.default_rng(args.seed)
+    polys = random_polys(rng, args.boxes)
+    merged, _ = group_text_box(polys)
+    raw = paragraph_input(rng, merged)
+    print("{} polys -> {} merged boxes".format(len(polys), len(merged)))
+    for name, fn in (('group_text_box', lambda reference: group_text_box(polys, reference=reference)),
+                     ('get_paragraph', lambda reference: get_paragraph(raw, reference=reference))):
+        t_ref = best_time(lambda: fn(True), args.repeat)
+        t_new = best_time(lambda: fn(False), args.repeat)
+        print("{:15}: reference {:8.3f}s, arrays {:8.3f}s, speedup {:.1f}x".format(name, t_ref, t_new, t_ref/t_new))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark EasyOCR box grouping.",
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("-n", "--boxes", default=3000, type=int, help="Boxes on the timed page.")
+    parser.add_argument("-s", "--seed", default=0, type=int, help="Random seed.")
+    parser.add_argument("-r", "--repeat", default=3, type=int, help="Repeats per implementation (best time is reported).")
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,78 @@
+"""
+Memory of several OCR worker processes: weights read with torch.load (one private copy
+per process) vs memory-mapped (Reader(mmap_weights=True), pages shared through the page cache).
+Every worker loads a Reader, reads one image and reports its memory while all workers
+are alive. PSS splits shared pages between the processes that map them, so it shows
+what an extra worker really costs.
+
+Usage (from EasyOCR/):
+    python ./benchmark/bench_mmap_weights.py --model_dir ../weights --workers 4
+"""
+import argparse
+import multiprocessing
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..')
+
+
+def memory_mb():
+    """RSS, PSS and private (USS) memory of this process in MB, from /proc/self/smaps_rollup."""
+    fields = {}
+    with open('/proc/self/smaps_rollup') as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[2] == 'kB':
+                fields[parts[0].rstrip(':')] = int(parts[1])/1024.
+    return {'rss': fields['Rss'], 'pss': fields['Pss'],
+            'uss': fields['Private_Clean'] + fields['Private_Dirty']}
+
+
+def worker(args, mmap_weights, barrier, results):
+    import torch
+    import easyocr
+    torch.set_num_threads(1)
+    reader = easyocr.Reader(['en'], gpu=False, model_storage_directory=args.model_dir,
+                            download_enabled=False, recog_network='english_g2',
+                            verbose=False, quantize=False, mmap_weights=mmap_weights)
+    reader.readtext(args.image)
+    barrier.wait()
+    results.put(memory_mb())
+    barrier.wait()
+
+
+def run(args, mmap_weights):
+    ctx = multiprocessing.get_context('spawn')
+    barrier, results = ctx.Barrier(args.workers), ctx.Queue()
+    procs = [ctx.Process(target=worker, args=(args, mmap_weights, barrier, results)) for _ in range(args.workers)]
+    for p in procs:
+        p.start()
+    stats = [results.get() for _ in procs]
+    for p in procs:
+        p.join()
+    return {key: sum(s[key] for s in stats)/len(stats) for key in stats[0]}
+
+
+def main(args):
+    if not args.mmap_only:
+        # build the mapped copies first so the conversion is not measured
+        run(argparse.Namespace(**dict(vars(args), workers=1)), True)
+    print("{} workers, image {}".format(args.workers, os.path.basename(args.image)))
+    print("{:8} {:>10} {:>10} {:>10}".format('weights', 'RSS MB', 'PSS MB', 'USS MB'))
+    for mmap_weights in ([True] if args.mmap_only else [False, True]):
+        mem = run(args, mmap_weights)
+        print("{:8} {:10.1f} {:10.1f} {:10.1f}".format('mmap' if mmap_weights else 'load',
+                                                       mem['rss'], mem['pss'], mem['uss']))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark memory of EasyOCR worker processes with mapped weights.",
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("-m", "--model_dir", default=os.path.join(ROOT, 'weights'), help="Directory with craft_mlt_25k.pth and english_g2.pth.")
+    parser.add_argument("-i", "--image", default=os.path.join(ROOT, 'easyocr', 'examples', 'english.png'), help="Image each worker reads.")
+    parser.add_argument("-n", "--workers", default=4, type=int, help="Worker processes alive at once.")
+    parser.add_argument("--mmap_only", action="store_true", help="Only measure mapped weights.")
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,89 @@
+"""
+Recognizer input preprocessing: PIL (ListDataset + AlignCollate) vs cv2 (AlignCollateCV).
+Crops are cut at random from the grey images, so no model weights are needed.
+
+Usage (from EasyOCR/):
+    python ./benchmark/bench_preprocess.py --image_dir ../receipts
+"""
+import argparse
+import math
+import os
+import sys
+import time
+
+import cv2
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..'))
+
+from easyocr.config import imgH
+from easyocr.recognition import AlignCollate, AlignCollateCV, ListDataset
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..')
+
+
+def random_crops(image_dir, n, seed=0):
+    rng = np.random.default_rng(seed)
+    pages = [cv2.imread(os.path.join(image_dir, name), cv2.IMREAD_GRAYSCALE)
+             for name in sorted(os.listdir(image_dir)) if name.lower().endswith(('.png', '.jpg', '.jpeg'))]
+    crops = []
+    while len(crops) < n:
+        page = pages[rng.integers(len(pages))]
+        h = int(rng.integers(12, min(120, page.shape[0])))
+        w = int(rng.integers(h, min(h*20, page.shape[1])))
+        y, x = rng.integers(page.shape[0]-h+1), rng.integers(page.shape[1]-w+1)
+        crops.append(np.ascontiguousarray(page[y:y+h, x:x+w]))
+    return crops
+
+
+def run_pil(crops, imgW, batch_size):
+    dataset = ListDataset(crops)
+    collate = AlignCollate(imgH=imgH, imgW=imgW, keep_ratio_with_pad=True)
+    out = []
+    for start in range(0, len(crops), batch_size):
+        out.append(collate([dataset[i] for i in range(start, min(start+batch_size, len(crops)))]).clone())
+    return out
+
+
+def run_cv(crops, imgW, batch_size, keep=False):
+    collate = AlignCollateCV(imgH=imgH, imgW=imgW)
+    return [batch.clone() if keep else batch for batch in collate.batches(crops, batch_size)]
+
+
+def best_time(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main(args):
+    crops = random_crops(args.image_dir, args.crops)
+    imgW = max(int(math.ceil(imgH*c.shape[1]/float(c.shape[0]))) for c in crops)
+    imgW = min(imgW, args.max_width)
+    print("{} crops, batch {}, padded to {}x{}".format(len(crops), args.batch_size, imgH, imgW))
+
+    t_pil = best_time(lambda: run_pil(crops, imgW, args.batch_size), args.repeat)
+    t_cv = best_time(lambda: run_cv(crops, imgW, args.batch_size), args.repeat)
+    print("PIL + AlignCollate: {:8.1f} crops/s".format(len(crops)/t_pil))
+    print("cv2 AlignCollateCV: {:8.1f} crops/s".format(len(crops)/t_cv))
+    print("speedup           : {:.2f}x".format(t_pil/t_cv))
+
+    diff = [(a - b).abs() for a, b in zip(run_pil(crops, imgW, args.batch_size),
+                                          run_cv(crops, imgW, args.batch_size, keep=True))]
+    print("mean |diff|       : {:.4f} (max {:.4f}, inputs in [-1, 1])".format(
+        float(sum(d.sum() for d in diff)/sum(d.numel() for d in diff)), float(max(d.max() for d in diff))))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark EasyOCR recognizer preprocessing.",
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("-d", "--image_dir", default=os.path.join(ROOT, 'receipts'), help="Directory of images to cut crops from.")
+    parser.add_argument("-n", "--crops", default=2000, type=int, help="Number of random crops.")
+    parser.add_argument("-b", "--batch_size", default=32, type=int, help="Crops per batch.")
+    parser.add_argument("-w", "--max_width", default=1600, type=int, help="Maximum padded width.")
+    parser.add_argument("-r", "--repeat", default=3, type=int, help="Repeats per path (best time is reported).")
+    args = parser.parse_args()
+    main(args)
@@ -0,0 +1,63 @@
+"""
+Cold start: `import easyocr` -> Reader(...) -> first readtext, each run in a fresh process.
+Compares the MD5 check without / with the verification cache (.md5_cache.json in the model
+directory) and eager vs lazy model construction (Reader(lazy_load=True)).
+
+Usage (from EasyOCR/):
+    python ./benchmark/bench_startup.py --model_dir ../weights
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..')
+EASYOCR_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+CHILD = '''
+import json, sys, time
+start = time.perf_counter()
+sys.path.insert(0, {easyocr_dir!r})
+import easyocr
+t_import = time.perf_counter()
+reader = easyocr.Reader(['en'], gpu=False, model_storage_directory={model_dir!r}, download_enabled=False,
+                        recog_network='english_g2', verbose=False, quantize=False, lazy_load={lazy!r})
+t_reader = time.perf_counter()
+reader.readtext({image!r})
+t_read = time.perf_counter()
+print(json.dumps({{'import': t_import - start, 'reader': t_reader - t_import,
+                  'readtext': t_read - t_reader, 'total': t_read - start}}))
+'''
+
+
+def run_once(args, lazy, md5_cache):
+    cache_file = os.path.join(args.model_dir, '.md5_cache.json')
+    if not md5_cache and os.path.exists(cache_file):
+        os.remove(cache_file)
+    code = CHILD.format(easyocr_dir=EASYOCR_DIR, model_dir=args.model_dir, lazy=lazy, image=args.image)
+    out = subprocess.run([sys.executable, '-c', code], check=True, capture_output=True, text=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def main(args):
+    print("{:24} {:>8} {:>8} {:>9} {:>8}".format('mode (best of %d)' % args.repeat, 'import', 'Reader', 'readtext', 'total'))
+    for md5_cache in (False, True):
+        for lazy in (False, True):
+            if md5_cache:
+                run_once(args, lazy, True)  # make sure the cache exists
+            runs = [run_once(args, lazy, md5_cache) for _ in range(args.repeat)]
+            best = {key: min(run[key] for run in runs) for key in runs[0]}
+            name = '{} md5, {}'.format('cached' if md5_cache else 'full', 'lazy' if lazy else 'eager')
+            print("{:24} {:7.2f}s {:7.2f}s {:8.2f}s {:7.2f}s".format(name, best['import'], best['reader'],
+                                                                 best['readtext'], best['total']))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark EasyOCR cold start up to the first readtext.",
+                                     formatter_class=argparse.ArgumentDefaultsHelpFormatter)
+    parser.add_argument("-m", "--model_dir", default=os.path.join(ROOT, 'weights'), help="Directory with craft_mlt_25k.pth and english_g2.pth.")
+    parser.add_argument("-i", "--image", default=os.path.join(ROOT, 'easyocr', 'examples', 'english.png'), help="Image for the first readtext.")
+    parser.add_argument("-r", "--repeat", default=3, type=int, help="Fresh processes per mode (best time is reported).")
+    args = parser.parse_args()
+    main(args)
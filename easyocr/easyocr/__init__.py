@@ -1,3 +1,4 @@
 from .easyocr import Reader
+from .session import InferenceSession
 
 __version__ = '1.7.2'
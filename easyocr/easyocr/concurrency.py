@@ -0,0 +1,77 @@
+'''
+Inference concurrency policy for a Reader shared by several threads.
+
+readtext does not change the Reader, so threads can share one; what has to be
+bounded is the CPU. A policy lets at most `parallel` detector / recognizer passes
+run at once and runs each of them with `intra_op_threads` torch threads, so
+parallel x intra_op_threads stays within the cores instead of every call starting
+a thread per core.
+'''
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+import torch
+
+class InferencePolicy(object):
+    '''
+    Parameters:
+    parallel (int): number of inference passes allowed to run at the same time.
+    intra_op_threads (int): torch intra-op threads per pass. Default: cores // parallel.
+
+    torch keeps the intra-op thread count per OS thread (OpenMP), so it is set in every
+    thread the first time that thread enters slot(). DataLoader workers (workers > 0)
+    start processes from a multi-threaded program; keep workers = 0 with parallel > 1.
+    '''
+    def __init__(self, parallel = 1, intra_op_threads = None):
+        self.cpu_count = os.cpu_count() or 1
+        self.parallel = max(1, int(parallel))
+        if not intra_op_threads:
+            intra_op_threads = self.cpu_count // self.parallel
+        self.intra_op_threads = max(1, int(intra_op_threads))
+        self._slots = threading.BoundedSemaphore(self.parallel)
+        self._thread = threading.local()
+        self._lock = threading.Lock()
+        self._running = 0
+        self._waiting = 0
+        self._passes = 0
+        self._wait_seconds = 0.
+        torch.set_num_threads(self.intra_op_threads)
+
+    @contextmanager
+    def slot(self):
+        "run one inference pass under the policy"
+        if getattr(self._thread, 'threads', None) != self.intra_op_threads:
+            torch.set_num_threads(self.intra_op_threads)
+            self._thread.threads = self.intra_op_threads
+        with self._lock:
+            self._waiting += 1
+        start = time.perf_counter()
+        self._slots.acquire()
+        with self._lock:
+            self._waiting -= 1
+            self._running += 1
+            self._wait_seconds += time.perf_counter() - start
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._running -= 1
+                self._passes += 1
+            self._slots.release()
+
+    def stats(self):
+        with self._lock:
+            return {'parallel': self.parallel,
+                    'intra_op_threads': self.intra_op_threads,
+                    'cpu_count': self.cpu_count,
+                    'oversubscribed': self.parallel*self.intra_op_threads > self.cpu_count,
+                    'running': self._running,
+                    'waiting': self._waiting,
+                    'passes': self._passes,
+                    'avg_wait_ms': round(1000*self._wait_seconds/self._passes, 2) if self._passes else 0.}
+
+@contextmanager
+def no_policy():
+    yield
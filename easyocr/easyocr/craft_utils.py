@@ -7,7 +7,6 @@ MIT License
 import numpy as np
 import cv2
 import math
-from scipy.ndimage import label
 
 """ auxiliary functions """
 # unwarp corodinates
@@ -30,6 +29,11 @@ def getDetBoxes_core(textmap, linkmap, text_threshold, link_threshold, low_text,
     text_score_comb = np.clip(text_score + link_score, 0, 1)
     nLabels, labels, stats, centroids = cv2.connectedComponentsWithStats(text_score_comb.astype(np.uint8), connectivity=4)
 
+    # per-label maxima of the text score in one pass instead of textmap[labels==k] per label
+    from scipy.ndimage import maximum # only needed here, keeps scipy out of import easyocr
+    label_max = maximum(textmap, labels, np.arange(nLabels)) if nLabels > 1 else []
+    link_area = np.logical_and(link_score==1, text_score==0)
+
     det = []
     mapper = []
     for k in range(1,nLabels):
@@ -38,18 +42,9 @@ def getDetBoxes_core(textmap, linkmap, text_threshold, link_threshold, low_text,
         if size < 10: continue
 
         # thresholding
-        if np.max(textmap[labels==k]) < text_threshold: continue
+        if label_max[k] < text_threshold: continue
 
-        # make segmentation map
-        segmap = np.zeros(textmap.shape, dtype=np.uint8)
-        segmap[labels==k] = 255
-        if estimate_num_chars:
-            _, character_locs = cv2.threshold((textmap - linkmap) * segmap /255., text_threshold, 1, 0)
-            _, n_chars = label(character_locs)
-            mapper.append(n_chars)
-        else:
-            mapper.append(k)
-        segmap[np.logical_and(link_score==1, text_score==0)] = 0   # remove link area
+        # everything below only touches the component's box grown by the dilation margin
         x, y = stats[k, cv2.CC_STAT_LEFT], stats[k, cv2.CC_STAT_TOP]
         w, h = stats[k, cv2.CC_STAT_WIDTH], stats[k, cv2.CC_STAT_HEIGHT]
         niter = int(math.sqrt(size * min(w, h) / (w * h)) * 2)
@@ -59,11 +54,23 @@ def getDetBoxes_core(textmap, linkmap, text_threshold, link_threshold, low_text,
         if sy < 0 : sy = 0
         if ex >= img_w: ex = img_w
         if ey >= img_h: ey = img_h
+
+        # make segmentation map
+        segmap = np.zeros((ey - sy, ex - sx), dtype=np.uint8)
+        segmap[labels[sy:ey, sx:ex]==k] = 255
+        if estimate_num_chars:
+            from scipy.ndimage import label # only needed here, keeps scipy out of import easyocr
+            _, character_locs = cv2.threshold((textmap[sy:ey, sx:ex] - linkmap[sy:ey, sx:ex]) * segmap /255., text_threshold, 1, 0)
+            _, n_chars = label(character_locs)
+            mapper.append(n_chars)
+        else:
+            mapper.append(k)
+        segmap[link_area[sy:ey, sx:ex]] = 0   # remove link area
         kernel = cv2.getStructuringElement(cv2.MORPH_RECT,(1 + niter, 1 + niter))
-        segmap[sy:ey, sx:ex] = cv2.dilate(segmap[sy:ey, sx:ex], kernel)
+        segmap = cv2.dilate(segmap, kernel)
 
         # make box
-        np_contours = np.roll(np.array(np.where(segmap!=0)),1,axis=0).transpose().reshape(-1,2)
+        np_contours = np.roll(np.array(np.where(segmap!=0)),1,axis=0).transpose().reshape(-1,2) + (sx, sy)
         rectangle = cv2.minAreaRect(np_contours)
         box = cv2.boxPoints(rectangle)
 
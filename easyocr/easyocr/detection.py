@@ -3,11 +3,13 @@ import torch.backends.cudnn as cudnn
 from torch.autograd import Variable
 from PIL import Image
 from collections import OrderedDict
+import threading
 
 import cv2
 import numpy as np
 from .craft_utils import getDetBoxes, adjustResultCoordinates
-from .imgproc import resize_aspect_ratio, normalizeMeanVariance
+from .utils import mmap_state_dict
+from .imgproc import resize_aspect_ratio, normalizeMeanVariance, aspect_ratio_size, resize_normalize_into
 from .craft import CRAFT
 
 def copyStateDict(state_dict):
@@ -21,25 +23,73 @@ def copyStateDict(state_dict):
         new_state_dict[name] = v
     return new_state_dict
 
-def test_net(canvas_size, mag_ratio, net, image, text_threshold, link_threshold, low_text, poly, device, estimate_num_chars=False):
+class DetectorInputPool(object):
+    '''
+    Reusable float32 NCHW detector inputs, kept per (batch, canvas) shape. A buffer is lent
+    to one forward pass at a time, so threads sharing a Reader never write into each other's
+    input. Buffers for a cuda device are pinned, which lets the copy to the device run
+    asynchronously. Only the max_shapes most recently used shapes are kept.
+    '''
+    def __init__(self, max_shapes = 4):
+        self.max_shapes = max_shapes
+        self.free = OrderedDict()
+        self.lock = threading.Lock()
+
+    def acquire(self, shape, pin_memory = False):
+        key = (tuple(shape), pin_memory)
+        with self.lock:
+            buffers = self.free.get(key)
+            if buffers:
+                return buffers.pop()
+        return torch.empty(key[0], dtype = torch.float32, pin_memory = pin_memory)
+
+    def release(self, buffer):
+        key = (tuple(buffer.shape), buffer.is_pinned())
+        with self.lock:
+            self.free.setdefault(key, []).append(buffer)
+            self.free.move_to_end(key)
+            while len(self.free) > self.max_shapes:
+                self.free.popitem(last = False)
+
+def prepare_input(image_arrs, canvas_size, mag_ratio, input_pool, device):
+    '''
+    Detector input for same-size pages, resized and normalized straight into one buffer
+    from input_pool (see imgproc.resize_normalize_into) instead of a resized canvas, a
+    normalized copy and a stacked batch per call.
+    Returns (input on device, resize ratio, buffer to give back to the pool).
+    '''
+    height, width, channel = image_arrs[0].shape
+    _, _, (target_h32, target_w32) = aspect_ratio_size(height, width, canvas_size, mag_ratio)
+    pin_memory = str(device).startswith('cuda') and torch.cuda.is_available()
+    buffer = input_pool.acquire((len(image_arrs), channel, target_h32, target_w32), pin_memory)
+    out = buffer.numpy()
+    for i, img in enumerate(image_arrs):
+        target_ratio = resize_normalize_into(img, out[i], canvas_size, cv2.INTER_LINEAR, mag_ratio)
+    return buffer.to(device, non_blocking = pin_memory), target_ratio, buffer
+
+def test_net(canvas_size, mag_ratio, net, image, text_threshold, link_threshold, low_text, poly, device, estimate_num_chars=False, input_pool=None):
     if isinstance(image, np.ndarray) and len(image.shape) == 4:  # image is batch of np arrays
         image_arrs = image
     else:                                                        # image is single numpy array
         image_arrs = [image]
 
-    img_resized_list = []
-    # resize
-    for img in image_arrs:
-        img_resized, target_ratio, size_heatmap = resize_aspect_ratio(img, canvas_size,
-                                                                      interpolation=cv2.INTER_LINEAR,
-                                                                      mag_ratio=mag_ratio)
-        img_resized_list.append(img_resized)
+    buffer = None
+    if input_pool is not None:
+        x, target_ratio, buffer = prepare_input(image_arrs, canvas_size, mag_ratio, input_pool, device)
+    else:
+        img_resized_list = []
+        # resize
+        for img in image_arrs:
+            img_resized, target_ratio, size_heatmap = resize_aspect_ratio(img, canvas_size,
+                                                                          interpolation=cv2.INTER_LINEAR,
+                                                                          mag_ratio=mag_ratio)
+            img_resized_list.append(img_resized)
+        # preprocessing
+        x = [np.transpose(normalizeMeanVariance(n_img), (2, 0, 1))
+             for n_img in img_resized_list]
+        x = torch.from_numpy(np.array(x))
+        x = x.to(device)
     ratio_h = ratio_w = 1 / target_ratio
-    # preprocessing
-    x = [np.transpose(normalizeMeanVariance(n_img), (2, 0, 1))
-         for n_img in img_resized_list]
-    x = torch.from_numpy(np.array(x))
-    x = x.to(device)
 
     # forward pass
     with torch.no_grad():
@@ -69,12 +119,24 @@ def test_net(canvas_size, mag_ratio, net, image, text_threshold, link_threshold,
         boxes_list.append(boxes)
         polys_list.append(polys)
 
+    # the score maps are on the host now, so a pinned buffer is no longer being copied from
+    if buffer is not None:
+        input_pool.release(buffer)
+
     return boxes_list, polys_list
 
-def get_detector(trained_model, device='cpu', quantize=True, cudnn_benchmark=False):
+def get_detector(trained_model, device='cpu', quantize=True, cudnn_benchmark=False, mmap_dir=None):
     net = CRAFT()
 
-    if device == 'cpu':
+    if device == 'cpu' and mmap_dir:
+        # weights stay in the mapped file (see utils.mmap_state_dict)
+        net.load_state_dict(mmap_state_dict(trained_model, mmap_dir, copyStateDict), assign=True)
+        if quantize:
+            try:
+                torch.quantization.quantize_dynamic(net, dtype=torch.qint8, inplace=True)
+            except:
+                pass
+    elif device == 'cpu':
         net.load_state_dict(copyStateDict(torch.load(trained_model, map_location=device, weights_only=False)))
         if quantize:
             try:
@@ -89,13 +151,13 @@ def get_detector(trained_model, device='cpu', quantize=True, cudnn_benchmark=Fal
     net.eval()
     return net
 
-def get_textbox(detector, image, canvas_size, mag_ratio, text_threshold, link_threshold, low_text, poly, device, optimal_num_chars=None, **kwargs):
+def get_textbox(detector, image, canvas_size, mag_ratio, text_threshold, link_threshold, low_text, poly, device, optimal_num_chars=None, input_pool=None, **kwargs):
     result = []
     estimate_num_chars = optimal_num_chars is not None
     bboxes_list, polys_list = test_net(canvas_size, mag_ratio, detector,
                                        image, text_threshold,
                                        link_threshold, low_text, poly,
-                                       device, estimate_num_chars)
+                                       device, estimate_num_chars, input_pool)
     if estimate_num_chars:
         polys_list = [[p for p, _ in sorted(polys, key=lambda x: abs(optimal_num_chars - x[1]))]
                       for polys in polys_list]
@@ -4,14 +4,18 @@ from .recognition import get_recognizer, get_text
 from .utils import group_text_box, get_image_list, calculate_md5, get_paragraph,\
                    download_and_unzip, printProgressBar, diff, reformat_input,\
                    make_rotated_img_list, set_result_with_confidence,\
-                   reformat_input_batched, merge_to_free
+                   reformat_input_batched, merge_to_free, shape_batches, tile_grid, merge_tiled_polys
+from .lexicon import Lexicon
+from .concurrency import InferencePolicy, no_policy
 from .config import *
 from bidi import get_display
 import numpy as np
 import cv2
 import torch
 import os
+import math
 import sys
+import threading
 from PIL import Image
 from logging import getLogger
 import yaml
@@ -33,7 +37,8 @@ class Reader(object):
                  user_network_directory=None, detect_network="craft", 
                  recog_network='standard', download_enabled=True, 
                  detector=True, recognizer=True, verbose=True, 
-                 quantize=True, cudnn_benchmark=False):
+                 quantize=True, cudnn_benchmark=False, mmap_weights=False, lazy_load=False,
+                 prune_dict=False):
         """Create an EasyOCR Reader
 
         Parameters:
@@ -50,6 +55,20 @@ class Reader(object):
             EASYOCR_MODULE_PATH (preferred), MODULE_PATH (if defined), or ~/.EasyOCR/.
 
             download_enabled (bool): Enabled downloading of model data via HTTP (default).
+
+            mmap_weights (bool): On CPU, convert the weights once to model_storage_directory/mmap
+            and map them instead of reading them, so that processes loading the same models share
+            the weight pages. With quantize the quantized layers are private copies again, so use
+            quantize=False to share the recognizer LSTM/Linear weights. Only the craft detector
+            can be mapped; a dbnet18 detector is loaded into each process as usual (with a warning).
+
+            lazy_load (bool): Check the model files now but build the detector and the recognizer
+            on first use (detect / recognize), so the Reader itself is ready in milliseconds.
+
+            prune_dict (bool): With decoder='wordbeamsearch', only grow beams that are still a
+            prefix of a dictionary word instead of checking the dictionary once the beams are
+            done. Faster, but words outside the dictionary (amounts, codes) are cut down to their
+            longest dictionary prefix, so it is off by default.
         """
         self.verbose = verbose
         self.download_enabled = download_enabled
@@ -86,8 +105,15 @@ class Reader(object):
 
         # check and download detection model
         self.support_detection_network = ['craft', 'dbnet18']
-        self.quantize=quantize, 
+        self.quantize=quantize
         self.cudnn_benchmark=cudnn_benchmark
+        self.mmap_dir = os.path.join(self.model_storage_directory, 'mmap') if mmap_weights else None
+        self.prune_dict = prune_dict
+        self.concurrency = None
+        self.detector_inputs = None
+        self._load_lock = threading.Lock()
+        self._detector, self._detector_path = None, None
+        self._recognizer, self._converter, self._recognizer_args = None, None, None
         if detector:
             detector_path = self.getDetectorPath(detect_network)
         
@@ -214,7 +240,9 @@ class Reader(object):
             dict_list[lang] = os.path.join(BASE_PATH, 'dict', lang + ".txt")
 
         if detector:
-            self.detector = self.initDetector(detector_path)
+            self._detector_path = detector_path
+            if not lazy_load:
+                self.detector = self.initDetector(detector_path)
             
         if recognizer:
             if recog_network == 'generation1':
@@ -231,15 +259,58 @@ class Reader(object):
                     }
             else:
                 network_params = recog_config['network_params']
-            self.recognizer, self.converter = get_recognizer(recog_network, network_params,\
-                                                         self.character, separator_list,\
-                                                         dict_list, model_path, device = self.device, quantize=quantize)
+            self._recognizer_args = (recog_network, network_params, self.character, separator_list,\
+                                     dict_list, model_path)
+            if not lazy_load:
+                self.loadRecognizer()
+
+    @property
+    def detector(self):
+        if self._detector is None and self._detector_path is not None:
+            with self._load_lock:
+                if self._detector is None:
+                    self._detector = self.initDetector(self._detector_path)
+        return self._detector
+
+    @detector.setter
+    def detector(self, detector):
+        self._detector = detector
+
+    def loadRecognizer(self):
+        with self._load_lock:
+            if self._recognizer is None:
+                self._recognizer, self._converter = get_recognizer(*self._recognizer_args, device = self.device,\
+                                                                   quantize = self.quantize,\
+                                                                   dict_cache_dir = os.path.join(self.model_storage_directory, 'dict_cache'),\
+                                                                   mmap_dir = self.mmap_dir)
+                self._converter.prune_dict = self.prune_dict
+
+    @property
+    def recognizer(self):
+        if self._recognizer is None and self._recognizer_args is not None:
+            self.loadRecognizer()
+        return self._recognizer
+
+    @recognizer.setter
+    def recognizer(self, recognizer):
+        self._recognizer = recognizer
+
+    @property
+    def converter(self):
+        if self._converter is None and self._recognizer_args is not None:
+            self.loadRecognizer()
+        return self._converter
+
+    @converter.setter
+    def converter(self, converter):
+        self._converter = converter
 
     def getDetectorPath(self, detect_network):
         if detect_network in self.support_detection_network:
             self.detect_network = detect_network
             if self.detect_network == 'craft':
-                from .detection import get_detector, get_textbox
+                from .detection import get_detector, get_textbox, DetectorInputPool
+                self.detector_inputs = DetectorInputPool()
             elif self.detect_network in ['dbnet18']:
                 from .detection_db import get_detector, get_textbox
             else:
@@ -271,6 +342,16 @@ class Reader(object):
         return detector_path
 
     def initDetector(self, detector_path):
+        if self.mmap_dir and self.detect_network != 'craft':
+            LOGGER.warning('mmap_weights only maps the craft detector; the {} detector weights are '
+                           'loaded into each process.'.format(self.detect_network))
+        if self.mmap_dir and self.detect_network == 'craft':
+            return self.get_detector(detector_path, 
+                                     device = self.device, 
+                                     quantize = self.quantize, 
+                                     cudnn_benchmark = self.cudnn_benchmark,
+                                     mmap_dir = self.mmap_dir
+                                     )
         return self.get_detector(detector_path, 
                                  device = self.device, 
                                  quantize = self.quantize, 
@@ -288,6 +369,42 @@ class Reader(object):
                 language = 'chinese'
             raise ValueError(language.capitalize() + ' is only compatible with English, try lang_list=' + list_lang_string)
 
+    def setLexicon(self, words = None, patterns = None, ignore_case = False, min_ratio = 0.1):
+        '''
+        Attach a domain lexicon used by decoder='wordbeamsearch'. Each word of a line is also
+        decoded inside the lexicon and that reading wins when it is a complete lexicon word
+        or pattern match and not much less likely (min_ratio) than the free reading.
+        Call without words and patterns to remove the lexicon.
+
+        Parameters:
+        words: list of words (or path of a file, one word per line), or a Lexicon
+        patterns: list of regular expressions for whole words, e.g. amounts r'\d+\.\d{2}'
+        ignore_case (bool): match words case-insensitively
+        min_ratio (float): see above
+        '''
+        if isinstance(words, Lexicon):
+            lexicon = words
+        elif words is None and patterns is None:
+            lexicon = None
+        else:
+            lexicon = Lexicon(words or (), patterns or (), ignore_case, min_ratio)
+        self.converter.lexicon = lexicon
+        return lexicon
+
+    def setConcurrency(self, parallel = 1, intra_op_threads = None):
+        '''
+        Bound the inference of a Reader shared by several threads: at most parallel
+        detector / recognizer passes run at once, each with intra_op_threads torch threads
+        (default: cores // parallel). readtext itself is safe to call from several threads;
+        without a policy every call uses all cores. Call with parallel = None to remove it.
+        '''
+        self.concurrency = InferencePolicy(parallel, intra_op_threads) if parallel else None
+        return self.concurrency
+
+    def inferenceSlot(self):
+        "context manager around one detector / recognizer pass, see setConcurrency"
+        return self.concurrency.slot() if self.concurrency is not None else no_policy()
+
     def getChar(self, fileName):
         char_file = os.path.join(BASE_PATH, 'character', fileName)
         with open(char_file, "r", encoding="utf-8-sig") as input_file:
@@ -316,26 +433,43 @@ class Reader(object):
                slope_ths = 0.1, ycenter_ths = 0.5, height_ths = 0.5,\
                width_ths = 0.5, add_margin = 0.1, reformat=True, optimal_num_chars=None,
                threshold = 0.2, bbox_min_score = 0.2, bbox_min_size = 3, max_candidates = 0,
+               tile_size = None, tile_overlap = 128, tile_batch_size = 4,
+               auto_probe_size = 1280, auto_text_height = 32, auto_max_size = 3840,
                ):
-
+        '''
+        canvas_size: int, or 'auto' to pick canvas_size and mag_ratio from the text size
+        found by a low-resolution pass, see autoCanvas (auto_* parameters).
+        tile_size: int, detect on overlapping tiles of at most tile_size x tile_size pixels
+        (at mag_ratio, canvas_size is then not used) instead of fitting the whole page into
+        canvas_size, see getTiledTextbox. For long scans that would otherwise be downscaled.
+        tile_overlap, tile_batch_size: overlap between tiles in pixels, tiles per forward pass.
+        '''
         if reformat:
             img, img_cv_grey = reformat_input(img)
 
-        text_box_list = self.get_textbox(self.detector, 
-                                    img, 
-                                    canvas_size = canvas_size, 
-                                    mag_ratio = mag_ratio,
-                                    text_threshold = text_threshold, 
-                                    link_threshold = link_threshold, 
-                                    low_text = low_text,
-                                    poly = False, 
-                                    device = self.device, 
-                                    optimal_num_chars = optimal_num_chars,
-                                    threshold = threshold, 
-                                    bbox_min_score = bbox_min_score, 
-                                    bbox_min_size = bbox_min_size, 
-                                    max_candidates = max_candidates,
-                                    )
+        params = dict(text_threshold = text_threshold, 
+                      link_threshold = link_threshold, 
+                      low_text = low_text,
+                      poly = False, 
+                      device = self.device, 
+                      optimal_num_chars = optimal_num_chars,
+                      threshold = threshold, 
+                      bbox_min_score = bbox_min_score, 
+                      bbox_min_size = bbox_min_size, 
+                      max_candidates = max_candidates,
+                      input_pool = self.detector_inputs,
+                      )
+        with self.inferenceSlot():
+            text_box_list = None
+            if canvas_size == 'auto':
+                canvas_size, mag_ratio, text_box_list = self.autoCanvas(img, auto_probe_size, auto_text_height,\
+                                                                        auto_max_size, **params)
+            if tile_size:
+                text_box_list = self.getTiledTextbox(img, tile_size, tile_overlap, tile_batch_size,\
+                                                     mag_ratio = mag_ratio, **params)
+            elif text_box_list is None:
+                text_box_list = self.get_textbox(self.detector, img, canvas_size = canvas_size,\
+                                                 mag_ratio = mag_ratio, **params)
 
         horizontal_list_agg, free_list_agg = [], []
         for text_box in text_box_list:
@@ -353,22 +487,85 @@ class Reader(object):
 
         return horizontal_list_agg, free_list_agg
 
+    def autoCanvas(self, img, probe_size = 1280, text_height = 32, max_size = 3840, **params):
+        '''
+        Choose the detection scale from the text itself (canvas_size = 'auto' in detect).
+        A first pass at probe_size (never upscaled) measures the median height of the boxes
+        it finds; the full pass then runs at the smallest size that brings that height to
+        text_height detector pixels, at most max_size. When that size is not larger than the
+        probe, the probe boxes are used and no second pass is run, which is the usual case
+        for photos of small receipts. Without boxes in the probe the defaults are used.
+        Crops for the recognizer are cut from the full-resolution image either way.
+
+        Parameters:
+        img: page (H x W x 3) or batch of pages (N x H x W x 3), one scale for the batch
+        params: the other get_textbox arguments
+        Returns (canvas_size, mag_ratio, boxes of the probe when they can be used, else None).
+        '''
+        page_size = max(img.shape[-3:-1])
+        probe_canvas = min(probe_size, page_size)
+        probe = self.get_textbox(self.detector, img, canvas_size = probe_canvas, mag_ratio = 1., **params)
+        heights = [min(np.linalg.norm(box[2:4] - box[0:2]), np.linalg.norm(box[6:8] - box[0:2]))\
+                   for boxes in probe for box in boxes]
+        if not heights:
+            return 2560, 1., None
+        # heights are in probe pixels
+        size = int(min(max_size, math.ceil(probe_canvas * text_height / max(float(np.median(heights)), 1.))))
+        if size <= probe_canvas * 1.1:
+            return probe_canvas, 1., probe
+        return size, size / float(page_size), None
+
+    def getTiledTextbox(self, img, tile_size, tile_overlap = 128, tile_batch_size = 4, mag_ratio = 1., **params):
+        '''
+        get_textbox over overlapping tiles instead of one canvas per page. Tiles are detected
+        tile_batch_size at a time at mag_ratio (never downscaled) and their boxes are merged
+        across the seams (utils.merge_tiled_polys), so detector memory depends on the tile
+        size, not on the page size. tile_overlap should be larger than the tallest text so
+        that every line is whole in at least one tile.
+
+        Parameters:
+        img: page (H x W x 3) or batch of pages (N x H x W x 3)
+        params: the other get_textbox arguments (text_threshold, low_text, ...)
+        Returns one list of polys per page, like get_textbox.
+        '''
+        pages = img if img.ndim == 4 else img[None]
+        result = []
+        for page in pages:
+            page_h, page_w = page.shape[:2]
+            origins = tile_grid(page_h, page_w, tile_size, tile_overlap)
+            tile_h, tile_w = min(tile_size, page_h), min(tile_size, page_w)
+            canvas_size = int(math.ceil(mag_ratio*max(tile_h, tile_w)))
+            tile_polys = []
+            for start in range(0, len(origins), tile_batch_size):
+                batch = np.stack([page[y:y+tile_h, x:x+tile_w] for y, x in origins[start:start+tile_batch_size]])
+                tile_polys += self.get_textbox(self.detector, batch, canvas_size = canvas_size,\
+                                               mag_ratio = mag_ratio, **params)
+            result.append(merge_tiled_polys(tile_polys, origins, (tile_h, tile_w), (page_h, page_w)))
+        return result
+
     def recognize(self, img_cv_grey, horizontal_list=None, free_list=None,\
                   decoder = 'greedy', beamWidth= 5, batch_size = 1,\
                   workers = 0, allowlist = None, blocklist = None, detail = 1,\
                   rotation_info = None,paragraph = False,\
                   contrast_ths = 0.1,adjust_contrast = 0.5, filter_ths = 0.003,\
-                  y_ths = 0.5, x_ths = 1.0, reformat=True, output_format='standard'):
-
+                  y_ths = 0.5, x_ths = 1.0, reformat=True, output_format='standard',\
+                  cpu_batching = False, bucket_ratio = 0, contrast_single_pass = False,\
+                  preprocess = 'pil'):
+        '''
+        cpu_batching: on CPU with batch_size > 1, run the crops through the recognizer in
+        batches (width buckets with bucket_ratio > 0) instead of one box at a time.
+        bucket_ratio: width bucket step in multiples of the model height for batched
+        recognition; each batch is padded only to its bucket width. 0 (default) pads every
+        crop to the widest one; bucketing changes the padding and so can change
+        text and confidences.
+        contrast_single_pass: run low-contrast crops with and without adjust_contrast in the
+        same pass instead of retrying low-confidence crops in a second pass (see get_text).
+        preprocess: 'pil' or 'cv2' crop preprocessing (see recognition.predict_buckets).
+        '''
         if reformat:
             img, img_cv_grey = reformat_input(img_cv_grey)
 
-        if allowlist:
-            ignore_char = ''.join(set(self.character)-set(allowlist))
-        elif blocklist:
-            ignore_char = ''.join(set(blocklist))
-        else:
-            ignore_char = ''.join(set(self.character)-set(self.lang_char))
+        ignore_char = self.getIgnoreChar(allowlist, blocklist)
 
         if self.model_lang in ['chinese_tra','chinese_sim']: decoder = 'greedy'
 
@@ -377,43 +574,68 @@ class Reader(object):
             horizontal_list = [[0, x_max, 0, y_max]]
             free_list = []
 
-        # without gpu/parallelization, it is faster to process image one by one
-        if ((batch_size == 1) or (self.device == 'cpu')) and not rotation_info:
-            result = []
-            for bbox in horizontal_list:
-                h_list = [bbox]
-                f_list = []
-                image_list, max_width = get_image_list(h_list, f_list, img_cv_grey, model_height = imgH)
-                result0 = get_text(self.character, imgH, int(max_width), self.recognizer, self.converter, image_list,\
-                              ignore_char, decoder, beamWidth, batch_size, contrast_ths, adjust_contrast, filter_ths,\
-                              workers, self.device)
-                result += result0
-            for bbox in free_list:
-                h_list = []
-                f_list = [bbox]
-                image_list, max_width = get_image_list(h_list, f_list, img_cv_grey, model_height = imgH)
-                result0 = get_text(self.character, imgH, int(max_width), self.recognizer, self.converter, image_list,\
+        with self.inferenceSlot():
+            # without gpu/parallelization, it is faster to process image one by one
+            if ((batch_size == 1) or (self.device == 'cpu' and not cpu_batching)) and not rotation_info:
+                result = []
+                for bbox in horizontal_list:
+                    h_list = [bbox]
+                    f_list = []
+                    image_list, max_width = get_image_list(h_list, f_list, img_cv_grey, model_height = imgH)
+                    result0 = get_text(self.character, imgH, int(max_width), self.recognizer, self.converter, image_list,\
+                                  ignore_char, decoder, beamWidth, batch_size, contrast_ths, adjust_contrast, filter_ths,\
+                                  workers, self.device, contrast_single_pass = contrast_single_pass,\
+                                  preprocess = preprocess)
+                    result += result0
+                for bbox in free_list:
+                    h_list = []
+                    f_list = [bbox]
+                    image_list, max_width = get_image_list(h_list, f_list, img_cv_grey, model_height = imgH)
+                    result0 = get_text(self.character, imgH, int(max_width), self.recognizer, self.converter, image_list,\
+                                  ignore_char, decoder, beamWidth, batch_size, contrast_ths, adjust_contrast, filter_ths,\
+                                  workers, self.device, contrast_single_pass = contrast_single_pass,\
+                                  preprocess = preprocess)
+                    result += result0
+            # cpu batching: crops of similar width share a batch padded only to that width
+            elif self.device == 'cpu' and not rotation_info:
+                image_list, max_width = get_image_list(horizontal_list, free_list, img_cv_grey, model_height = imgH)
+                result = get_text(self.character, imgH, int(max_width), self.recognizer, self.converter, image_list,\
+                                  ignore_char, decoder, beamWidth, batch_size, contrast_ths, adjust_contrast, filter_ths,\
+                                  workers, self.device, bucket_ratio = bucket_ratio,\
+                                  contrast_single_pass = contrast_single_pass,\
+                                  preprocess = preprocess)
+            # default mode will try to process multiple boxes at the same time
+            else:
+                image_list, max_width = get_image_list(horizontal_list, free_list, img_cv_grey, model_height = imgH)
+                image_len = len(image_list)
+                if rotation_info and image_list:
+                    image_list = make_rotated_img_list(rotation_info, image_list)
+                    max_width = max(max_width, imgH)
+
+                result = get_text(self.character, imgH, int(max_width), self.recognizer, self.converter, image_list,\
                               ignore_char, decoder, beamWidth, batch_size, contrast_ths, adjust_contrast, filter_ths,\
-                              workers, self.device)
-                result += result0
-        # default mode will try to process multiple boxes at the same time
+                              workers, self.device, bucket_ratio = bucket_ratio,\
+                              contrast_single_pass = contrast_single_pass,\
+                              preprocess = preprocess)
+
+                if rotation_info and (horizontal_list+free_list):
+                    # Reshape result to be a list of lists, each row being for 
+                    # one of the rotations (first row being no rotation)
+                    result = set_result_with_confidence(
+                        [result[image_len*i:image_len*(i+1)] for i in range(len(rotation_info) + 1)])
+
+        return self.formatResult(result, free_list, detail, paragraph, x_ths, y_ths, output_format)
+
+    def getIgnoreChar(self, allowlist = None, blocklist = None):
+        if allowlist:
+            return ''.join(set(self.character)-set(allowlist))
+        elif blocklist:
+            return ''.join(set(blocklist))
         else:
-            image_list, max_width = get_image_list(horizontal_list, free_list, img_cv_grey, model_height = imgH)
-            image_len = len(image_list)
-            if rotation_info and image_list:
-                image_list = make_rotated_img_list(rotation_info, image_list)
-                max_width = max(max_width, imgH)
-
-            result = get_text(self.character, imgH, int(max_width), self.recognizer, self.converter, image_list,\
-                          ignore_char, decoder, beamWidth, batch_size, contrast_ths, adjust_contrast, filter_ths,\
-                          workers, self.device)
-
-            if rotation_info and (horizontal_list+free_list):
-                # Reshape result to be a list of lists, each row being for 
-                # one of the rotations (first row being no rotation)
-                result = set_result_with_confidence(
-                    [result[image_len*i:image_len*(i+1)] for i in range(len(rotation_info) + 1)])
+            return ''.join(set(self.character)-set(self.lang_char))
 
+    def formatResult(self, result, free_list, detail = 1, paragraph = False,\
+                     x_ths = 1.0, y_ths = 0.5, output_format = 'standard'):
         if self.model_lang == 'arabic':
             direction_mode = 'rtl'
             result = [list(item) for item in result]
@@ -449,10 +671,14 @@ class Reader(object):
                  slope_ths = 0.1, ycenter_ths = 0.5, height_ths = 0.5,\
                  width_ths = 0.5, y_ths = 0.5, x_ths = 1.0, add_margin = 0.1, 
                  threshold = 0.2, bbox_min_score = 0.2, bbox_min_size = 3, max_candidates = 0,
-                 output_format='standard'):
+                 output_format='standard', cpu_batching = False, contrast_single_pass = False,\
+                 preprocess = 'pil', tile_size = None, tile_overlap = 128, bucket_ratio = 0):
         '''
         Parameters:
         image: file path or numpy-array or a byte stream object
+        cpu_batching, contrast_single_pass, preprocess, bucket_ratio: see recognize
+        canvas_size: int or 'auto', see detect
+        tile_size, tile_overlap: tiled detection, see detect
         '''
         img, img_cv_grey = reformat_input(image)
 
@@ -464,7 +690,8 @@ class Reader(object):
                                                  height_ths = height_ths, width_ths= width_ths,\
                                                  add_margin = add_margin, reformat = False,\
                                                  threshold = threshold, bbox_min_score = bbox_min_score,\
-                                                 bbox_min_size = bbox_min_size, max_candidates = max_candidates
+                                                 bbox_min_size = bbox_min_size, max_candidates = max_candidates,\
+                                                 tile_size = tile_size, tile_overlap = tile_overlap
                                                  )
         # get the 1st result from hor & free list as self.detect returns a list of depth 3
         horizontal_list, free_list = horizontal_list[0], free_list[0]
@@ -472,7 +699,9 @@ class Reader(object):
                                 decoder, beamWidth, batch_size,\
                                 workers, allowlist, blocklist, detail, rotation_info,\
                                 paragraph, contrast_ths, adjust_contrast,\
-                                filter_ths, y_ths, x_ths, False, output_format)
+                                filter_ths, y_ths, x_ths, False, output_format,\
+                                cpu_batching = cpu_batching, contrast_single_pass = contrast_single_pass,\
+                                preprocess = preprocess, bucket_ratio = bucket_ratio)
 
         return result
     
@@ -580,3 +809,90 @@ class Reader(object):
                                             filter_ths, y_ths, x_ths, False, output_format))
 
         return result_agg
+
+    def recognize_pages(self, img_cv_grey_list, horizontal_list_agg, free_list_agg,\
+                        decoder = 'greedy', beamWidth= 5, batch_size = 16,\
+                        workers = 0, allowlist = None, blocklist = None, detail = 1,\
+                        paragraph = False, contrast_ths = 0.1,adjust_contrast = 0.5,\
+                        filter_ths = 0.003, y_ths = 0.5, x_ths = 1.0, output_format='standard',\
+                        bucket_ratio = 0, contrast_single_pass = False,\
+                        preprocess = 'pil'):
+        '''
+        Recognize the boxes of several pages at once. Crops from all pages are pooled
+        into shared recognizer batches and the results are split back per page.
+        bucket_ratio, contrast_single_pass, preprocess: see recognize
+        '''
+        ignore_char = self.getIgnoreChar(allowlist, blocklist)
+        if self.model_lang in ['chinese_tra','chinese_sim']: decoder = 'greedy'
+
+        image_list, page_len, max_width = [], [], imgH
+        for grey_img, horizontal_list, free_list in zip(img_cv_grey_list, horizontal_list_agg, free_list_agg):
+            page_list, page_width = get_image_list(horizontal_list, free_list, grey_img, model_height = imgH)
+            image_list += page_list
+            page_len.append(len(page_list))
+            max_width = max(max_width, page_width)
+
+        result = []
+        if image_list:
+            with self.inferenceSlot():
+                result = get_text(self.character, imgH, int(max_width), self.recognizer, self.converter, image_list,\
+                                  ignore_char, decoder, beamWidth, batch_size, contrast_ths, adjust_contrast, filter_ths,\
+                                  workers, self.device, bucket_ratio = bucket_ratio,\
+                                  contrast_single_pass = contrast_single_pass,\
+                                  preprocess = preprocess)
+
+        result_agg, start = [], 0
+        for n, free_list in zip(page_len, free_list_agg):
+            result_agg.append(self.formatResult(result[start:start+n], free_list, detail, paragraph,\
+                                                x_ths, y_ths, output_format))
+            start += n
+        return result_agg
+
+    def readtext_pages(self, images, page_batch_size = 8,\
+                       decoder = 'greedy', beamWidth= 5, batch_size = 16,\
+                       workers = 0, allowlist = None, blocklist = None, detail = 1,\
+                       paragraph = False, min_size = 20,\
+                       contrast_ths = 0.1,adjust_contrast = 0.5, filter_ths = 0.003,\
+                       text_threshold = 0.7, low_text = 0.4, link_threshold = 0.4,\
+                       canvas_size = 2560, mag_ratio = 1.,\
+                       slope_ths = 0.1, ycenter_ths = 0.5, height_ths = 0.5,\
+                       width_ths = 0.5, y_ths = 0.5, x_ths = 1.0, add_margin = 0.1,
+                       threshold = 0.2, bbox_min_score = 0.2, bbox_min_size = 3, max_candidates = 0,
+                       output_format='standard', contrast_single_pass = False,\
+                       preprocess = 'pil', tile_size = None, tile_overlap = 128, bucket_ratio = 0):
+        '''
+        Parameters:
+        images: list of file paths, numpy-arrays or byte stream objects; pages may differ in size
+        page_batch_size: int, pages per detector forward pass. Only pages of the same shape
+        share a batch (see utils.shape_batches), so every page gets the boxes readtext
+        would find on it alone.
+        Unlike readtext_batched, recognition crops from all pages share recognizer batches.
+        contrast_single_pass, preprocess, bucket_ratio: see recognize
+        tile_size, tile_overlap: tiled detection, see detect (pages are then tiled one by one
+        instead of batched)
+        Returns one result list per page, in input order.
+        '''
+        pages = [reformat_input(image) for image in images]
+        if tile_size: page_batch_size = 1
+
+        horizontal_list_agg, free_list_agg = [None]*len(pages), [None]*len(pages)
+        for indices, batch in shape_batches([img for img, _ in pages], page_batch_size):
+            horizontal_list, free_list = self.detect(batch,
+                                                     min_size = min_size, text_threshold = text_threshold,\
+                                                     low_text = low_text, link_threshold = link_threshold,\
+                                                     canvas_size = canvas_size, mag_ratio = mag_ratio,\
+                                                     slope_ths = slope_ths, ycenter_ths = ycenter_ths,\
+                                                     height_ths = height_ths, width_ths= width_ths,\
+                                                     add_margin = add_margin, reformat = False,\
+                                                     threshold = threshold, bbox_min_score = bbox_min_score,\
+                                                     bbox_min_size = bbox_min_size, max_candidates = max_candidates,\
+                                                     tile_size = tile_size, tile_overlap = tile_overlap
+                                                     )
+            for i, h_list, f_list in zip(indices, horizontal_list, free_list):
+                horizontal_list_agg[i], free_list_agg[i] = h_list, f_list
+
+        return self.recognize_pages([grey for _, grey in pages], horizontal_list_agg, free_list_agg,\
+                                    decoder, beamWidth, batch_size, workers, allowlist, blocklist, detail,\
+                                    paragraph, contrast_ths, adjust_contrast, filter_ths, y_ths, x_ths,\
+                                    output_format, bucket_ratio = bucket_ratio,\
+                                    contrast_single_pass = contrast_single_pass, preprocess = preprocess)
@@ -5,10 +5,10 @@ MIT License
 
 # -*- coding: utf-8 -*-
 import numpy as np
-from skimage import io
 import cv2
 
 def loadImage(img_file):
+    from skimage import io              # imported on first use, it is slow to import
     img = io.imread(img_file)           # RGB order
     if img.shape[0] == 2: img = img[0]
     if len(img.shape) == 2 : img = cv2.cvtColor(img, cv2.COLOR_GRAY2RGB)
@@ -34,9 +34,7 @@ def denormalizeMeanVariance(in_img, mean=(0.485, 0.456, 0.406), variance=(0.229,
     img = np.clip(img, 0, 255).astype(np.uint8)
     return img
 
-def resize_aspect_ratio(img, square_size, interpolation, mag_ratio=1):
-    height, width, channel = img.shape
-
+def aspect_ratio_size(height, width, square_size, mag_ratio=1):
     # magnify image size
     target_size = mag_ratio * max(height, width)
 
@@ -47,15 +45,24 @@ def resize_aspect_ratio(img, square_size, interpolation, mag_ratio=1):
     ratio = target_size / max(height, width)    
 
     target_h, target_w = int(height * ratio), int(width * ratio)
-    proc = cv2.resize(img, (target_w, target_h), interpolation = interpolation)
-
 
-    # make canvas and paste image
+    # canvas size, multiple of 32
     target_h32, target_w32 = target_h, target_w
     if target_h % 32 != 0:
         target_h32 = target_h + (32 - target_h % 32)
     if target_w % 32 != 0:
         target_w32 = target_w + (32 - target_w % 32)
+
+    return ratio, (target_h, target_w), (target_h32, target_w32)
+
+def resize_aspect_ratio(img, square_size, interpolation, mag_ratio=1):
+    height, width, channel = img.shape
+
+    ratio, (target_h, target_w), (target_h32, target_w32) = aspect_ratio_size(height, width, square_size, mag_ratio)
+    proc = cv2.resize(img, (target_w, target_h), interpolation = interpolation)
+
+
+    # make canvas and paste image
     resized = np.zeros((target_h32, target_w32, channel), dtype=np.float32)
     resized[0:target_h, 0:target_w, :] = proc
     target_h, target_w = target_h32, target_w32
@@ -64,6 +71,26 @@ def resize_aspect_ratio(img, square_size, interpolation, mag_ratio=1):
 
     return resized, ratio, size_heatmap
 
+def resize_normalize_into(img, out, square_size, interpolation, mag_ratio=1, mean=(0.485, 0.456, 0.406), variance=(0.229, 0.224, 0.225)):
+    # resize_aspect_ratio + normalizeMeanVariance + HWC -> CHW, written once into out
+    # (channel x H32 x W32 float32, e.g. one page of a reused batch buffer). Same values:
+    # the padding gets what a zero pixel normalizes to.
+    height, width, channel = img.shape
+
+    ratio, (target_h, target_w), _ = aspect_ratio_size(height, width, square_size, mag_ratio)
+    proc = cv2.resize(img, (target_w, target_h), interpolation = interpolation)
+
+    for c in range(channel):
+        m, v = np.float32(mean[c] * 255.0), np.float32(variance[c] * 255.0)
+        plane = out[c]
+        np.subtract(proc[:, :, c], m, out=plane[:target_h, :target_w], dtype=np.float32)
+        plane[:target_h, :target_w] /= v
+        pad = (np.float32(0) - m) / v
+        plane[target_h:, :] = pad
+        plane[:target_h, target_w:] = pad
+
+    return ratio
+
 def cvt2HeatmapImg(img):
     img = (np.clip(img, 0, 1) * 255).astype(np.uint8)
     img = cv2.applyColorMap(img, cv2.COLORMAP_JET)
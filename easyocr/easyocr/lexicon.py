@@ -0,0 +1,264 @@
+'''
+Domain lexicon for constrained word beam search.
+
+A Lexicon holds exact words plus regex patterns. The patterns are compiled to a
+character-level automaton (Thompson NFA), so the beam search can check after every
+character whether the text can still become a word or a pattern match, and can
+drop beams that can't.
+'''
+import threading
+
+DIGITS = frozenset('0123456789')
+WORD_CHARS = frozenset('abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789_')
+SPACE_CHARS = frozenset(' \t\n\r\f\v')
+CLASS_ESCAPES = {'d': (DIGITS, False), 'D': (DIGITS, True),
+                 'w': (WORD_CHARS, False), 'W': (WORD_CHARS, True),
+                 's': (SPACE_CHARS, False), 'S': (SPACE_CHARS, True)}
+
+class CharSet(object):
+    "set of characters matched by one regex atom"
+    def __init__(self, chars = (), ranges = (), negated = False):
+        self.chars = frozenset(chars)
+        self.ranges = tuple(ranges)
+        self.negated = negated
+
+    def __call__(self, ch):
+        found = ch in self.chars or any(lo <= ch <= hi for lo, hi in self.ranges)
+        return found != self.negated
+
+ANY = CharSet(negated = True)
+
+class PatternParser(object):
+    '''
+    Parser for the regex subset used by lexicon patterns:
+    literals, ., [...] / [^...] classes with ranges, \\d \\D \\w \\W \\s \\S, escapes,
+    (...) / (?:...) groups, |, and the quantifiers * + ? {m} {m,} {m,n}.
+    ^ and $ are accepted at the ends; a pattern always has to match a whole word.
+    '''
+    def __init__(self, pattern):
+        self.pattern = pattern
+        self.pos = 0
+
+    def error(self, message):
+        raise ValueError('%s at position %d in pattern %r' % (message, self.pos, self.pattern))
+
+    def peek(self):
+        return self.pattern[self.pos] if self.pos < len(self.pattern) else None
+
+    def take(self):
+        ch = self.peek()
+        if ch is None: self.error('unexpected end')
+        self.pos += 1
+        return ch
+
+    def parse(self):
+        if self.peek() == '^': self.pos += 1
+        node = self.parse_alt()
+        if self.peek() == '$': self.pos += 1
+        if self.pos != len(self.pattern): self.error('unexpected %r' % self.peek())
+        return node
+
+    def parse_alt(self):
+        options = [self.parse_concat()]
+        while self.peek() == '|':
+            self.pos += 1
+            options.append(self.parse_concat())
+        return options[0] if len(options) == 1 else ('alt', options)
+
+    def parse_concat(self):
+        items = []
+        while self.peek() not in (None, '|', ')', '$'):
+            items.append(self.parse_repeat())
+        return ('cat', items)
+
+    def parse_repeat(self):
+        node = self.parse_atom()
+        while self.peek() in ('*', '+', '?', '{'):
+            ch = self.take()
+            if ch == '*': node = ('rep', node, 0, None)
+            elif ch == '+': node = ('rep', node, 1, None)
+            elif ch == '?': node = ('rep', node, 0, 1)
+            else:
+                end = self.pattern.find('}', self.pos)
+                if end < 0: self.error('unterminated {')
+                bounds = self.pattern[self.pos:end].split(',')
+                try:
+                    low = int(bounds[0] or 0)
+                    high = low if len(bounds) == 1 else (int(bounds[1]) if bounds[1] else None)
+                except ValueError:
+                    self.error('bad repeat bounds')
+                if len(bounds) > 2 or (high is not None and high < low): self.error('bad repeat bounds')
+                self.pos = end + 1
+                node = ('rep', node, low, high)
+        return node
+
+    def parse_atom(self):
+        ch = self.take()
+        if ch == '(':
+            if self.pattern.startswith('?:', self.pos): self.pos += 2
+            node = self.parse_alt()
+            if self.take() != ')': self.error('missing )')
+            return node
+        if ch == '[': return ('char', self.parse_class())
+        if ch == '.': return ('char', ANY)
+        if ch == '\\':
+            esc = self.take()
+            if esc in CLASS_ESCAPES: return ('char', CharSet(*CLASS_ESCAPES[esc][:1], negated = CLASS_ESCAPES[esc][1]))
+            return ('char', CharSet([esc]))
+        if ch in '*+?{': self.error('nothing to repeat')
+        return ('char', CharSet([ch]))
+
+    def parse_class(self):
+        negated = self.peek() == '^'
+        if negated: self.pos += 1
+        chars, ranges, first = set(), [], True
+        while True:
+            ch = self.take()
+            if ch == ']' and not first: break
+            first = False
+            if ch == '\\':
+                esc = self.take()
+                if esc in CLASS_ESCAPES and not CLASS_ESCAPES[esc][1]:
+                    chars |= CLASS_ESCAPES[esc][0]
+                    continue
+                ch = esc
+            if self.peek() == '-' and self.pattern[self.pos+1:self.pos+2] not in ('', ']'):
+                self.pos += 1
+                hi = self.take()
+                if hi == '\\': hi = self.take()
+                if hi < ch: self.error('bad character range')
+                ranges.append((ch, hi))
+            else:
+                chars.add(ch)
+        return CharSet(chars, ranges, negated)
+
+class CharAutomaton(object):
+    '''
+    Nondeterministic automaton over characters for one or more patterns.
+    States are ints; edges[state] is a list of (CharSet or None for epsilon, next state).
+    Every state can reach the accepting state, so a non-empty state set means the text
+    read so far is a prefix of some match.
+    '''
+    def __init__(self, patterns):
+        self.edges = [[]]
+        self.accept = self.new_state()
+        for pattern in patterns:
+            end = self.build(PatternParser(pattern).parse(), 0)
+            self.edges[end].append((None, self.accept))
+        self.start = self.closure([0])
+
+    def new_state(self):
+        self.edges.append([])
+        return len(self.edges) - 1
+
+    def build(self, node, start):
+        "add node after state start, return its end state"
+        kind = node[0]
+        if kind == 'char':
+            end = self.new_state()
+            self.edges[start].append((node[1], end))
+            return end
+        if kind == 'cat':
+            for child in node[1]:
+                start = self.build(child, start)
+            return start
+        if kind == 'alt':
+            end = self.new_state()
+            for child in node[1]:
+                begin = self.new_state()
+                self.edges[start].append((None, begin))
+                self.edges[self.build(child, begin)].append((None, end))
+            return end
+        _, child, low, high = node
+        for _ in range(low):
+            start = self.build(child, start)
+        if high is None:
+            loop = self.new_state()
+            self.edges[start].append((None, loop))
+            self.edges[self.build(child, loop)].append((None, loop))
+            return loop
+        end = self.new_state()
+        self.edges[start].append((None, end))
+        for _ in range(high - low):
+            start = self.build(child, start)
+            self.edges[start].append((None, end))
+        return end
+
+    def closure(self, states):
+        stack, seen = list(states), set(states)
+        while stack:
+            for match, nxt in self.edges[stack.pop()]:
+                if match is None and nxt not in seen:
+                    seen.add(nxt)
+                    stack.append(nxt)
+        return frozenset(seen)
+
+    def step(self, states, ch):
+        return self.closure([nxt for state in states for match, nxt in self.edges[state]\
+                             if match is not None and match(ch)])
+
+class LexiconPrefixes(object):
+    "`text in prefixes` is True when text can still grow into a lexicon word or pattern match"
+    def __init__(self, lexicon):
+        self.lexicon = lexicon
+
+    def __contains__(self, text):
+        return self.lexicon.is_prefix(text)
+
+class Lexicon(object):
+    '''
+    User vocabulary for constrained decoding (see Reader.setLexicon).
+
+    Parameters:
+    words: iterable of exact words (e.g. 'TOTAL', 'VAT', 'KES', vendor names) or the path
+        of a text file with one word per line.
+    patterns: iterable of regular expressions that a whole word must match (amounts,
+        dates, invoice numbers). Patterns use the subset described in PatternParser.
+    ignore_case (bool): match words case-insensitively. Patterns are always matched as written.
+    min_ratio (float): the constrained reading of a word is used when its probability is at
+        least min_ratio times the probability of the unconstrained reading.
+    '''
+    def __init__(self, words = (), patterns = (), ignore_case = False, min_ratio = 0.1, cache_size = 100000):
+        if isinstance(words, str):
+            with open(words, "r", encoding = "utf-8-sig") as input_file:
+                words = [word.strip() for word in input_file.read().splitlines() if word.strip()]
+        self.ignore_case = ignore_case
+        self.min_ratio = min_ratio
+        self.words = frozenset(self.fold(word) for word in words)
+        self.word_prefixes = frozenset(word[:i] for word in self.words for i in range(len(word)+1))
+        self.patterns = tuple(patterns)
+        self.automaton = CharAutomaton(self.patterns) if self.patterns else None
+        self.prefixes = LexiconPrefixes(self)
+        self.cache_size = cache_size
+        self._states = {}
+        self._lock = threading.Lock()
+
+    def fold(self, text):
+        return text.lower() if self.ignore_case else text
+
+    def states(self, text):
+        "automaton states after reading text (memoized, built from the states of text[:-1])"
+        states = self._states.get(text)
+        if states is None:
+            if text == '':
+                states = self.automaton.start
+            else:
+                states = self.automaton.step(self.states(text[:-1]), text[-1])
+            with self._lock:
+                if len(self._states) >= self.cache_size:
+                    self._states.clear()
+                self._states[text] = states
+        return states
+
+    def is_prefix(self, text):
+        if self.fold(text) in self.word_prefixes:
+            return True
+        return self.automaton is not None and len(self.states(text)) > 0
+
+    def __contains__(self, text):
+        if self.fold(text) in self.words:
+            return True
+        return self.automaton is not None and self.automaton.accept in self.states(text)
+
+    def __len__(self):
+        return len(self.words) + len(self.patterns)
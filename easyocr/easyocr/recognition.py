@@ -5,9 +5,10 @@ import torch.utils.data
 import torch.nn.functional as F
 import torchvision.transforms as transforms
 import numpy as np
+import cv2
 from collections import OrderedDict
 import importlib
-from .utils import CTCLabelConverter
+from .utils import CTCLabelConverter, bucket_image_list, mmap_state_dict
 import math
 
 def custom_mean(x):
@@ -96,17 +97,34 @@ class AlignCollate(object):
         image_tensors = torch.cat([t.unsqueeze(0) for t in resized_images], 0)
         return image_tensors
 
+    def batches(self, image_list, batch_size):
+        # same batches as a DataLoader over ListDataset(image_list), built in this thread
+        for start in range(0, len(image_list), batch_size):
+            yield self([Image.fromarray(img, 'L') for img in image_list[start:start+batch_size]])
+
 def recognizer_predict(model, converter, test_loader, batch_max_length,\
-                       ignore_idx, char_group_idx, decoder = 'greedy', beamWidth= 5, device = 'cpu'):
+                       ignore_idx, char_group_idx, decoder = 'greedy', beamWidth= 5, device = 'cpu',\
+                       state = None):
     model.eval()
     result = []
+    # ignored characters are masked out of the logits once per call: softmax over the masked
+    # logits is the same as softmax -> zero ignore_idx -> renormalise, in one tensor op
+    if state is not None:
+        ignore_mask = state.ignore_mask
+    else:
+        ignore_mask = torch.zeros(len(converter.character), dtype=torch.bool)
+        ignore_mask[list(ignore_idx)] = True
+        ignore_mask = ignore_mask.to(device)
     with torch.no_grad():
         for image_tensors in test_loader:
             batch_size = image_tensors.size(0)
             image = image_tensors.to(device)
-            # For max length prediction
-            length_for_pred = torch.IntTensor([batch_max_length] * batch_size).to(device)
-            text_for_pred = torch.LongTensor(batch_size, batch_max_length + 1).fill_(0).to(device)
+            if state is not None:
+                text_for_pred = state.text_for_pred(batch_size, batch_max_length)
+            else:
+                # For max length prediction
+                length_for_pred = torch.IntTensor([batch_max_length] * batch_size).to(device)
+                text_for_pred = torch.LongTensor(batch_size, batch_max_length + 1).fill_(0).to(device)
 
             preds = model(image, text_for_pred)
 
@@ -114,28 +132,23 @@ def recognizer_predict(model, converter, test_loader, batch_max_length,\
             preds_size = torch.IntTensor([preds.size(1)] * batch_size)
 
             ######## filter ignore_char, rebalance
-            preds_prob = F.softmax(preds, dim=2)
-            preds_prob = preds_prob.cpu().detach().numpy()
-            preds_prob[:,:,ignore_idx] = 0.
-            pred_norm = preds_prob.sum(axis=2)
-            preds_prob = preds_prob/np.expand_dims(pred_norm, axis=-1)
-            preds_prob = torch.from_numpy(preds_prob).float().to(device)
+            preds_prob = F.softmax(preds.float().masked_fill(ignore_mask, float('-inf')), dim=2)
 
             if decoder == 'greedy':
-                # Select max probabilty (greedy decoding) then decode index to character
-                _, preds_index = preds_prob.max(2)
-                preds_index = preds_index.view(-1)
-                preds_str = converter.decode_greedy(preds_index.data.cpu().detach().numpy(), preds_size.data)
-            elif decoder == 'beamsearch':
-                k = preds_prob.cpu().detach().numpy()
-                preds_str = converter.decode_beamsearch(k, beamWidth=beamWidth)
-            elif decoder == 'wordbeamsearch':
-                k = preds_prob.cpu().detach().numpy()
-                preds_str = converter.decode_wordbeamsearch(k, beamWidth=beamWidth)
-
-            preds_prob = preds_prob.cpu().detach().numpy()
-            values = preds_prob.max(axis=2)
-            indices = preds_prob.argmax(axis=2)
+                # argmax and max-prob come back to the host together, in one copy
+                values, indices = preds_prob.max(2)
+                values, indices = torch.stack([values, indices.to(values.dtype)]).cpu().numpy()
+                indices = indices.astype(np.int64)
+                preds_str = converter.decode_greedy(indices.reshape(-1), preds_size.data)
+            else:
+                # beam search needs the whole matrix: copy it once, reduce on the host
+                k = preds_prob.cpu().numpy()
+                values, indices = k.max(axis=2), k.argmax(axis=2)
+                if decoder == 'beamsearch':
+                    preds_str = converter.decode_beamsearch(k, beamWidth=beamWidth)
+                elif decoder == 'wordbeamsearch':
+                    preds_str = converter.decode_wordbeamsearch(k, beamWidth=beamWidth)
+
             preds_max_prob = []
             for v,i in zip(values, indices):
                 max_probs = v[i!=0]
@@ -152,9 +165,9 @@ def recognizer_predict(model, converter, test_loader, batch_max_length,\
 
 def get_recognizer(recog_network, network_params, character,\
                    separator_list, dict_list, model_path,\
-                   device = 'cpu', quantize = True):
+                   device = 'cpu', quantize = True, dict_cache_dir = None, mmap_dir = None):
 
-    converter = CTCLabelConverter(character, separator_list, dict_list)
+    converter = CTCLabelConverter(character, separator_list, dict_list, dict_cache_dir)
     num_class = len(converter.character)
 
     if recog_network == 'generation1':
@@ -165,7 +178,17 @@ def get_recognizer(recog_network, network_params, character,\
         model_pkg = importlib.import_module(recog_network)
     model = model_pkg.Model(num_class=num_class, **network_params)
 
-    if device == 'cpu':
+    if device == 'cpu' and mmap_dir:
+        # weights stay in the mapped file (see utils.mmap_state_dict)
+        state_dict = mmap_state_dict(model_path, mmap_dir,\
+                                     lambda state_dict: OrderedDict((key[7:], value) for key, value in state_dict.items()))
+        model.load_state_dict(state_dict, assign=True)
+        if quantize:
+            try:
+                torch.quantization.quantize_dynamic(model, dtype=torch.qint8, inplace=True)
+            except:
+                pass
+    elif device == 'cpu':
         state_dict = torch.load(model_path, map_location=device, weights_only=False)
         new_state_dict = OrderedDict()
         for key, value in state_dict.items():
@@ -183,50 +206,197 @@ def get_recognizer(recog_network, network_params, character,\
 
     return model, converter
 
+class AlignCollateCV(object):
+    """
+    Same job as AlignCollate(keep_ratio_with_pad=True) without the PIL round trip: grey
+    NumPy crops are resized with cv2 straight into a uint8 staging buffer, then
+    edge padding and normalisation are done for the whole batch into one float tensor.
+    With reuse=True both buffers are kept and reused by later batches (each batch must be
+    consumed before the next one is built, as in recognizer_predict).
+    """
+
+    def __init__(self, imgH=32, imgW=100, adjust_contrast = 0., reuse = True):
+        self.imgH = imgH
+        self.imgW = imgW
+        self.adjust_contrast = adjust_contrast
+        self.reuse = reuse
+        self._tensor = torch.empty(0)
+        self._staging = np.empty(0, dtype=np.uint8)
+
+    def buffers(self, n, width):
+        size = n*self.imgH*width
+        if not self.reuse or self._tensor.numel() < size:
+            self._tensor = torch.empty(size)
+            self._staging = np.empty(size, dtype=np.uint8)
+        return self._tensor[:size].view(n, 1, self.imgH, width), self._staging[:size].reshape(n, self.imgH, width)
+
+    def __call__(self, batch):
+        batch = [image for image in batch if image is not None]
+        image_tensors, staging = self.buffers(len(batch), self.imgW)
+
+        widths = np.empty(len(batch), dtype=np.int64)
+        for k, image in enumerate(batch):
+            #### augmentation here - change contrast
+            if self.adjust_contrast > 0:
+                image = adjust_contrast_grey(image, target = self.adjust_contrast)
+            h, w = image.shape[:2]
+            resized_w = min(self.imgW, math.ceil(self.imgH * w / float(h)))
+            # INTER_AREA when shrinking is closer to PIL's antialiased bicubic than INTER_CUBIC
+            interpolation = cv2.INTER_AREA if h > self.imgH else cv2.INTER_CUBIC
+            staging[k, :, :resized_w] = cv2.resize(image, (resized_w, self.imgH), interpolation=interpolation)
+            widths[k] = resized_w
+
+        # right pad with the last column of each crop, then (x/255 - 0.5)/0.5 as ToTensor + NormalizePAD
+        cols = np.minimum(np.arange(self.imgW)[None, :], widths[:, None] - 1)
+        out = image_tensors.numpy()[:, 0]
+        out[:] = np.take_along_axis(staging, cols[:, None, :], axis=2)
+        out /= 255.
+        out -= 0.5
+        out /= 0.5
+        return image_tensors
+
+    def batches(self, image_list, batch_size):
+        for start in range(0, len(image_list), batch_size):
+            yield self(image_list[start:start+batch_size])
+
+class RecognizerState(object):
+    """
+    Recognizer state that only depends on the configuration, kept between calls by
+    session.InferenceSession: the ignore-index list and logit mask, one collate transform
+    per contrast setting and preprocessing (AlignCollate, or AlignCollateCV whose buffers
+    are reused for every batch width) and the zero text_for_pred tensors per batch shape.
+    """
+
+    def __init__(self, character, ignore_char = '', device = 'cpu'):
+        self.device = device
+        self.ignore_idx = []
+        for char in ignore_char:
+            try: self.ignore_idx.append(character.index(char)+1)
+            except: pass
+        ignore_mask = torch.zeros(len(character)+1, dtype=torch.bool)
+        ignore_mask[self.ignore_idx] = True
+        self.ignore_mask = ignore_mask.to(device)
+        self._collates = {}
+        self._text_for_pred = {}
+
+    def collate(self, imgH, imgW, adjust_contrast = 0., preprocess = 'cv2'):
+        key = (imgH, adjust_contrast, preprocess)
+        if key not in self._collates:
+            if preprocess == 'cv2':
+                self._collates[key] = AlignCollateCV(imgH=imgH, imgW=imgW, adjust_contrast=adjust_contrast)
+            else:
+                self._collates[key] = AlignCollate(imgH=imgH, imgW=imgW, keep_ratio_with_pad=True,\
+                                                   adjust_contrast=adjust_contrast)
+        collate = self._collates[key]
+        collate.imgW = imgW
+        return collate
+
+    def text_for_pred(self, batch_size, batch_max_length):
+        key = (batch_size, batch_max_length)
+        if key not in self._text_for_pred:
+            self._text_for_pred[key] = torch.LongTensor(batch_size, batch_max_length + 1).fill_(0).to(self.device)
+        return self._text_for_pred[key]
+
+def predict_buckets(recognizer, converter, img_list, imgH, imgW, batch_max_length,\
+                    ignore_idx, char_group_idx, decoder = 'greedy', beamWidth = 5, batch_size = 1,\
+                    adjust_contrast = 0., bucket_ratio = 0, workers = 1, device = 'cpu', preprocess = 'pil',\
+                    state = None):
+    """
+    Run recognizer_predict over img_list. With bucket_ratio > 0, crops are grouped into width
+    buckets (see utils.bucket_image_list) and every batch is padded only to its bucket width
+    instead of imgW. Buckets run narrowest first; results come back in img_list order.
+    preprocess: 'pil' (DataLoader + AlignCollate) or 'cv2' (AlignCollateCV, batches built
+    in this thread into one reused buffer).
+    state: RecognizerState to reuse (ignore mask, text_for_pred tensors and collate
+    transforms; batches are then built in this thread, without a DataLoader).
+    """
+    if bucket_ratio > 0:
+        groups = [(idx, [item[1] for item in items], min(width, imgW)) for idx, items, width in\
+                  bucket_image_list(list(enumerate(img_list)), imgH, bucket_ratio)]
+    else:
+        groups = [(range(len(img_list)), img_list, imgW)]
+
+    result = [None]*len(img_list)
+    if preprocess == 'cv2' and state is None:
+        collate_cv = AlignCollateCV(imgH=imgH, imgW=imgW, adjust_contrast=adjust_contrast)
+    for idx, images, width in groups:
+        if state is not None:
+            test_loader = state.collate(imgH, int(width), adjust_contrast, preprocess).batches(images, batch_size)
+        elif preprocess == 'cv2':
+            collate_cv.imgW = int(width)
+            test_loader = collate_cv.batches(images, batch_size)
+        else:
+            collate = AlignCollate(imgH=imgH, imgW=int(width), keep_ratio_with_pad=True, adjust_contrast=adjust_contrast)
+            test_loader = torch.utils.data.DataLoader(
+                ListDataset(images), batch_size=batch_size, shuffle=False,
+                num_workers=int(workers), collate_fn=collate, pin_memory=True)
+        preds = recognizer_predict(recognizer, converter, test_loader, batch_max_length,\
+                                   ignore_idx, char_group_idx, decoder, beamWidth, device = device, state = state)
+        for i, pred in zip(idx, preds):
+            result[i] = pred
+    return result
+
 def get_text(character, imgH, imgW, recognizer, converter, image_list,\
              ignore_char = '',decoder = 'greedy', beamWidth =5, batch_size=1, contrast_ths=0.1,\
-             adjust_contrast=0.5, filter_ths = 0.003, workers = 1, device = 'cpu'):
+             adjust_contrast=0.5, filter_ths = 0.003, workers = 1, device = 'cpu', bucket_ratio = 0,\
+             contrast_single_pass = False, preprocess = 'pil', state = None):
+    '''
+    contrast_single_pass: score the contrast of every crop up front and run the crops that
+    adjust_contrast would change in both variants in the same pass, instead of running a
+    second pass over the low-confidence crops. Useful when most crops are faded.
+    preprocess: 'pil' or 'cv2' crop preprocessing, see predict_buckets.
+    state: RecognizerState kept by an InferenceSession (ignore_char is then taken from it).
+    '''
     batch_max_length = int(imgW/10)
 
     char_group_idx = {}
-    ignore_idx = []
-    for char in ignore_char:
-        try: ignore_idx.append(character.index(char)+1)
-        except: pass
+    if state is not None:
+        ignore_idx = state.ignore_idx
+    else:
+        ignore_idx = []
+        for char in ignore_char:
+            try: ignore_idx.append(character.index(char)+1)
+            except: pass
 
     coord = [item[0] for item in image_list]
     img_list = [item[1] for item in image_list]
-    AlignCollate_normal = AlignCollate(imgH=imgH, imgW=imgW, keep_ratio_with_pad=True)
-    test_data = ListDataset(img_list)
-    test_loader = torch.utils.data.DataLoader(
-        test_data, batch_size=batch_size, shuffle=False,
-        num_workers=int(workers), collate_fn=AlignCollate_normal, pin_memory=True)
-
-    # predict first round
-    result1 = recognizer_predict(recognizer, converter, test_loader,batch_max_length,\
-                                 ignore_idx, char_group_idx, decoder, beamWidth, device = device)
-
-    # predict second round
-    low_confident_idx = [i for i,item in enumerate(result1) if (item[1] < contrast_ths)]
-    if len(low_confident_idx) > 0:
-        img_list2 = [img_list[i] for i in low_confident_idx]
-        AlignCollate_contrast = AlignCollate(imgH=imgH, imgW=imgW, keep_ratio_with_pad=True, adjust_contrast=adjust_contrast)
-        test_data = ListDataset(img_list2)
-        test_loader = torch.utils.data.DataLoader(
-                        test_data, batch_size=batch_size, shuffle=False,
-                        num_workers=int(workers), collate_fn=AlignCollate_contrast, pin_memory=True)
-        result2 = recognizer_predict(recognizer, converter, test_loader, batch_max_length,\
-                                     ignore_idx, char_group_idx, decoder, beamWidth, device = device)
+
+    if contrast_single_pass and adjust_contrast > 0:
+        # adjust_contrast_grey leaves crops with contrast >= target untouched, so only the
+        # others get an adjusted copy; both variants share the recognizer batches
+        low_contrast_idx = [i for i, img in enumerate(img_list) if contrast_grey(img)[0] < adjust_contrast]
+        img_list_all = img_list + [adjust_contrast_grey(img_list[i], target = adjust_contrast) for i in low_contrast_idx]
+        result_all = predict_buckets(recognizer, converter, img_list_all, imgH, imgW, batch_max_length,\
+                                     ignore_idx, char_group_idx, decoder, beamWidth, batch_size,\
+                                     bucket_ratio = bucket_ratio, workers = workers, device = device,\
+                                     preprocess = preprocess, state = state)
+        result1 = result_all[:len(img_list)]
+        result2 = {i: result_all[len(img_list)+j] for j, i in enumerate(low_contrast_idx)\
+                   if result1[i][1] < contrast_ths}
+    else:
+        # predict first round
+        result1 = predict_buckets(recognizer, converter, img_list, imgH, imgW, batch_max_length,\
+                                  ignore_idx, char_group_idx, decoder, beamWidth, batch_size,\
+                                  bucket_ratio = bucket_ratio, workers = workers, device = device,\
+                                  preprocess = preprocess, state = state)
+
+        # predict second round
+        result2 = {}
+        low_confident_idx = [i for i,item in enumerate(result1) if (item[1] < contrast_ths)]
+        if len(low_confident_idx) > 0:
+            img_list2 = [img_list[i] for i in low_confident_idx]
+            result2 = dict(zip(low_confident_idx,\
+                               predict_buckets(recognizer, converter, img_list2, imgH, imgW, batch_max_length,\
+                                               ignore_idx, char_group_idx, decoder, beamWidth, batch_size,\
+                                               adjust_contrast = adjust_contrast, bucket_ratio = bucket_ratio,\
+                                               workers = workers, device = device, preprocess = preprocess, state = state)))
 
     result = []
     for i, zipped in enumerate(zip(coord, result1)):
         box, pred1 = zipped
-        if i in low_confident_idx:
-            pred2 = result2[low_confident_idx.index(i)]
-            if pred1[1]>pred2[1]:
-                result.append( (box, pred1[0], pred1[1]) )
-            else:
-                result.append( (box, pred2[0], pred2[1]) )
+        pred2 = result2.get(i)
+        if pred2 is not None and pred1[1] <= pred2[1]:
+            result.append( (box, pred2[0], pred2[1]) )
         else:
             result.append( (box, pred1[0], pred1[1]) )
 
@@ -0,0 +1,103 @@
+'''
+Long-lived inference session on top of a Reader.
+
+Reader.readtext works out its recognition state again on every call: the ignore
+indices from allowlist/blocklist, the collate transform, the DataLoader and the
+text_for_pred / length tensors of each batch. For a server that reads small receipts
+for days that is a noticeable part of each call. An InferenceSession fixes the
+recognition settings once and keeps that state (recognition.RecognizerState) between calls.
+'''
+from . import easyocr as reader_module
+from .recognition import get_text, RecognizerState
+from .utils import get_image_list, reformat_input, shape_batches
+
+class InferenceSession(object):
+    '''
+    Parameters:
+    reader: easyocr.Reader whose models are used.
+    decoder, beamWidth, batch_size, allowlist, blocklist, contrast_ths, adjust_contrast,
+    filter_ths, bucket_ratio, contrast_single_pass: recognition settings, see Reader.recognize_pages.
+    preprocess: 'pil' (default, same crops as Reader.readtext) or 'cv2', see Reader.recognize.
+    Either way the collate transforms are kept and batches are built without a DataLoader;
+    with 'cv2' the session also reuses the crop batch buffers between calls.
+    detect_params: keyword arguments of Reader.detect (text_threshold, canvas_size, ...).
+
+    A session reuses its buffers, so one session must not be used by several threads
+    at the same time. Threads may share the Reader with a session each; inference passes
+    follow the Reader's concurrency policy (Reader.setConcurrency).
+    '''
+    def __init__(self, reader, decoder = 'greedy', beamWidth = 5, batch_size = 16,\
+                 allowlist = None, blocklist = None, contrast_ths = 0.1, adjust_contrast = 0.5,\
+                 filter_ths = 0.003, bucket_ratio = 0, contrast_single_pass = False, preprocess = 'pil',\
+                 **detect_params):
+        self.reader = reader
+        if reader.model_lang in ['chinese_tra','chinese_sim']: decoder = 'greedy'
+        self.decoder = decoder
+        self.beamWidth = beamWidth
+        self.batch_size = batch_size
+        self.contrast_ths = contrast_ths
+        self.adjust_contrast = adjust_contrast
+        self.filter_ths = filter_ths
+        self.bucket_ratio = bucket_ratio
+        self.contrast_single_pass = contrast_single_pass
+        self.preprocess = preprocess
+        self.detect_params = detect_params
+        self.state = RecognizerState(reader.character, reader.getIgnoreChar(allowlist, blocklist), reader.device)
+
+    def recognize_pages(self, img_cv_grey_list, horizontal_list_agg, free_list_agg, detail = 1,\
+                        paragraph = False, y_ths = 0.5, x_ths = 1.0, output_format = 'standard'):
+        '''
+        Same as Reader.recognize_pages with the session settings and state.
+        '''
+        imgH = reader_module.imgH
+        image_list, page_len, max_width = [], [], imgH
+        for grey_img, horizontal_list, free_list in zip(img_cv_grey_list, horizontal_list_agg, free_list_agg):
+            page_list, page_width = get_image_list(horizontal_list, free_list, grey_img, model_height = imgH)
+            image_list += page_list
+            page_len.append(len(page_list))
+            max_width = max(max_width, page_width)
+
+        result = []
+        if image_list:
+            with self.reader.inferenceSlot():
+                result = get_text(self.reader.character, imgH, int(max_width), self.reader.recognizer,\
+                                  self.reader.converter, image_list, '', self.decoder, self.beamWidth,\
+                                  self.batch_size, self.contrast_ths, self.adjust_contrast, self.filter_ths,\
+                                  0, self.reader.device, bucket_ratio = self.bucket_ratio,\
+                                  contrast_single_pass = self.contrast_single_pass,\
+                                  preprocess = self.preprocess, state = self.state)
+
+        result_agg, start = [], 0
+        for n, free_list in zip(page_len, free_list_agg):
+            result_agg.append(self.reader.formatResult(result[start:start+n], free_list, detail, paragraph,\
+                                                       x_ths, y_ths, output_format))
+            start += n
+        return result_agg
+
+    def readtext_pages(self, images, page_batch_size = 8, detail = 1, paragraph = False,\
+                       y_ths = 0.5, x_ths = 1.0, output_format = 'standard'):
+        '''
+        Parameters:
+        images: list of file paths, numpy-arrays or byte stream objects (see Reader.readtext_pages)
+        page_batch_size: int, pages per detector forward pass (same-shape pages only,
+        see Reader.readtext_pages)
+        Returns one result list per page, in input order.
+        '''
+        pages = [reformat_input(image) for image in images]
+
+        horizontal_list_agg, free_list_agg = [None]*len(pages), [None]*len(pages)
+        for indices, batch in shape_batches([img for img, _ in pages], page_batch_size):
+            horizontal_list, free_list = self.reader.detect(batch, reformat = False, **self.detect_params)
+            for i, h_list, f_list in zip(indices, horizontal_list, free_list):
+                horizontal_list_agg[i], free_list_agg[i] = h_list, f_list
+
+        return self.recognize_pages([grey for _, grey in pages], horizontal_list_agg, free_list_agg,\
+                                    detail, paragraph, y_ths, x_ths, output_format)
+
+    def readtext(self, image, detail = 1, paragraph = False, y_ths = 0.5, x_ths = 1.0,\
+                 output_format = 'standard'):
+        '''
+        Parameters:
+        image: file path or numpy-array or a byte stream object
+        '''
+        return self.readtext_pages([image], 1, detail, paragraph, y_ths, x_ths, output_format)[0]
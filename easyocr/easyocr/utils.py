@@ -2,13 +2,14 @@ from __future__ import print_function
 
 import torch
 import pickle
+import json
 import numpy as np
 import math
 import cv2
 from PIL import Image, JpegImagePlugin
-from scipy import ndimage
 import hashlib
 import sys, os
+import threading
 from zipfile import ZipFile
 from .imgproc import loadImage
 
@@ -260,20 +261,277 @@ def ctcBeamSearch(mat, classes, ignore_idx, lm, beamWidth=25, dict_list = []):
 
     if dict_list == []:
         bestLabeling = last.sort()[0] # get most probable labeling
-        res = ''
-        for i,l in enumerate(bestLabeling):
-            # removing repeated characters and blank.
-            if l not in ignore_idx and (not (i > 0 and bestLabeling[i - 1] == bestLabeling[i])):
-                res += classes[l]
+        res = labeling_to_text(bestLabeling, classes, ignore_idx)
     else:
         res = last.wordsearch(classes, ignore_idx, 20, dict_list)
     return res
 
+def labeling_to_text(labeling, classes, ignore_idx):
+    "convert a beam-labeling to text, removing repeated characters and blank"
+    res = ''
+    for i,l in enumerate(labeling):
+        if l not in ignore_idx and (not (i > 0 and labeling[i - 1] == labeling[i])):
+            res += classes[l]
+    return res
+
+def best_in_dict(labelings, classes, ignore_idx, dict_list):
+    "text of the first labeling found in dict_list, else of the most probable one (as BeamState.wordsearch)"
+    best_text = ''
+    for j, labeling in enumerate(labelings):
+        text = labeling_to_text(labeling, classes, ignore_idx)
+        if j == 0: best_text = text
+        if text in dict_list:
+            best_text = text
+            break
+    return best_text
+
+def ctcBeamSearchBatch(mats, beamWidth=25, nBest=1, topk=None, blankIdx=0,\
+                       prefixes=None, classes=None, ignore_idx=(), withProb=False):
+    '''
+    Batched CTC beam search (no LM), equivalent to running ctcBeamSearch on every matrix.
+    The beams of all matrices are extended together, one time-step at a time, with array
+    operations. A labeling is a node of a prefix tree (parent node, last char), so beams are
+    rows of arrays instead of BeamEntry objects and labelings are only built at the end.
+    Probabilities are accumulated in the same order as ctcBeamSearch, so ties and rounding
+    resolve the same way.
+
+    Parameters:
+    mats: (batch, T, C) probability array, or list of (T, C) arrays (T may differ).
+    beamWidth (int): number of beams extended per time-step.
+    nBest (int): number of labelings returned per matrix.
+    topk (int or None): extend beams only with the topk most probable characters of each
+        time-step (on top of the probability threshold). None keeps every probable character,
+        which gives the same result as ctcBeamSearch.
+    prefixes (list or None): per matrix, a set of allowed text prefixes (e.g. DictIndex.prefixes)
+        or None. A beam is only extended when its text stays in the set, so the search never
+        leaves the dictionary. Needs classes and ignore_idx to turn labelings into text.
+    withProb (bool): return (labeling, probability) pairs instead of labelings.
+
+    Return: list with, for each matrix, up to nBest labelings (tuples), most probable first.
+    '''
+    nMat = len(mats)
+    if nMat == 0:
+        return []
+    lengths = np.array([len(mat) for mat in mats])
+    maxT, maxC = int(lengths.max()), mats[0].shape[1]
+    dtype = np.result_type(*[np.asarray(mat).dtype for mat in mats])
+    probs = np.zeros((nMat, maxT, maxC), dtype=dtype)
+    for i, mat in enumerate(mats):
+        probs[i, :len(mat)] = mat
+
+    # prefix tree: node i is labeling parent[i] + (last[i],), roots (empty labeling) have last -1
+    parent = np.full(max(64, 4*nMat), -1, dtype=np.int64)
+    last = np.full(len(parent), -1, dtype=np.int64)
+    nNode = nMat
+    children = {}
+    if prefixes is not None:
+        ignore_idx = set(ignore_idx)
+        node_text = ['']*nMat
+
+    # beams, grouped by matrix and sorted by probability within each matrix
+    node = np.arange(nMat)
+    item = np.arange(nMat)
+    rank = np.zeros(nMat, dtype=np.int64)
+    prBlank = np.ones(nMat, dtype=dtype)
+    prNonBlank = np.zeros(nMat, dtype=dtype)
+    prTotal = np.ones(nMat, dtype=dtype)
+
+    for t in range(maxT):
+        active = (lengths > t)[item]
+        keep = ~active
+        ext = np.where(active & (rank < beamWidth))[0]
+
+        mat = probs[:, t, :]
+        char_highscore = mat >= 0.5/maxC
+        if topk is not None and topk < maxC:
+            best = np.argpartition(-mat, topk-1, axis=1)[:, :topk]
+            top = np.zeros_like(char_highscore)
+            np.put_along_axis(top, best, True, axis=1)
+            char_highscore &= top
+
+        # candidates in ctcBeamSearch order: per beam, the beam itself then each probable char
+        cand = np.concatenate([np.ones((len(ext), 1), dtype=bool), char_highscore[item[ext]]], axis=1)
+        b, col = np.nonzero(cand)
+        beam, c = ext[b], col - 1
+        isCopy = col == 0
+        L, i = node[beam], item[beam]
+        lastL = last[L]
+        isRoot = lastL < 0
+
+        copyNonBlank = np.where(isRoot, 0, prNonBlank[beam] * mat[i, np.maximum(lastL, 0)])
+        copyBlank = prTotal[beam] * mat[i, blankIdx]
+        # if new labeling contains duplicate char at the end, only consider paths ending with a blank
+        extNonBlank = mat[i, np.maximum(c, 0)] * np.where(~isRoot & (lastL == c), prBlank[beam], prTotal[beam])
+        addNonBlank = np.where(isCopy, copyNonBlank, extNonBlank).astype(dtype)
+        addBlank = np.where(isCopy, copyBlank, 0).astype(dtype)
+        addTotal = np.where(isCopy, copyBlank + copyNonBlank, extNonBlank).astype(dtype)
+
+        # new labeling, as fast_simplify_label: unchanged, child of L or child of L's parent
+        # (a blank between two different characters is dropped)
+        same = isCopy | ((c == blankIdx) & (isRoot | (lastL == blankIdx)))
+        parentL = parent[L]
+        useParent = ~same & (c != blankIdx) & (lastL == blankIdx) & (last[np.maximum(parentL, 0)] != c)
+        P = np.where(useParent, parentL, L)
+        target = L.copy()
+        new = np.where(~same)[0]
+        if len(new):
+            keys, keyFirst, inv = np.unique(P[new]*maxC + c[new], return_index=True, return_inverse=True)
+            inv = inv.reshape(-1)
+            ids = np.empty(len(keys), dtype=np.int64)
+            for k, key in enumerate(keys.tolist()):
+                idx = children.get(key)
+                if idx is None:
+                    if nNode == len(parent):
+                        parent = np.concatenate([parent, np.full(nNode, -1, dtype=np.int64)])
+                        last = np.concatenate([last, np.full(nNode, -1, dtype=np.int64)])
+                    idx = children[key] = nNode
+                    parent[idx], last[idx] = divmod(key, maxC)
+                    nNode += 1
+                    if prefixes is not None:
+                        p, l = divmod(key, maxC)
+                        keepChar = l not in ignore_idx and l != last[p]
+                        node_text.append(node_text[p] + classes[l] if keepChar else node_text[p])
+                ids[k] = idx
+            target[new] = ids[inv]
+
+            if prefixes is not None:
+                keyItem = i[new][keyFirst].tolist()
+                allowed = np.array([prefixes[k] is None or node_text[idx] in prefixes[k]\
+                                    for idx, k in zip(ids.tolist(), keyItem)], dtype=bool)
+                valid = np.ones(len(target), dtype=bool)
+                valid[new] = allowed[inv]
+                target, i = target[valid], i[valid]
+                addBlank, addNonBlank, addTotal = addBlank[valid], addNonBlank[valid], addTotal[valid]
+
+        # merge candidates per labeling, keeping first-insertion order for ties
+        uniq, first, inv = np.unique(target, return_index=True, return_inverse=True)
+        inv = inv.reshape(-1)
+        newBlank = np.zeros(len(uniq), dtype=dtype)
+        newNonBlank = np.zeros(len(uniq), dtype=dtype)
+        newTotal = np.zeros(len(uniq), dtype=dtype)
+        np.add.at(newBlank, inv, addBlank)
+        np.add.at(newNonBlank, inv, addNonBlank)
+        np.add.at(newTotal, inv, addTotal)
+        newItem = i[first]
+
+        order = np.lexsort((first, -newTotal, newItem))
+        sortedItem = newItem[order]
+        newRank = np.arange(len(order)) - np.searchsorted(sortedItem, sortedItem, 'left')
+
+        node = np.concatenate([uniq[order], node[keep]])
+        item = np.concatenate([sortedItem, item[keep]])
+        rank = np.concatenate([newRank, rank[keep]])
+        prBlank = np.concatenate([newBlank[order], prBlank[keep]])
+        prNonBlank = np.concatenate([newNonBlank[order], prNonBlank[keep]])
+        prTotal = np.concatenate([newTotal[order], prTotal[keep]])
+
+    results = [[None]*min(nBest, int((item == k).sum())) for k in range(nMat)]
+    for n, k, r, p in zip(node.tolist(), item.tolist(), rank.tolist(), prTotal.tolist()):
+        if r < nBest:
+            labeling = []
+            while last[n] >= 0:
+                labeling.append(int(last[n]))
+                n = parent[n]
+            results[k][r] = (tuple(labeling[::-1]), p) if withProb else tuple(labeling[::-1])
+    return results
+
+
+class DictIndex(object):
+    """
+    Word dictionary for word beam search: a hash set of words for exact lookup and the set of
+    every word prefix (a flattened prefix trie) so beams can be pruned while they grow.
+    Built on first use and, with cache_dir, pickled to disk keyed on the files' path, size
+    and mtime, so later Readers load it instead of rebuilding it.
+    """
+
+    def __init__(self, dict_paths, cache_dir = None, ignore_missing = False):
+        self.dict_paths = list(dict_paths)
+        self.cache_dir = cache_dir
+        self.ignore_missing = ignore_missing
+        if not ignore_missing:
+            for path in self.dict_paths:
+                if not os.path.isfile(path):
+                    raise FileNotFoundError(path)
+        self._words = None
+        self._prefixes = None
+        self._lock = threading.Lock()
+
+    def cache_path(self):
+        key = []
+        for path in self.dict_paths:
+            try:
+                st = os.stat(path)
+                key.append('%s:%d:%d' % (os.path.abspath(path), st.st_size, st.st_mtime_ns))
+            except OSError:
+                key.append('%s:missing' % os.path.abspath(path))
+        return os.path.join(self.cache_dir, 'dict_%s.pickle' % hashlib.md5('|'.join(key).encode()).hexdigest())
+
+    def load(self):
+        if self._words is not None:
+            return self
+        with self._lock:
+            if self._words is None:
+                self._words, self._prefixes = self._load_cached() or self._build()
+        return self
+
+    def _load_cached(self):
+        if not self.cache_dir:
+            return None
+        try:
+            with open(self.cache_path(), 'rb') as cache_file:
+                return pickle.load(cache_file)
+        except Exception:
+            return None
+
+    def _build(self):
+        words = set()
+        for path in self.dict_paths:
+            try:
+                with open(path, "r", encoding = "utf-8-sig") as input_file:
+                    words.update(input_file.read().splitlines())
+            except OSError:
+                if not self.ignore_missing:
+                    raise
+        prefixes = set([''])
+        for word in words:
+            for i in range(1, len(word)):
+                prefixes.add(word[:i])
+        prefixes.update(words)
+        words, prefixes = frozenset(words), frozenset(prefixes)
+
+        if self.cache_dir:
+            try:
+                os.makedirs(self.cache_dir, exist_ok=True)
+                cache_path = self.cache_path()
+                tmp_path = '%s.%d.tmp' % (cache_path, os.getpid())
+                with open(tmp_path, 'wb') as cache_file:
+                    pickle.dump((words, prefixes), cache_file, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp_path, cache_path)
+            except OSError:
+                pass
+        return words, prefixes
+
+    @property
+    def words(self):
+        return self.load()._words
+
+    @property
+    def prefixes(self):
+        return self.load()._prefixes
+
+    def is_prefix(self, text):
+        return text in self.prefixes
+
+    def __contains__(self, text):
+        return text in self.words
+
+    def __len__(self):
+        return len(self.words)
 
 class CTCLabelConverter(object):
     """ Convert between text-label and text-index """
 
-    def __init__(self, character, separator_list = {}, dict_pathlist = {}):
+    def __init__(self, character, separator_list = {}, dict_pathlist = {}, dict_cache_dir = None):
         # character (str): set of the possible characters.
         dict_character = list(character)
 
@@ -289,24 +547,19 @@ class CTCLabelConverter(object):
             separator_char += sep
         self.ignore_idx = [0] + [i+1 for i,item in enumerate(separator_char)]
 
-        ####### latin dict
+        ####### latin dict (indexes are built on first use by word beam search)
         if len(separator_list) == 0:
-            dict_list = []
-            for lang, dict_path in dict_pathlist.items():
-                try:
-                    with open(dict_path, "r", encoding = "utf-8-sig") as input_file:
-                        word_count =  input_file.read().splitlines()
-                    dict_list += word_count
-                except:
-                    pass
+            dict_list = DictIndex(dict_pathlist.values(), dict_cache_dir, ignore_missing = True)
         else:
             dict_list = {}
             for lang, dict_path in dict_pathlist.items():
-                with open(dict_path, "r", encoding = "utf-8-sig") as input_file:
-                    word_count =  input_file.read().splitlines()
-                dict_list[lang] = word_count
+                dict_list[lang] = DictIndex([dict_path], dict_cache_dir)
 
         self.dict_list = dict_list
+        # word beam search: only grow beams that are still a prefix of a dictionary word (Reader prune_dict)
+        self.prune_dict = False
+        # word beam search: domain words/patterns preferred over the dictionary (see Reader.setLexicon)
+        self.lexicon = None
 
     def encode(self, text, batch_max_length=25):
         """convert text-label into text-index.
@@ -342,19 +595,28 @@ class CTCLabelConverter(object):
             index += l
         return texts
 
-    def decode_beamsearch(self, mat, beamWidth=5):
+    def decode_beamsearch(self, mat, beamWidth=5, topk=None):
         texts = []
-        for i in range(mat.shape[0]):
-            t = ctcBeamSearch(mat[i], self.character, self.ignore_idx, None, beamWidth=beamWidth)
-            texts.append(t)
+        for labelings in ctcBeamSearchBatch(mat, beamWidth=beamWidth, topk=topk):
+            texts.append(labeling_to_text(labelings[0], self.character, self.ignore_idx))
         return texts
 
-    def decode_wordbeamsearch(self, mat, beamWidth=5):
-        texts = []
+    def decode_wordbeamsearch(self, mat, beamWidth=5, topk=None, prune=None):
+        """
+        prune: restrict the beams to dictionary prefixes during the search (defaults to
+        self.prune_dict). Faster and more accurate on dictionary words, but a word that is
+        not in the dictionary (amounts, codes) is cut down to its longest dictionary prefix.
+        With self.lexicon set, every word is also searched with beams restricted to the
+        lexicon; that reading is used when it is a complete lexicon word or pattern match
+        and its probability is at least lexicon.min_ratio times that of the free reading.
+        """
+        if prune is None: prune = self.prune_dict
         argmax = np.argmax(mat, axis = 2)
 
+        # collect every word of every crop, then search them all in one batch
+        matrices, dict_lists, joins = [], [], []
         for i in range(mat.shape[0]):
-            string = ''
+            words = []
             # without separators - use space as separator
             if len(self.separator_list) == 0:
                 space_idx = self.dict[' ']
@@ -363,24 +625,50 @@ class CTCLabelConverter(object):
                 group = np.split(data, np.where(np.diff(data) != 1)[0]+1)
                 group = [ list(item) for item in group if len(item)>0]
 
-                for j, list_idx in enumerate(group):
-                    matrix = mat[i, list_idx,:]
-                    t = ctcBeamSearch(matrix, self.character, self.ignore_idx, None,\
-                                      beamWidth=beamWidth, dict_list=self.dict_list)
-                    if j == 0: string += t
-                    else: string += ' '+t
+                for list_idx in group:
+                    matrices.append(mat[i, list_idx,:])
+                    dict_lists.append(self.dict_list)
+                    words.append(len(matrices)-1)
+                joins.append((' ', words))
 
             # with separators
             else:
-                words = word_segmentation(argmax[i])
-
-                for word in words:
-                    matrix = mat[i, word[1][0]:word[1][1]+1,:]
-                    if word[0] == '': dict_list = []
-                    else: dict_list = self.dict_list[word[0]]
-                    t = ctcBeamSearch(matrix, self.character, self.ignore_idx, None, beamWidth=beamWidth, dict_list=dict_list)
-                    string += t
-            texts.append(string)
+                for word in word_segmentation(argmax[i]):
+                    matrices.append(mat[i, word[1][0]:word[1][1]+1,:])
+                    if word[0] == '': dict_lists.append([])
+                    else: dict_lists.append(self.dict_list[word[0]])
+                    words.append(len(matrices)-1)
+                joins.append(('', words))
+
+        nWord, lexicon = len(matrices), self.lexicon
+        prefixes = None
+        if prune:
+            prefixes = [dict_list.prefixes if len(dict_list) else None for dict_list in dict_lists]
+        if lexicon is not None:
+            # second copy of every word, searched inside the lexicon
+            prefixes = (prefixes or [None]*nWord) + [lexicon.prefixes]*nWord
+            matrices = matrices + matrices
+        labelings = ctcBeamSearchBatch(matrices, beamWidth=beamWidth, nBest=20, topk=topk,\
+                                       prefixes=prefixes, classes=self.character, ignore_idx=self.ignore_idx,\
+                                       withProb=True)
+        word_texts = []
+        for j, dict_list in enumerate(dict_lists):
+            beams = [labeling for labeling, _ in labelings[j]]
+            if len(dict_list) == 0:
+                text = labeling_to_text(beams[0], self.character, self.ignore_idx)
+            else:
+                text = best_in_dict(beams, self.character, self.ignore_idx, dict_list)
+            if lexicon is not None:
+                for labeling, prob in labelings[nWord+j]:
+                    lexicon_text = labeling_to_text(labeling, self.character, self.ignore_idx)
+                    if lexicon_text in lexicon:
+                        if prob >= lexicon.min_ratio*labelings[j][0][1]: text = lexicon_text
+                        break
+            word_texts.append(text)
+
+        texts = []
+        for sep, words in joins:
+            texts.append(sep.join([word_texts[j] for j in words]))
         return texts
 
 def merge_to_free(merge_result, free_list):
@@ -447,7 +735,100 @@ def four_point_transform(image, rect):
 
     return warped
 
-def group_text_box(polys, slope_ths = 0.1, ycenter_ths = 0.5, height_ths = 0.5, width_ths = 1.0, add_margin = 0.05, sort_output = True):
+def margin_free_box(poly, add_margin):
+    "corner points of a slanted poly pushed outwards by the margin, as in group_text_box_reference"
+    height = np.linalg.norm([poly[6]-poly[0],poly[7]-poly[1]])
+    width = np.linalg.norm([poly[2]-poly[0],poly[3]-poly[1]])
+
+    margin = int(1.44*add_margin*min(width, height))
+
+    theta13 = abs(np.arctan( (poly[1]-poly[5])/np.maximum(10, (poly[0]-poly[4]))))
+    theta24 = abs(np.arctan( (poly[3]-poly[7])/np.maximum(10, (poly[2]-poly[6]))))
+    x1 = poly[0] - np.cos(theta13)*margin
+    y1 = poly[1] - np.sin(theta13)*margin
+    x2 = poly[2] + np.cos(theta24)*margin
+    y2 = poly[3] - np.sin(theta24)*margin
+    x3 = poly[4] + np.cos(theta13)*margin
+    y3 = poly[5] + np.sin(theta13)*margin
+    x4 = poly[6] - np.cos(theta24)*margin
+    y4 = poly[7] + np.sin(theta24)*margin
+    return [[x1,y1],[x2,y2],[x3,y3],[x4,y4]]
+
+def group_text_box(polys, slope_ths = 0.1, ycenter_ths = 0.5, height_ths = 0.5, width_ths = 1.0, add_margin = 0.05, sort_output = True,\
+                   reference = False):
+    '''
+    Group detected polys (x1,y1,...,x4,y4; top-left, top-right, low-right, low-left) into
+    merged horizontal boxes [x_min, x_max, y_min, y_max] and free (slanted) boxes.
+
+    Slopes and bounds of all polys are computed as arrays, then lines and merged boxes are
+    built in sorted sweeps that keep running sums for the line / box means, instead of
+    np.mean over growing lists per box. reference = True runs the original implementation
+    (group_text_box_reference). The means are sum / count either way, so for integer
+    coordinates, which the detectors return, both give the same boxes.
+    '''
+    if reference:
+        return group_text_box_reference(polys, slope_ths, ycenter_ths, height_ths, width_ths, add_margin, sort_output)
+
+    merged_list, free_list = [], []
+    if len(polys) == 0:
+        return merged_list, free_list
+    poly_array = np.asarray(polys).reshape(len(polys), -1)
+    slope_up = (poly_array[:,3]-poly_array[:,1])/np.maximum(10, (poly_array[:,2]-poly_array[:,0]))
+    slope_down = (poly_array[:,5]-poly_array[:,7])/np.maximum(10, (poly_array[:,4]-poly_array[:,6]))
+    horizontal = np.maximum(np.abs(slope_up), np.abs(slope_down)) < slope_ths
+    for i in np.flatnonzero(~horizontal):
+        free_list.append(margin_free_box(polys[i], add_margin))
+
+    boxes = poly_array[horizontal]
+    x_min, x_max = boxes[:,0::2].min(axis=1), boxes[:,0::2].max(axis=1)
+    y_min, y_max = boxes[:,1::2].min(axis=1), boxes[:,1::2].max(axis=1)
+    ycenter, height = 0.5*(y_min+y_max), y_max-y_min
+    order = np.argsort(ycenter, kind='stable') if sort_output else range(len(boxes))
+
+    # lines: comparable y_center level up to ths*mean height of the line so far
+    lines, line = [], []
+    for i in order:
+        if line and abs(ycenter_sum/len(line) - ycenter[i]) < ycenter_ths*(height_sum/len(line)):
+            line.append(i)
+            ycenter_sum += float(ycenter[i])
+            height_sum += float(height[i])
+        else:
+            if line: lines.append(line)
+            line, ycenter_sum, height_sum = [i], float(ycenter[i]), float(height[i])
+    if line: lines.append(line)
+
+    for line in lines:
+        if len(line) == 1: # one box per line
+            i = line[0]
+            margin = int(add_margin*min(x_max[i]-x_min[i],height[i]))
+            merged_list.append([x_min[i]-margin,x_max[i]+margin,y_min[i]-margin,y_max[i]+margin])
+            continue
+        # multiple boxes per line: merge left to right while height and gap are comparable
+        merged_box, group = [], []
+        for i in sorted(line, key=lambda i: x_min[i]):
+            if group and (abs(height_sum/len(group) - height[i]) < height_ths*(height_sum/len(group)))\
+                     and ((x_min[i]-last_x_max) < width_ths*(y_max[i]-y_min[i])):
+                group.append(i)
+                height_sum += float(height[i])
+            else:
+                if group: merged_box.append(group)
+                group, height_sum = [i], float(height[i])
+            last_x_max = x_max[i]
+        merged_box.append(group)
+
+        for group in merged_box:
+            if len(group) != 1: # adjacent box in same line
+                box_x_min, box_x_max = min(x_min[i] for i in group), max(x_max[i] for i in group)
+                box_y_min, box_y_max = min(y_min[i] for i in group), max(y_max[i] for i in group)
+            else: # non adjacent box in same line
+                i = group[0]
+                box_x_min, box_x_max, box_y_min, box_y_max = x_min[i], x_max[i], y_min[i], y_max[i]
+            margin = int(add_margin * (min(box_x_max - box_x_min, box_y_max - box_y_min)))
+            merged_list.append([box_x_min-margin, box_x_max+margin, box_y_min-margin, box_y_max+margin])
+    # may need to check if box is really in image
+    return merged_list, free_list
+
+def group_text_box_reference(polys, slope_ths = 0.1, ycenter_ths = 0.5, height_ths = 0.5, width_ths = 1.0, add_margin = 0.05, sort_output = True):
     # poly top-left, top-right, low-right, low-left
     horizontal_list, free_list,combined_list, merged_list = [],[],[],[]
 
@@ -622,6 +1003,20 @@ def get_image_list(horizontal_list, free_list, img, model_height = 64, sort_outp
         image_list = sorted(image_list, key=lambda item: item[0][0][1]) # sort by vertical position
     return image_list, max_width
 
+def bucket_image_list(image_list, model_height = 64, bucket_ratio = 2):
+    '''
+    Group recognition crops by their width once resized to model_height, in steps of
+    bucket_ratio*model_height, so each group is only padded to its own width.
+    Returns a list of (indices, image_list, max_width), narrowest bucket first.
+    '''
+    step = model_height*bucket_ratio
+    buckets = {}
+    for i, item in enumerate(image_list):
+        h, w = item[1].shape[:2]
+        width = math.ceil(model_height*w/float(max(h, 1)))
+        buckets.setdefault(max(1, math.ceil(width/step)), []).append(i)
+    return [(idx, [image_list[i] for i in idx], key*step) for key, idx in sorted(buckets.items())]
+
 def download_and_unzip(url, filename, model_storage_directory, verbose=True):
     zip_path = os.path.join(model_storage_directory, 'temp.zip')
     reporthook = printProgressBar(prefix='Progress:', suffix='Complete', length=50) if verbose else None
@@ -630,17 +1025,153 @@ def download_and_unzip(url, filename, model_storage_directory, verbose=True):
         zipObj.extract(filename, model_storage_directory)
     os.remove(zip_path)
 
-def calculate_md5(fname):
+MD5_CHUNK_SIZE = 1 << 20
+MD5_CACHE_FILE = '.md5_cache.json'
+md5_cache_lock = threading.Lock()
+
+def read_md5_cache(cache_path):
+    try:
+        with open(cache_path, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def calculate_md5(fname, cache = True):
+    '''
+    MD5 hex digest of fname, read in 1 MB chunks.
+    With cache, digests are kept in .md5_cache.json next to the file, keyed on file name,
+    size and mtime, so an unchanged file is only hashed once. A directory that can't be
+    written to just means no cache.
+    '''
+    if cache:
+        cache_path = os.path.join(os.path.dirname(os.path.abspath(fname)), MD5_CACHE_FILE)
+        stat = os.stat(fname)
+        key = '%s:%d:%d' % (os.path.basename(fname), stat.st_size, stat.st_mtime_ns)
+        digest = read_md5_cache(cache_path).get(key)
+        if digest is not None:
+            return digest
+
     hash_md5 = hashlib.md5()
     with open(fname, "rb") as f:
-        for chunk in iter(lambda: f.read(4096), b""):
+        for chunk in iter(lambda: f.read(MD5_CHUNK_SIZE), b""):
             hash_md5.update(chunk)
-    return hash_md5.hexdigest()
+    digest = hash_md5.hexdigest()
+
+    if cache:
+        with md5_cache_lock:
+            prefix = os.path.basename(fname) + ':'
+            entries = {k: v for k, v in read_md5_cache(cache_path).items() if not k.startswith(prefix)}
+            entries[key] = digest
+            tmp_path = '%s.%d.tmp' % (cache_path, os.getpid())
+            try:
+                with open(tmp_path, 'w') as f:
+                    json.dump(entries, f, indent = 0)
+                os.replace(tmp_path, cache_path)
+            except OSError:
+                pass
+    return digest
+
+def mmap_state_dict(model_path, mmap_dir, convert = None):
+    '''
+    Load the state dict of model_path memory-mapped, read-only in effect.
+
+    The first call converts the checkpoint once (convert(state_dict) may rename keys) to
+    mmap_dir/<name>.mmap.pt in torch's zip format, which torch.load(mmap = True) maps
+    instead of reading. Loaded with model.load_state_dict(..., assign = True) the model
+    keeps using the mapped pages, so processes that load the same file share them through
+    the page cache. The copy is rebuilt when model_path is newer.
+    Needs torch >= 2.1.
+    '''
+    name = os.path.splitext(os.path.basename(model_path))[0]
+    mmap_path = os.path.join(mmap_dir, name + '.mmap.pt')
+    if not os.path.isfile(mmap_path) or os.path.getmtime(mmap_path) < os.path.getmtime(model_path):
+        os.makedirs(mmap_dir, exist_ok = True)
+        state_dict = torch.load(model_path, map_location = 'cpu', weights_only = False)
+        if convert is not None:
+            state_dict = convert(state_dict)
+        state_dict = {key: value.contiguous() for key, value in state_dict.items()}
+        # several workers may convert at once: write to a private name, then rename
+        tmp_path = '%s.%d.tmp' % (mmap_path, os.getpid())
+        torch.save(state_dict, tmp_path)
+        os.replace(tmp_path, mmap_path)
+        del state_dict
+    return torch.load(mmap_path, map_location = 'cpu', mmap = True, weights_only = True)
 
 def diff(input_list):
     return max(input_list)-min(input_list)
 
-def get_paragraph(raw_result, x_ths=1, y_ths=0.5, mode = 'ltr'):
+def get_paragraph(raw_result, x_ths=1, y_ths=0.5, mode = 'ltr', reference = False):
+    '''
+    Merge recognized boxes [box, text, confidence] into paragraphs [box, text].
+
+    Same grouping and reading order as get_paragraph_reference (reference = True), with
+    the box attributes held in arrays: a group grows by the first ungrouped box (in input
+    order) within its bounds, found with one vectorized test per step, and the group
+    bounds and mean height are kept as running values instead of rescanning every box.
+    '''
+    if reference:
+        return get_paragraph_reference(raw_result, x_ths, y_ths, mode)
+    if len(raw_result) == 0:
+        return []
+
+    texts = [box[1] for box in raw_result]
+    coords = np.array([[[int(coord[0]), int(coord[1])] for coord in box[0]] for box in raw_result])
+    min_x, max_x = coords[:,:,0].min(axis=1), coords[:,:,0].max(axis=1)
+    min_y, max_y = coords[:,:,1].min(axis=1), coords[:,:,1].max(axis=1)
+    height = max_y - min_y
+    ycenter = 0.5*(min_y+max_y)
+
+    # cluster boxes into paragraph
+    group = np.zeros(len(raw_result), dtype=int)
+    current_group = 0
+    while not group.all():
+        current_group += 1
+        first = int(np.argmin(group != 0)) # first box without a group starts a new one
+        group[first] = current_group
+        g_min_x, g_max_x, g_min_y, g_max_y = min_x[first], max_x[first], min_y[first], max_y[first]
+        height_sum, count = float(height[first]), 1
+        while True:
+            mean_height = height_sum/count
+            min_gx, max_gx = g_min_x - x_ths*mean_height, g_max_x + x_ths*mean_height
+            min_gy, max_gy = g_min_y - y_ths*mean_height, g_max_y + y_ths*mean_height
+            same_horizontal_level = ((min_gx<=min_x) & (min_x<=max_gx)) | ((min_gx<=max_x) & (max_x<=max_gx))
+            same_vertical_level = ((min_gy<=min_y) & (min_y<=max_gy)) | ((min_gy<=max_y) & (max_y<=max_gy))
+            candidates = np.flatnonzero(same_horizontal_level & same_vertical_level & (group == 0))
+            # cannot add more box, go to next group
+            if len(candidates) == 0: break
+            i = candidates[0]
+            group[i] = current_group
+            g_min_x, g_max_x = min(g_min_x, min_x[i]), max(g_max_x, max_x[i])
+            g_min_y, g_max_y = min(g_min_y, min_y[i]), max(g_max_y, max_y[i])
+            height_sum, count = height_sum + float(height[i]), count + 1
+
+    # arrange order in paragraph
+    result = []
+    for g in range(1, current_group+1):
+        members = np.flatnonzero(group == g)
+        mean_height = float(height[members].sum())/len(members)
+        min_gx, max_gx = int(min_x[members].min()), int(max_x[members].max())
+        min_gy, max_gy = int(min_y[members].min()), int(max_y[members].max())
+
+        words = []
+        while len(members) > 0:
+            highest = ycenter[members].min()
+            candidates = members[ycenter[members] < highest+0.4*mean_height]
+            # get the far left (the last one of equals, as in the reference)
+            if mode == 'ltr':
+                edge = min_x[candidates]
+                best = candidates[np.flatnonzero(edge == edge.min())[-1]]
+            elif mode == 'rtl':
+                edge = max_x[candidates]
+                best = candidates[np.flatnonzero(edge == edge.max())[-1]]
+            words.append(texts[best])
+            members = members[members != best]
+
+        result.append([ [[min_gx,min_gy],[max_gx,min_gy],[max_gx,max_gy],[min_gx,max_gy]], ' '.join(words)])
+
+    return result
+
+def get_paragraph_reference(raw_result, x_ths=1, y_ths=0.5, mode = 'ltr'):
     # create basic attributes
     box_group = []
     for box in raw_result:
@@ -798,6 +1329,147 @@ def reformat_input_batched(image, n_width=None, n_height=None):
     return img, img_cv_grey
 
 
+def shape_batches(images, batch_size):
+    """
+    Group pages of the same shape into 4D batches of at most batch_size pages. Pages are
+    neither padded nor resized, so the boxes detected on a page do not depend on the other
+    pages of its batch. Yields (indices, batch); shapes come in order of first appearance.
+    """
+    groups = {}
+    for i, img in enumerate(images):
+        groups.setdefault(img.shape, []).append(i)
+    for indices in groups.values():
+        for start in range(0, len(indices), batch_size):
+            part = indices[start:start+batch_size]
+            yield part, np.stack([images[i] for i in part])
+
+def tile_grid(height, width, tile_size, overlap):
+    """
+    Top-left corners (y, x) of overlapping tiles of tile_size x tile_size (or the page size
+    where the page is smaller) that cover a height x width page. Neighbouring tiles share
+    at least `overlap` pixels; the last row / column ends at the page border.
+    """
+    if not 0 <= overlap < tile_size:
+        raise ValueError("tile overlap must be in [0, tile_size)")
+    def starts(length):
+        if length <= tile_size: return [0]
+        step = tile_size - overlap
+        n = int(math.ceil((length - overlap) / float(step)))
+        return [min(i*step, length - tile_size) for i in range(n)]
+    return [(y, x) for y in starts(height) for x in starts(width)]
+
+def merge_tiled_polys(tile_polys, origins, tile_shape, page_shape, dup_ths = 0.5, edge = 2):
+    """
+    Merge polys (x1,y1,...,x4,y4) detected on the overlapping tiles of tile_grid into one
+    list of page polys. tile_polys holds the polys of each tile in tile coordinates.
+
+    A pair of boxes from different tiles is merged when
+    - they are the same box: intersection >= dup_ths of their union, or >= dup_ths of one
+      of them; when that one is cut by a tile border, the other has to go on past the cut
+      and keep its other sides (so a sliver of one line never joins the next line), or
+    - they are the two pieces of one box cut at a seam: both are cut on facing sides of the
+      same seam (right side in the left tile and left side in the right tile, or bottom /
+      top), each reaches past the other's cut, and they share a row (vertical seam: overlap
+      of at least half the smaller height) or a column (horizontal seam: half the width).
+    Text lines that only touch or overlap inside a band are therefore kept apart. Merged
+    boxes become the bounding rectangle of the group, or the member that already covers
+    it. Only boxes in the overlap bands can have a partner, so the pairwise test is limited to
+    those.
+    """
+    tile_h, tile_w = tile_shape
+    page_h, page_w = page_shape
+    polys, tile_index, tile_origin, cut = [], [], [], []
+    for t, ((y0, x0), tile) in enumerate(zip(origins, tile_polys)):
+        for poly in tile:
+            poly = np.asarray(poly).reshape(-1)
+            poly = (poly + np.array([x0, y0]*4)).astype(poly.dtype)
+            xs, ys = poly[0::2], poly[1::2]
+            polys.append(poly)
+            tile_index.append(t)
+            tile_origin.append((x0, y0))
+            # sides (left, right, top, bottom) cut by an inner tile border
+            cut.append((x0 > 0 and xs.min() <= x0 + edge, x0 + tile_w < page_w and xs.max() >= x0 + tile_w - 1 - edge,\
+                        y0 > 0 and ys.min() <= y0 + edge, y0 + tile_h < page_h and ys.max() >= y0 + tile_h - 1 - edge))
+    if not polys:
+        return []
+    tile_index, tile_origin, cut = np.array(tile_index), np.array(tile_origin), np.array(cut, dtype=bool)
+    bounds = np.array([[p[0::2].min(), p[1::2].min(), p[0::2].max(), p[1::2].max()] for p in polys])
+
+    # overlap bands: pixels covered by more than one tile
+    x_starts, y_starts = sorted(set(x for _, x in origins)), sorted(set(y for y, _ in origins))
+    x_bands = [(b, a + tile_w - 1) for a, b in zip(x_starts, x_starts[1:])]
+    y_bands = [(b, a + tile_h - 1) for a, b in zip(y_starts, y_starts[1:])]
+    in_band = np.zeros(len(polys), dtype=bool)
+    for lo, hi in x_bands:
+        in_band |= (bounds[:,0] <= hi) & (bounds[:,2] >= lo)
+    for lo, hi in y_bands:
+        in_band |= (bounds[:,1] <= hi) & (bounds[:,3] >= lo)
+
+    size = bounds[:,2:] - bounds[:,:2] + 1
+    def piece_of(a, b, inter):
+        "boxes a lie inside boxes b; a box cut at a border only inside a box that continues it"
+        ok = inter >= dup_ths*size[a].prod(axis=1)
+        tol = np.maximum(edge, 0.1*np.minimum(size[a], size[b]))
+        whole = ~cut[a].any(axis=1)
+        for side, (col, sign) in enumerate(((0, -1), (2, 1), (1, -1), (3, 1))):
+            beyond = sign*(bounds[b,col] - bounds[a,col]) >= -edge
+            close = np.abs(bounds[b,col] - bounds[a,col]) <= tol[:,col % 2]
+            ok &= np.where(cut[a,side], beyond, close | whole)
+        return ok
+
+    parent = list(range(len(polys)))
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    candidates = np.flatnonzero(in_band)
+    candidates = candidates[np.argsort(bounds[candidates,0], kind='stable')]
+    cand_x0 = bounds[candidates,0]
+    for pos, i in enumerate(candidates):
+        others = candidates[pos+1:np.searchsorted(cand_x0, bounds[i,2], side='right')]
+        others = others[tile_index[others] != tile_index[i]]
+        if len(others) == 0: continue
+        iw = np.minimum(bounds[others,2], bounds[i,2]) - np.maximum(bounds[others,0], bounds[i,0]) + 1
+        ih = np.minimum(bounds[others,3], bounds[i,3]) - np.maximum(bounds[others,1], bounds[i,1]) + 1
+        inter, this = np.maximum(iw, 0)*np.maximum(ih, 0), np.full(len(others), i)
+        same_box = (inter >= dup_ths*(size[i].prod() + size[others].prod(axis=1) - inter)) |\
+                   piece_of(this, others, inter) | piece_of(others, this, inter)
+        continued = np.zeros(len(others), dtype=bool)
+        for axis, (low, high) in ((0, (0, 1)), (1, (2, 3))):
+            # i in the earlier tile cut at its far side, the other piece cut at its near side, or the reverse
+            first, second = bounds[i,[axis, axis+2]], bounds[others][:,[axis, axis+2]]
+            forward = cut[i,high] & cut[others,low] & (tile_origin[others,axis] > tile_origin[i,axis]) &\
+                      (first[0] <= second[:,0]) & (first[1] <= second[:,1])
+            backward = cut[i,low] & cut[others,high] & (tile_origin[others,axis] < tile_origin[i,axis]) &\
+                       (second[:,0] <= first[0]) & (second[:,1] <= first[1])
+            # share a row (vertical seam) or a column; an extent cut by the other border does not count
+            across, overlap = 1 - axis, (ih if axis == 0 else iw)
+            extent_i = np.where(cut[i,2*across] | cut[i,2*across+1], np.inf, size[i,across])
+            extent_others = np.where(cut[others,2*across] | cut[others,2*across+1], np.inf, size[others,across])
+            extent = np.minimum(extent_i, extent_others)
+            extent = np.where(np.isinf(extent), np.maximum(size[i,across], size[others,across]), extent)
+            continued |= (forward | backward) & (overlap >= 0.5*extent)
+        for j in others[(iw > 0) & (ih > 0) & (same_box | continued)]:
+            parent[find(j)] = find(i)
+
+    groups = {}
+    for i in range(len(polys)):
+        groups.setdefault(find(i), []).append(i)
+    result = []
+    for members in sorted(groups.values()):
+        if len(members) == 1:
+            result.append(polys[members[0]])
+            continue
+        x0, y0 = bounds[members,0].min(), bounds[members,1].min()
+        x1, y1 = bounds[members,2].max(), bounds[members,3].max()
+        covering = [i for i in members if tuple(bounds[i]) == (x0, y0, x1, y1)]
+        if covering:
+            result.append(polys[covering[0]])
+        else:
+            result.append(np.array([x0, y0, x1, y0, x1, y1, x0, y1]).astype(polys[members[0]].dtype))
+    return result
 
 def make_rotated_img_list(rotationInfo, img_list):
 
@@ -806,6 +1478,7 @@ def make_rotated_img_list(rotationInfo, img_list):
     # add rotated images to original image_list
     max_ratio=1
     
+    from scipy import ndimage # only needed for rotation_info, keeps scipy out of import easyocr
     for angle in rotationInfo:
         for img_info in img_list : 
             rotated = ndimage.rotate(img_info[1], angle, reshape=True) 
@@ -0,0 +1,436 @@
+"""
+Property checks for UnitTest.
+
+These cover code paths that keep a reference implementation (or have an exact expected
+result) and are tested on generated inputs rather than on recorded solutions: every check
+draws its inputs from a fixed seed, compares the fast path with the reference, reports
+the cases that differ and returns True when there are none.
+"""
+import numpy as np
+
+# %% Layout (group_text_box / get_paragraph)
+def random_polys(rng, n_boxes, width=2480, height=3508):
+    """Lines of word boxes (x1,y1,...,x4,y4 int32), a few of them slanted."""
+    polys = []
+    while len(polys) < n_boxes:
+        line_h = int(rng.integers(12, 60))
+        y = int(rng.integers(0, height - line_h))
+        x = int(rng.integers(0, width // 2))
+        for _ in range(int(rng.integers(1, 12))):
+            w = int(rng.integers(line_h, 8*line_h))
+            dy, dh = int(rng.integers(-line_h//4, line_h//4 + 1)), int(rng.integers(-line_h//4, line_h//4 + 1))
+            top, bottom = y + dy, y + dy + line_h + dh
+            if rng.random() < 0.05:
+                skew = int(rng.integers(-w//2, w//2 + 1))
+                poly = [x, top, x+w, top+skew, x+w, bottom+skew, x, bottom]
+            else:
+                poly = [x, top, x+w, top+int(rng.integers(-1, 2)), x+w, bottom, x, bottom+int(rng.integers(-1, 2))]
+            polys.append(np.array(poly).astype(np.int32))
+            x += w + int(rng.integers(0, 2*line_h))
+    rng.shuffle(polys)
+    return polys[:n_boxes]
+
+def random_layout_params(rng):
+    return dict(slope_ths=float(rng.choice([0.05, 0.1, 0.2])), ycenter_ths=float(rng.uniform(0.2, 1.0)),
+                height_ths=float(rng.uniform(0.2, 1.0)), width_ths=float(rng.uniform(0.2, 2.0)),
+                add_margin=float(rng.uniform(0, 0.2)), sort_output=bool(rng.random() < 0.9))
+
+def paragraph_input(rng, merged_list):
+    return [[[[x0, y0], [x1, y0], [x1, y1], [x0, y1]], 'w%d' % i, float(rng.random())]
+            for i, (x0, x1, y0, y1) in enumerate(merged_list)]
+
+def same(a, b):
+    """Exact equality of nested lists / tuples of numbers and strings."""
+    if isinstance(a, (list, tuple)):
+        return isinstance(b, (list, tuple)) and len(a) == len(b) and all(same(x, y) for x, y in zip(a, b))
+    return a == b
+
+def check_layout(easyocr, seed = 0, pages = 50, max_boxes = 300):
+    """Array-based group_text_box / get_paragraph give the results of the reference versions."""
+    utils = easyocr.utils
+    rng = np.random.default_rng(seed)
+    failures = 0
+    for page in range(pages):
+        polys = random_polys(rng, int(rng.integers(0, max_boxes)))
+        params = random_layout_params(rng)
+        fast, ref = utils.group_text_box(polys, **params), utils.group_text_box(polys, reference=True, **params)
+        if not same(fast, ref):
+            failures += 1
+            print("group_text_box differs on page {} with {}".format(page, params))
+        raw = paragraph_input(rng, ref[0])
+        x_ths, y_ths, mode = float(rng.uniform(0.2, 2)), float(rng.uniform(0.2, 1)), str(rng.choice(['ltr', 'rtl']))
+        if not same(utils.get_paragraph(raw, x_ths, y_ths, mode), utils.get_paragraph(raw, x_ths, y_ths, mode, reference=True)):
+            failures += 1
+            print("get_paragraph differs on page {} (x_ths={}, y_ths={}, {})".format(page, x_ths, y_ths, mode))
+    return failures == 0
+
+# %% CTC beam search
+def random_probs(rng, length, n_class, sharpness = 3.):
+    """(length, n_class) float32 softmax of random logits, peaked enough for several beams."""
+    logits = rng.normal(size=(length, n_class))*sharpness
+    probs = np.exp(logits - logits.max(axis=1, keepdims=True))
+    return (probs/probs.sum(axis=1, keepdims=True)).astype(np.float32)
+
+def check_beamsearch(easyocr, seed = 0, batches = 20, beam_width = 5):
+    """Batched ctcBeamSearchBatch decodes like ctcBeamSearch, with and without a word list."""
+    utils = easyocr.utils
+    converter = utils.CTCLabelConverter('0123456789 .,-ABCDE')
+    classes, ignore_idx = converter.character, converter.ignore_idx
+    rng = np.random.default_rng(seed)
+    failures = 0
+    for batch in range(batches):
+        n_crop = int(rng.integers(1, 8))
+        # one (batch, T, C) array as from the recognizer, and words of different lengths
+        mat = np.stack([random_probs(rng, 24, len(classes)) for _ in range(n_crop)])
+        words = [random_probs(rng, int(rng.integers(1, 20)), len(classes)) for _ in range(n_crop)]
+        ref = [utils.ctcBeamSearch(m, classes, ignore_idx, None, beamWidth=beam_width) for m in mat]
+        if converter.decode_beamsearch(mat, beamWidth=beam_width) != ref:
+            failures += 1
+            print("decode_beamsearch differs on batch {}".format(batch))
+        nbest = utils.ctcBeamSearchBatch(words, beamWidth=beam_width, nBest=20)
+        for w, (word, labelings) in enumerate(zip(words, nbest)):
+            texts = [utils.labeling_to_text(labeling, classes, ignore_idx) for labeling in labelings]
+            dict_list = set(text for text in texts if rng.random() < 0.3)
+            fast = utils.best_in_dict(labelings, classes, ignore_idx, dict_list) if dict_list else texts[0]
+            ref = utils.ctcBeamSearch(word, classes, ignore_idx, None, beamWidth=beam_width, dict_list=list(dict_list))
+            if fast != ref:
+                failures += 1
+                print("word {} of batch {}: {!r} != {!r}".format(w, batch, fast, ref))
+    return failures == 0
+
+# %% Recognition batches
+def crop_id_recognizer(n_steps = 5):
+    """Stand-in recognizer that reads the id of a flat grey crop (see check_bucket_order) as digits."""
+    import torch
+
+    class CropIdRecognizer(torch.nn.Module):
+        def forward(self, image, text):
+            grey = ((image.mean(dim=(1, 2, 3))*0.5 + 0.5)*255).round().long()
+            preds = torch.full((image.size(0), n_steps, 11), -10.)
+            preds[:, :, 0] = 10.  # blank between digits
+            for n, value in enumerate(grey.tolist()):
+                for k, digit in enumerate('{:03d}'.format(value - 10)):
+                    preds[n, 2*k, int(digit) + 1], preds[n, 2*k, 0] = 10., -10.
+            return preds
+    return CropIdRecognizer()
+
+def check_bucket_order(easyocr, seed = 0, trials = 20):
+    """get_text with width buckets (with or without a session state) returns results in image_list order."""
+    import math
+    recognition, utils = easyocr.recognition, easyocr.utils
+    rng = np.random.default_rng(seed)
+    character = '0123456789'
+    converter = utils.CTCLabelConverter(character)
+    recognizer = crop_id_recognizer()
+    kept_state = recognition.RecognizerState(character)
+    imgH = 64
+    failures = 0
+    for trial in range(trials):
+        n_crops = int(rng.integers(2, 40))
+        # flat crops of grey level 10 + id (ids are read back by the stand-in recognizer)
+        widths = rng.integers(8, 2000, size=n_crops)
+        image_list = [([[i, 0], [int(w), 0], [int(w), 48], [i, 48]], np.full((48, int(w)), 10 + i, dtype=np.uint8))
+                      for i, w in enumerate(widths)]
+        imgW = max(math.ceil(imgH*w/48.) for w in widths)
+        bucket_ratio = int(rng.choice([1, 2, 4]))
+        batch_size = int(rng.choice([1, 3, 8, 64]))
+        preprocess = str(rng.choice(['pil', 'cv2']))
+        state = kept_state if trial % 2 else None
+        n_buckets = len(utils.bucket_image_list(image_list, imgH, bucket_ratio))
+        result = recognition.get_text(character, imgH, imgW, recognizer, converter, image_list,\
+                                      batch_size = batch_size, contrast_ths = 0., workers = 0,\
+                                      bucket_ratio = bucket_ratio, preprocess = preprocess, state = state)
+        expected = [(box, '{:03d}'.format(i)) for i, (box, _) in enumerate(image_list)]
+        if [(box, text) for box, text, _ in result] != expected:
+            failures += 1
+            print("trial {} ({} crops in {} buckets, batch {}, {}, state {}): results out of order".format(
+                trial, n_crops, n_buckets, batch_size, preprocess, state is not None))
+    return failures == 0
+
+def check_session_collate(easyocr, seed = 0, trials = 20):
+    """Batches from a kept RecognizerState collate equal the per-call DataLoader / AlignCollateCV batches."""
+    import torch
+    recognition = easyocr.recognition
+    rng = np.random.default_rng(seed)
+    state = recognition.RecognizerState('0123456789')
+    imgH = 64
+    failures = 0
+    for trial in range(trials):
+        images = [rng.integers(0, 256, size=(int(rng.integers(8, 80)), int(rng.integers(4, 600))), dtype=np.uint8)
+                  for _ in range(int(rng.integers(1, 20)))]
+        imgW = int(rng.integers(imgH, 1200))
+        batch_size = int(rng.choice([1, 3, 8]))
+        adjust_contrast = float(rng.choice([0., 0.5]))
+        preprocess = str(rng.choice(['pil', 'cv2']))
+        if preprocess == 'cv2':
+            reference = recognition.AlignCollateCV(imgH=imgH, imgW=imgW, adjust_contrast=adjust_contrast,
+                                                   reuse=False).batches(images, batch_size)
+        else:
+            collate = recognition.AlignCollate(imgH=imgH, imgW=imgW, keep_ratio_with_pad=True,
+                                               adjust_contrast=adjust_contrast)
+            reference = torch.utils.data.DataLoader(recognition.ListDataset(images), batch_size=batch_size,
+                                                    shuffle=False, num_workers=0, collate_fn=collate)
+        kept = state.collate(imgH, imgW, adjust_contrast, preprocess).batches(images, batch_size)
+        if not all(torch.equal(a, b) for a, b in zip(kept, reference)):
+            failures += 1
+            print("trial {} ({} crops, width {}, {}): session batches differ".format(trial, len(images), imgW, preprocess))
+    return failures == 0
+
+# %% Lexicon patterns
+LEXICON_PATTERNS = [
+    r"\d{1,3}(,\d{3})*(\.\d{2})?",
+    r"\d{1,2}[/.-]\d{1,2}[/.-]\d{2,4}",
+    r"\d{1,2}:\d{2}(:\d{2})?",
+    r"(INV|RCT|NO|#)?[-/#]?[A-Z]{0,3}\d{3,12}",
+    r"[a-c][^0-9 ]{2}\d?",
+    r"^(ab|cd)+e{2,3}x*$",
+    r"x(?:y|z)*\.\w",
+    r"\s?\S{1,2}|[.:]+",
+    ]
+LEXICON_ALPHABET = '0123456789.,/:-# abcdexyzINVRCTO'
+
+def check_lexicon(easyocr, seed = 0, samples = 300):
+    """Lexicon word and pattern matching agree with set lookups and re.fullmatch."""
+    import re
+    import importlib
+    lexicon_module = importlib.import_module('easyocr.lexicon')
+    rng = np.random.default_rng(seed)
+    failures = 0
+
+    def random_text(max_len):
+        return ''.join(rng.choice(list(LEXICON_ALPHABET), size=int(rng.integers(0, max_len+1))))
+
+    for pattern in LEXICON_PATTERNS:
+        lexicon, regex = lexicon_module.Lexicon(patterns=[pattern]), re.compile(pattern)
+        # random texts: mostly non-matches; a text that is not a prefix never completes to a match
+        for _ in range(samples):
+            text = random_text(12)
+            if (text in lexicon) != (regex.fullmatch(text) is not None):
+                failures += 1
+                print("pattern {!r}: {!r} in lexicon is {}".format(pattern, text, text in lexicon))
+            if not lexicon.is_prefix(text) and any(regex.fullmatch(text + random_text(6)) for _ in range(5)):
+                failures += 1
+                print("pattern {!r}: {!r} is a prefix of a match but is_prefix is False".format(pattern, text))
+        # random walks that stay inside the prefixes: matches whenever the lexicon says so
+        for _ in range(samples):
+            text = ''
+            for _ in range(16):
+                options = [ch for ch in LEXICON_ALPHABET if lexicon.is_prefix(text + ch)]
+                if not options or (text in lexicon and rng.random() < 0.3):
+                    break
+                text += str(rng.choice(options))
+            if (text in lexicon) != (regex.fullmatch(text) is not None):
+                failures += 1
+                print("pattern {!r}: {!r} in lexicon is {}".format(pattern, text, text in lexicon))
+
+    words = ['TOTAL', 'VAT', 'KES', 'Sub-Total', 'M-PESA']
+    lexicon = lexicon_module.Lexicon(words=words, ignore_case=True)
+    folded = set(word.lower() for word in words)
+    for text in words + [word.upper() for word in words] + [word[:-1] for word in words] + ['TOTALS', 'MPESA']:
+        expected_prefix = any(word.startswith(text.lower()) for word in folded)
+        if (text in lexicon) != (text.lower() in folded) or lexicon.is_prefix(text) != expected_prefix:
+            failures += 1
+            print("words: {!r} in lexicon is {}, is_prefix is {}".format(text, text in lexicon, lexicon.is_prefix(text)))
+    return failures == 0
+
+# %% Detector input
+def reference_detector_input(image_arrs, canvas_size, mag_ratio):
+    """Input of detection.test_net without an input pool (resize, normalize, transpose, stack)."""
+    import cv2
+    import importlib
+    imgproc = importlib.import_module('easyocr.imgproc')
+    img_resized_list = []
+    for img in image_arrs:
+        img_resized, target_ratio, size_heatmap = imgproc.resize_aspect_ratio(img, canvas_size,
+                                                                              interpolation=cv2.INTER_LINEAR,
+                                                                              mag_ratio=mag_ratio)
+        img_resized_list.append(img_resized)
+    x = [np.transpose(imgproc.normalizeMeanVariance(n_img), (2, 0, 1)) for n_img in img_resized_list]
+    return np.array(x), target_ratio
+
+def check_detector_input(easyocr, seed = 0, pages = 20):
+    """Pooled detector input (detection.prepare_input) equals the reference input bit for bit."""
+    detection = easyocr.detection
+    pool = detection.DetectorInputPool()
+    rng = np.random.default_rng(seed)
+    failures = 0
+    for page in range(pages):
+        height, width = int(rng.integers(20, 1200)), int(rng.integers(20, 1200))
+        image_arrs = rng.integers(0, 256, size=(int(rng.integers(1, 4)), height, width, 3), dtype=np.uint8)
+        canvas_size, mag_ratio = int(rng.choice([256, 640, 1280, 2560])), float(rng.choice([0.5, 1., 1.5]))
+        ref, ref_ratio = reference_detector_input(image_arrs, canvas_size, mag_ratio)
+        x, ratio, buffer = detection.prepare_input(image_arrs, canvas_size, mag_ratio, pool, 'cpu')
+        if ratio != ref_ratio or not np.array_equal(x.numpy(), ref):
+            failures += 1
+            print("detector input differs on page {} ({}x{}, canvas {}, mag {})".format(page, width, height,
+                                                                                     canvas_size, mag_ratio))
+        # a buffer is lent to one pass at a time and reused once it is given back
+        other = pool.acquire(tuple(buffer.shape))
+        pool.release(buffer)
+        if other is buffer or pool.acquire(tuple(buffer.shape)) is not buffer:
+            failures += 1
+            print("input pool lent the same buffer twice or did not reuse it on page {}".format(page))
+    return failures == 0
+
+# %% Page batches
+def check_page_batches(easyocr, seed = 0, pages = 20):
+    """utils.shape_batches batches every page once, and its detector input is the one it gets alone."""
+    utils = easyocr.utils
+    rng = np.random.default_rng(seed)
+    failures = 0
+    for trial in range(pages):
+        shapes = [(int(rng.integers(20, 400)), int(rng.integers(20, 400)), 3) for _ in range(int(rng.integers(1, 4)))]
+        images = [rng.integers(0, 256, size=shapes[int(rng.integers(len(shapes)))], dtype=np.uint8)
+                  for _ in range(int(rng.integers(1, 12)))]
+        batch_size, canvas_size = int(rng.integers(1, 5)), int(rng.choice([256, 640]))
+        seen = []
+        for indices, batch in utils.shape_batches(images, batch_size):
+            seen += indices
+            x, _ = reference_detector_input(batch, canvas_size, 1.)
+            alone = [reference_detector_input(images[i][None], canvas_size, 1.)[0][0] for i in indices]
+            if len(indices) > batch_size or not all(np.array_equal(a, b) for a, b in zip(x, alone)):
+                failures += 1
+                print("page batch {} of trial {} differs from its pages read alone".format(indices, trial))
+        if sorted(seen) != list(range(len(images))):
+            failures += 1
+            print("trial {}: pages {} batched as {}".format(trial, len(images), seen))
+    return failures == 0
+
+# %% Tiled detection
+def text_page(rng, height, width, line_h, gap, strip = 160):
+    """
+    Boxes (x0, y0, x1, y1) of text lines line_h high with gap pixels between lines (touching
+    at 0, overlapping when negative), words up to 14 line heights wide, and a strip on the
+    right with boxes several lines tall.
+    """
+    boxes, y = [], int(rng.integers(0, line_h))
+    while y + line_h <= height:
+        x = int(rng.integers(0, 40))
+        while True:
+            w = int(rng.integers(2*line_h, 14*line_h))
+            if x + w > width - strip: break
+            boxes.append((x, y, x + w - 1, y + line_h - 1))
+            x += w + int(rng.integers(line_h//2, 2*line_h))
+        y += line_h + gap
+    y = int(rng.integers(0, 40))
+    while True:
+        h = int(rng.integers(100, 400))
+        if y + h > height: break
+        x = width - strip + int(rng.integers(10, 40))
+        boxes.append((x, y, x + int(rng.integers(20, strip - 50)), y + h - 1))
+        y += h + int(rng.integers(10, 60))
+    return boxes
+
+def tile_boxes(boxes, origins, tile_shape):
+    """What a detector sees of each box on every tile: the box cut to the tile, in tile coordinates."""
+    tile_h, tile_w = tile_shape
+    tile_polys = []
+    for y0, x0 in origins:
+        polys = []
+        for x1, y1, x2, y2 in boxes:
+            cx1, cy1, cx2, cy2 = max(x1, x0), max(y1, y0), min(x2, x0 + tile_w - 1), min(y2, y0 + tile_h - 1)
+            if cx1 <= cx2 and cy1 <= cy2:
+                polys.append(np.array([cx1, cy1, cx2, cy1, cx2, cy2, cx1, cy2]).astype(np.int32) - np.array([x0, y0]*4))
+        tile_polys.append(polys)
+    return tile_polys
+
+def check_tiled_merge(easyocr, seed = 0, pages = 40):
+    """merge_tiled_polys gives back the boxes of the page, also for touching and overlapping lines."""
+    utils = easyocr.utils
+    rng = np.random.default_rng(seed)
+    # 4000 x 1200 pages with 30 px lines that touch or overlap in the bands, then random layouts
+    layouts = [dict(height=4000, width=1200, tile_size=1024, overlap=128, line_h=30, gap=gap) for gap in (0, -2)]
+    for _ in range(pages):
+        tile_size = int(rng.choice([512, 768, 1024]))
+        layouts.append(dict(height=int(rng.integers(tile_size, 4*tile_size)), width=int(rng.integers(tile_size//2, 2*tile_size)),
+                            tile_size=tile_size, overlap=int(rng.choice([64, 128])), line_h=int(rng.integers(16, 48)),
+                            gap=int(rng.choice([-3, -2, -1, 0, 1, 2, 4]))))
+    failures = 0
+    for page, layout in enumerate(layouts):
+        height, width = layout['height'], layout['width']
+        boxes = text_page(rng, height, width, layout['line_h'], layout['gap'])
+        origins = utils.tile_grid(height, width, layout['tile_size'], layout['overlap'])
+        tile_shape = (min(layout['tile_size'], height), min(layout['tile_size'], width))
+        merged = utils.merge_tiled_polys(tile_boxes(boxes, origins, tile_shape), origins, tile_shape, (height, width))
+        merged = sorted((int(p[0]), int(p[1]), int(p[4]), int(p[5])) for p in merged)
+        if merged != sorted(boxes):
+            failures += 1
+            print("page {} {}: {} boxes merged into {}, {} exact".format(page, layout, len(boxes), len(merged),
+                                                                        len(set(boxes) & set(merged))))
+    return failures == 0
+
+# %%
+PROPERTY_TESTS = {
+    "layout property checks": {
+        'test01': {
+            'description': "Array-based group_text_box and get_paragraph match the reference versions.",
+            "method": "unit_test.property_test.check_layout",
+            'input': ["unit_test.easyocr", 0, 50],
+            'output': True,
+            'severity': "Error"
+            },
+        },
+    "beam search property checks": {
+        'test01': {
+            'description': "Batched CTC beam search matches ctcBeamSearch, with and without a word list.",
+            "method": "unit_test.property_test.check_beamsearch",
+            'input': ["unit_test.easyocr", 0, 20],
+            'output': True,
+            'severity': "Error"
+            },
+        },
+    "recognition bucket property checks": {
+        'test01': {
+            'description': "get_text returns results in input order when crops span several width buckets.",
+            "method": "unit_test.property_test.check_bucket_order",
+            'input': ["unit_test.easyocr", 0, 20],
+            'output': True,
+            'severity': "Error"
+            },
+        },
+    "session collate property checks": {
+        'test01': {
+            'description': "Collate transforms kept by an InferenceSession give the same batches as a fresh DataLoader.",
+            "method": "unit_test.property_test.check_session_collate",
+            'input': ["unit_test.easyocr", 0, 20],
+            'output': True,
+            'severity': "Error"
+            },
+        },
+    "lexicon property checks": {
+        'test01': {
+            'description': "Lexicon words and regex patterns match like set lookups and re.fullmatch.",
+            "method": "unit_test.property_test.check_lexicon",
+            'input': ["unit_test.easyocr", 0, 300],
+            'output': True,
+            'severity': "Error"
+            },
+        },
+    "detector input property checks": {
+        'test01': {
+            'description': "Pooled CRAFT detector input equals the resize/normalize/stack reference.",
+            "method": "unit_test.property_test.check_detector_input",
+            'input': ["unit_test.easyocr", 0, 20],
+            'output': True,
+            'severity': "Error"
+            },
+        },
+    "page batch property checks": {
+        'test01': {
+            'description': "Mixed-size pages are batched by shape and get the detector input they get alone.",
+            "method": "unit_test.property_test.check_page_batches",
+            'input': ["unit_test.easyocr", 0, 20],
+            'output': True,
+            'severity': "Error"
+            },
+        },
+    "tiled detection property checks": {
+        'test01': {
+            'description': "Tile boxes merge back into the page boxes, with touching and overlapping lines in the tile overlaps.",
+            "method": "unit_test.property_test.check_tiled_merge",
+            'input': ["unit_test.easyocr", 0, 40],
+            'output': True,
+            'severity': "Error"
+            },
+        },
+    }
@@ -1,12 +1,14 @@
 
 import argparse
+import sys
 from unit_test import UnitTest 
 
 # %%
 def main(args):
 
-    unit_test = UnitTest(args.easyocr, args.test_data, args.image_data_dir, args.verbose)
-    unit_test.do_test(args.verbose)
+    unit_test = UnitTest(args.easyocr, args.test_data, args.image_data_dir, args.verbose,
+                         property_only = args.property_only)
+    return 0 if unit_test.do_test(args.verbose) else 1
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Script to run EasyOCR unit tet.",
@@ -15,5 +17,6 @@ if __name__ == "__main__":
     parser.add_argument("-t", "--test_data", default="./data/EasyOcrUnitTestPackage.pickle", help="Path to test data.")
     parser.add_argument("-d", "--image_data_dir", default="../examples", help="Path to directory that contains EasyOCR example images.")
     parser.add_argument("-v", "--verbose", default=0, type = int, help="Verbosity level of report.")
+    parser.add_argument("-p", "--property_only", action="store_true", help="Only run the property checks (no model weights or example images needed).")
     args = parser.parse_args()
-    main(args)
+    sys.exit(main(args))
@@ -3,11 +3,14 @@ import sys
 import importlib
 import pickle
 import lzma
+import copy
 import PIL.Image
 import numpy as np
 
 import torch
 
+import property_test
+
 # %%
 class Attributes:
     pass
@@ -18,9 +21,11 @@ class UnitTest:
                  test_data = "./data/EasyOcrUnitTestPackage.pickle",
                  image_data_dir = "../examples", 
                  verbose = 0, 
-                 numeric_acceptance_error = 0.1):
+                 numeric_acceptance_error = 0.1,
+                 property_only = False):
         
         self.verbose = verbose
+        self.property_test = property_test
       
         easy_ocr_init = os.path.join(easyocr_module, "__init__.py")
         if not os.path.isfile(easy_ocr_init):
@@ -45,8 +50,13 @@ class UnitTest:
         
         self.image_data_dir = image_data_dir
         
-        self.set_data(test_data)
-        self.set_easyocr()
+        if property_only:
+            # generated inputs only: no test package, example images or model weights needed
+            self.test_book = {}
+        else:
+            self.set_data(test_data)
+            self.set_easyocr()
+        self.test_book.update(copy.deepcopy(property_test.PROPERTY_TESTS))
         self.numeric_acceptance_error = numeric_acceptance_error
     
     def set_data(self, test_data):
@@ -112,7 +122,7 @@ class UnitTest:
    
     
     def validate(self, test, solution, dtype):
-        if dtype == str:
+        if dtype == str or dtype == bool:
             return test == solution
         elif np.issubdtype(dtype, np.integer):
             return abs(1-test/solution) < self.numeric_acceptance_error
@@ -231,6 +241,7 @@ class UnitTest:
             print("Testing completed:\n Final result: Passed.")
         else:
             print("Testing completed:\n Final result: Failed.")
+        return num_module_pass >= num_module_to_test
         
 
 
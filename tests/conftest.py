@@ -0,0 +1,77 @@
+"""
+Test setup for the API (app/). The OCR models and Vertex AI are not loaded: tests stub
+extract_text / process_invoice / the Gemini calls they go through.
+"""
+import os
+import sys
+import tempfile
+import types
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+os.environ.setdefault("BACKEND_SERVER", "http://backend.test/documents/")
+os.environ.setdefault("JOB_BACKEND", "memory")
+os.environ.setdefault("JOB_POLL_INTERVAL", "0.01")
+os.environ.setdefault("LLM_CACHE_PATH", os.path.join(tempfile.mkdtemp(), "llm_cache.sqlite3"))
+os.environ.setdefault("OCR_CACHE_ENABLED", "0")
+
+
+def _unavailable(*args, **kwargs):
+    raise RuntimeError("not available in tests, stub it")
+
+
+def _stub_vertexai():
+    try:
+        import vertexai  # noqa: F401
+    except ImportError:
+        generative_models = types.ModuleType("vertexai.generative_models")
+        for name in ("GenerationConfig", "GenerativeModel", "SafetySetting"):
+            setattr(generative_models, name, type(name, (), {
+                "__init__": lambda self, *args, **kwargs: None,
+                "generate_content": _unavailable,
+            }))
+        vertexai = types.ModuleType("vertexai")
+        vertexai.init = lambda **kwargs: None
+        vertexai.generative_models = generative_models
+        sys.modules["vertexai"] = vertexai
+        sys.modules["vertexai.generative_models"] = generative_models
+
+
+def _stub_ocr():
+    # app.ocr imports easyocr (torch); the API tests never run the models
+    try:
+        import app.ocr  # noqa: F401
+    except ImportError:
+        ocr = types.ModuleType("app.ocr")
+        ocr.extract_text = _unavailable
+        ocr.extract_text_batch = _unavailable
+        ocr.inference_stats = lambda: {}
+        sys.modules["app.ocr"] = ocr
+
+
+_stub_vertexai()
+_stub_ocr()
+
+
+@pytest.fixture
+def main(monkeypatch):
+    """app.main with tokens decoded as {"user_id": <token>} ("anonymous" decodes without one)."""
+    from app import main
+
+    def decode_token(token, refresh_token=None):
+        return {"username": token, "email": f"{token}@example.com",
+                "user_id": None if token.startswith("anonymous") else token}
+
+    monkeypatch.setattr(main, "decode_token", decode_token)
+    return main
+
+
+@pytest.fixture
+def client(main):
+    from fastapi.testclient import TestClient
+
+    with TestClient(main.app) as client:
+        yield client
@@ -0,0 +1,83 @@
+import asyncio
+import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from app import batch
+
+
+@pytest.fixture
+def pipeline(monkeypatch):
+    """OCR and parse stubs; records how many files are parsed at the same time."""
+    state = {"parsing": 0, "max_parsing": 0}
+    lock = threading.Lock()
+
+    def extract_text_batch(paths):
+        return [f"text of {path}" for path in paths]
+
+    def process_invoice(text, token, identity, use_cache=True):
+        with lock:
+            state["parsing"] += 1
+            state["max_parsing"] = max(state["max_parsing"], state["parsing"])
+        time.sleep(0.02)
+        with lock:
+            state["parsing"] -= 1
+        return {"text": text}
+
+    monkeypatch.setattr(batch, "extract_text_batch", extract_text_batch)
+    monkeypatch.setattr(batch, "process_invoice", process_invoice)
+    return state
+
+
+def write_files(directory, n):
+    files = []
+    for index in range(n):
+        path = directory / f"batch-{index}.png"
+        path.write_bytes(b"fake image bytes")
+        files.append((index, f"receipt-{index}.png", str(path)))
+    return files
+
+
+async def collect(stream):
+    return [json.loads(line) async for line in stream]
+
+
+def test_parsing_is_bounded_and_files_are_deleted(pipeline, tmp_path):
+    chunks = batch.chunk_files(write_files(tmp_path, 12), size=4)
+    with ThreadPoolExecutor(1) as executor:
+        first_ocr = executor.submit(batch.ocr_chunk, [path for _, _, path in chunks[0]])
+        lines = asyncio.run(collect(batch.batch_results(chunks, first_ocr, "alice", {"user_id": "alice"},
+                                                        parse_limit=2)))
+    assert sorted(line["index"] for line in lines) == list(range(12))
+    assert all(line["status"] == "succeeded" for line in lines)
+    assert pipeline["max_parsing"] <= 2
+    assert not list(tmp_path.iterdir())
+
+
+def test_stream_closed_early_deletes_remaining_files(pipeline, tmp_path):
+    chunks = batch.chunk_files(write_files(tmp_path, 12), size=4)
+
+    async def read_one():
+        with ThreadPoolExecutor(1) as executor:
+            first_ocr = executor.submit(batch.ocr_chunk, [path for _, _, path in chunks[0]])
+            stream = batch.batch_results(chunks, first_ocr, "alice", {"user_id": "alice"})
+            line = await stream.__anext__()
+            await stream.aclose()
+            return line
+
+    assert json.loads(asyncio.run(read_one()))["status"] == "succeeded"
+    time.sleep(0.2)  # a chunk already on the OCR pool deletes its own files when it finishes
+    assert not list(tmp_path.iterdir())
+
+
+def test_batch_upload_streams_one_line_per_file(main, client, pipeline, tmp_path, monkeypatch):
+    monkeypatch.setattr(main, "RECEIPTS_DIR", tmp_path)
+    files = [("receipts", (f"r{i}.png", b"fake", "image/png")) for i in range(5)]
+    response = client.post("/upload/batch", files=files, headers={"Authorization": "Bearer alice"})
+    assert response.status_code == 200
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert sorted((line["index"], line["filename"]) for line in lines) == [(i, f"r{i}.png") for i in range(5)]
+    assert not list(tmp_path.iterdir())
@@ -0,0 +1,77 @@
+from app.report_cache import ReportCache, RedisReportCache
+
+
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, px=None):
+        self.data[key] = value
+
+    def delete(self, key):
+        self.data.pop(key, None)
+
+
+def stub_backend(monkeypatch, main):
+    """Reports tagged with the token they were fetched with; Gemini echoes the prompt."""
+    fetched = []
+
+    async def fetch_reports(token):
+        fetched.append(token)
+        return {"balance": f"balance of {token}", "profit_loss": f"pnl of {token}",
+                "cashflow": f"cashflow of {token}"}
+
+    monkeypatch.setattr(main, "report_cache", ReportCache(ttl=60))
+    monkeypatch.setattr(main, "fetch_reports", fetch_reports)
+    monkeypatch.setattr(main, "query_gemini_direct", lambda prompt: prompt)
+    return fetched
+
+
+def ask(client, token):
+    response = client.post("/copilot", json={"message": "How is cash flow?"},
+                           headers={"Authorization": f"Bearer {token}"})
+    assert response.status_code == 200
+    return response.json()["reply"]
+
+
+def test_follow_up_reuses_reports(client, main, monkeypatch):
+    fetched = stub_backend(monkeypatch, main)
+    assert "balance of alice" in ask(client, "alice")
+    assert "balance of alice" in ask(client, "alice")
+    assert fetched == ["alice"]
+
+
+def test_reports_are_per_user(client, main, monkeypatch):
+    fetched = stub_backend(monkeypatch, main)
+    ask(client, "alice")
+    assert "balance of bob" in ask(client, "bob")
+    assert fetched == ["alice", "bob"]
+
+
+def test_callers_without_user_id_never_share_reports(client, main, monkeypatch):
+    fetched = stub_backend(monkeypatch, main)
+    first = ask(client, "anonymous-1")
+    second = ask(client, "anonymous-2")
+    assert "balance of anonymous-1" in first and "anonymous-2" not in first
+    assert "balance of anonymous-2" in second and "anonymous-1" not in second
+    assert fetched == ["anonymous-1", "anonymous-2"]
+
+
+def test_report_cache_skips_missing_user_id():
+    cache = ReportCache(ttl=60)
+    cache.put(None, {"balance": 1})
+    cache.put("", {"balance": 2})
+    assert cache.get(None) is None and cache.get("") is None and cache.get("None") is None
+
+
+def test_worker_invalidation_reaches_api_process():
+    redis = FakeRedis()
+    api, worker = RedisReportCache(client=redis), RedisReportCache(client=redis)
+    api.put("alice", {"balance": 1})
+    api.put(None, {"balance": 2})
+    assert api.get("alice") == {"balance": 1} and api.get(None) is None
+    worker.invalidate("alice")  # process_invoice in the Celery worker
+    assert api.get("alice") is None
@@ -0,0 +1,122 @@
+import json
+import threading
+from pathlib import Path
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import jobs
+
+
+@pytest.fixture
+def pipeline(monkeypatch):
+    """OCR and parse stubs; parsing waits for `release` (set by default)."""
+    release = threading.Event()
+    release.set()
+    calls = []
+
+    def extract_text(file_path):
+        return f"TOTAL 12.00 from {Path(file_path).name}"
+
+    def process_invoice(text, token, identity, use_cache=True):
+        calls.append((text, token, identity["user_id"], use_cache))
+        release.wait(5)
+        return {"document_type": "receipt", "total": "12.00"}
+
+    monkeypatch.setattr(jobs, "extract_text", extract_text)
+    monkeypatch.setattr(jobs, "process_invoice", process_invoice)
+    yield release, calls
+    release.set()
+
+
+def upload(client, token, name="receipt.png"):
+    return client.post("/upload", files={"receipt": (name, b"fake image bytes", "image/png")},
+                       headers={"Authorization": f"Bearer {token}"})
+
+
+def test_upload_returns_job_then_result(client, pipeline):
+    _, calls = pipeline
+    response = upload(client, "alice")
+    assert response.status_code == 202
+    body = response.json()
+    assert body["status"] == jobs.QUEUED and body["status_url"] == f"/jobs/{body['job_id']}"
+
+    job = client.get(f"/jobs/{body['job_id']}", params={"wait": 5},
+                     headers={"Authorization": "Bearer alice"}).json()
+    assert job["status"] == jobs.SUCCEEDED
+    assert job["result"] == {"structured_data": {"document_type": "receipt", "total": "12.00"}}
+    assert calls == [(f"TOTAL 12.00 from {Path(body['file_path']).name}", "alice", "alice", True)]
+    # the upload is deleted once the job is finished
+    assert not Path(body["file_path"]).exists()
+
+
+def test_cache_bypass_header_reaches_parser(client, pipeline):
+    _, calls = pipeline
+    response = client.post("/upload", files={"receipt": ("receipt.png", b"fake", "image/png")},
+                           headers={"Authorization": "Bearer alice", "X-Cache-Bypass": "1"})
+    client.get(f"/jobs/{response.json()['job_id']}", params={"wait": 5}, headers={"Authorization": "Bearer alice"})
+    assert calls[0][3] is False
+
+
+def test_failed_job_reports_error_and_deletes_upload(client, pipeline, monkeypatch):
+    def extract_text(file_path):
+        raise RuntimeError("unreadable page")
+
+    monkeypatch.setattr(jobs, "extract_text", extract_text)
+    body = upload(client, "alice").json()
+    job = client.get(f"/jobs/{body['job_id']}", params={"wait": 5}, headers={"Authorization": "Bearer alice"}).json()
+    assert job["status"] == jobs.FAILED and job["error"] == "unreadable page"
+    assert not Path(body["file_path"]).exists()
+
+
+def test_job_events_stream_status_changes(client, pipeline):
+    release, _ = pipeline
+    release.clear()
+    job_id = upload(client, "alice").json()["job_id"]
+    # TestClient collects the whole stream, so let the job finish a little later
+    threading.Timer(0.3, release.set).start()
+    response = client.get(f"/jobs/{job_id}/events", headers={"Authorization": "Bearer alice"})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+
+    events = [block for block in response.text.split("\n\n") if block]
+    assert all(block.startswith("event: status\ndata: ") for block in events)
+    statuses = [json.loads(block.split("data: ", 1)[1])["status"] for block in events]
+    assert statuses[-1] == jobs.SUCCEEDED and jobs.RUNNING in statuses
+    order = [jobs.QUEUED, jobs.RUNNING, jobs.SUCCEEDED]
+    assert statuses == [status for status in order if status in statuses]
+
+
+def test_other_users_job_is_forbidden(client, pipeline):
+    job_id = upload(client, "alice").json()["job_id"]
+    headers = {"Authorization": "Bearer bob"}
+    assert client.get(f"/jobs/{job_id}", headers=headers).status_code == 403
+    assert client.get(f"/jobs/{job_id}/events", headers=headers).status_code == 403
+    assert client.get("/jobs/does-not-exist", headers=headers).status_code == 404
+
+
+def test_upload_without_user_id_is_rejected(client, pipeline):
+    assert upload(client, "anonymous").status_code == 401
+
+
+def test_full_queue_returns_503(main, pipeline, monkeypatch):
+    release, _ = pipeline
+    release.clear()
+    monkeypatch.setattr(jobs.job_backend, "workers", 1)
+    monkeypatch.setattr(jobs.job_backend, "queue_depth", 1)
+    with TestClient(main.app) as client:
+        # one job running, one queued: the third upload at the latest is turned away
+        responses = [upload(client, "alice") for _ in range(3)]
+        rejected = [r for r in responses if r.status_code == 503]
+        assert rejected and responses[0].status_code == 202
+        assert rejected[0].headers["Retry-After"] == str(jobs.JOB_RETRY_AFTER)
+        release.set()
+
+
+def test_run_pipeline_deletes_upload(pipeline, tmp_path):
+    store = jobs.MemoryJobStore()
+    file_path = tmp_path / "receipt.png"
+    file_path.write_bytes(b"fake image bytes")
+    job = store.create(jobs.new_job("alice", "receipt.png", str(file_path)))
+    result = jobs.run_pipeline(job["id"], "alice", {"user_id": "alice"}, store)
+    assert result["status"] == jobs.SUCCEEDED and not file_path.exists()
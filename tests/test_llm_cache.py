@@ -0,0 +1,23 @@
+from app.llm_cache import LLMCache, normalize_text
+
+
+def test_whitespace_is_collapsed():
+    assert normalize_text("  TOTAL\t12.00\r\n\nVAT  1.92 ") == "TOTAL 12.00 VAT 1.92"
+    assert LLMCache.make_key("TOTAL\n12.00", "1", "m") == LLMCache.make_key("TOTAL 12.00 ", "1", "m")
+
+
+def test_case_is_kept_in_the_key():
+    assert LLMCache.make_key("Invoice INV-AB12", "1", "m") != LLMCache.make_key("Invoice inv-ab12", "1", "m")
+
+
+def test_prompt_version_and_model_are_part_of_the_key():
+    keys = {LLMCache.make_key("TOTAL 12.00", version, model) for version in ("1", "2") for model in ("a", "b")}
+    assert len(keys) == 4
+
+
+def test_cached_extraction_round_trip(tmp_path):
+    cache = LLMCache(path=str(tmp_path / "llm_cache.sqlite3"), ttl=60, max_items=10)
+    upper, lower = (LLMCache.make_key(text, "1", "m") for text in ("INV-AB12", "inv-ab12"))
+    cache.put(upper, "m", {"invoice_number": "INV-AB12"})
+    assert cache.get(upper) == {"invoice_number": "INV-AB12"}
+    assert cache.get(lower) is None
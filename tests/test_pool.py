@@ -0,0 +1,48 @@
+import asyncio
+import threading
+
+import pytest
+
+from app.pool import OCRPool, PoolFull
+
+
+@pytest.fixture
+def busy_pool():
+    """Pool with one worker and one waiting slot, both taken until `release` is set."""
+    pool = OCRPool(workers=1, queue_depth=1, mode="thread", retry_after=7)
+    release = threading.Event()
+    futures = [pool.submit(release.wait, 5) for _ in range(2)]
+    yield pool, release, futures
+    release.set()
+    pool.shutdown()
+
+
+def test_full_pool_rejects_with_retry_after(busy_pool):
+    pool, release, futures = busy_pool
+    with pytest.raises(PoolFull) as full:
+        pool.submit(len, "x")
+    assert full.value.retry_after == 7
+    assert pool.stats() == {"mode": "thread", "workers": 1, "queue_depth": 1,
+                            "running": 1, "queued": 1, "rejected": 1}
+    release.set()
+    for future in futures:
+        future.result(5)
+    assert pool.submit(len, "x").result(5) == 1
+
+
+def test_run_when_free_waits_for_a_slot(busy_pool):
+    pool, release, _ = busy_pool
+    threading.Timer(0.2, release.set).start()
+    result = asyncio.run(pool.run_when_free(len, "abc", poll_interval=0.01))
+    assert result == 3 and pool.stats()["rejected"] == 0
+
+
+def test_batch_upload_gets_503_when_ocr_pool_is_full(main, client, busy_pool, monkeypatch, tmp_path):
+    pool, _, _ = busy_pool
+    monkeypatch.setattr(main, "ocr_pool", pool)
+    monkeypatch.setattr(main, "RECEIPTS_DIR", tmp_path)
+    response = client.post("/upload/batch", files=[("receipts", ("a.png", b"fake", "image/png"))],
+                           headers={"Authorization": "Bearer alice"})
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "7"
+    assert not list(tmp_path.iterdir())